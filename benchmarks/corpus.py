@@ -0,0 +1,97 @@
+"""Reproducible synthetic image corpora for benchmarks."""
+
+import json
+import random
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from src.img_to_webp import SUPPORTED_FORMATS
+
+RESOLUTIONS = [(640, 480), (1920, 1080), (4000, 3000)]
+QUICK_RESOLUTIONS = [(320, 240), (800, 600)]
+
+# Formats that can carry transparency; the rest are generated opaque only.
+ALPHA_FORMATS = {".png", ".gif", ".tiff"}
+
+ANIMATED_FRAMES = 8
+
+_CORPUS_INFO = "corpus.json"
+
+
+def draw_image(rng: random.Random, size: Tuple[int, int], alpha: bool) -> Image.Image:
+    """Draws photo-like content: gradients, shapes and blurred texture."""
+    width, height = size
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(img)
+    for _ in range(max(width * height // 20000, 20)):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randint(4, max(min(width, height) // 8, 5))
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x, y, x + radius, y + radius), fill=color)
+
+    texture_size = (max(width // 8, 1), max(height // 8, 1))
+    texture = Image.frombytes(
+        "L", texture_size, rng.randbytes(texture_size[0] * texture_size[1])
+    )
+    texture = texture.resize(size, Image.Resampling.BICUBIC).convert("RGB")
+    img = Image.blend(img, texture, 0.25).filter(ImageFilter.GaussianBlur(1))
+
+    if alpha:
+        mask = Image.radial_gradient("L").resize(size)
+        img.putalpha(Image.eval(mask, lambda v: 255 - v))
+    return img
+
+
+def _save(img: Image.Image, path: Path):
+    if path.suffix == ".gif":
+        img = img.convert("RGBA" if img.mode == "RGBA" else "RGB")
+        img = img.quantize(colors=255)
+    img.save(path)
+
+
+def generate_corpus(
+    directory: Path,
+    resolutions: Sequence[Tuple[int, int]] = RESOLUTIONS,
+    seed: int = 0,
+) -> List[Path]:
+    """Generates (or reuses) a corpus covering every supported format.
+
+    Each resolution is written in every format, with and without alpha where
+    the format supports it, plus an animated GIF. The corpus is regenerated
+    only when its parameters change.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    info = {"resolutions": [list(r) for r in resolutions], "seed": seed}
+    info_path = directory / _CORPUS_INFO
+    existing = json.loads(info_path.read_text()) if info_path.exists() else None
+    if existing is not None and existing["params"] == info:
+        return [directory / name for name in existing["files"]]
+
+    for path in directory.iterdir():
+        if path.suffix.lower() in SUPPORTED_FORMATS:
+            path.unlink()
+
+    rng = random.Random(seed)
+    paths = []
+    for width, height in resolutions:
+        for fmt in sorted(SUPPORTED_FORMATS):
+            for alpha in [False, True] if fmt in ALPHA_FORMATS else [False]:
+                kind = "alpha" if alpha else "opaque"
+                path = directory / f"{width}x{height}_{kind}_{fmt.lstrip('.')}{fmt}"
+                _save(draw_image(rng, (width, height), alpha), path)
+                paths.append(path)
+
+        frames = [
+            draw_image(rng, (width, height), False).quantize(colors=255)
+            for _ in range(ANIMATED_FRAMES)
+        ]
+        path = directory / f"{width}x{height}_animated.gif"
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=80)
+        paths.append(path)
+
+    info_path.write_text(
+        json.dumps({"params": info, "files": [p.name for p in paths]}, indent=2)
+    )
+    return paths
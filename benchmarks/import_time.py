@@ -0,0 +1,69 @@
+"""Import time of the command-line entry point.
+
+Runs ``-X importtime`` and reports the fastest of several runs, on top of
+interpreter startup. Exits with status 1 over the budget. Run from the
+repository root with::
+
+    python -m benchmarks.import_time
+"""
+
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+# Importing everything up front took about 250 ms.
+_IMPORT_BUDGET_MS = 100.0
+
+_ENTRY_POINT = "from src.img_to_webp import main, parse_args"
+
+
+def import_times(code: str) -> dict:
+    """Runs code with ``-X importtime``, returning the cumulative time of each module.
+
+    Modules imported by another one keep their indentation.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def measure_ms() -> float:
+    """Time spent importing the entry point's top-level modules, in milliseconds."""
+    startup = import_times("pass")
+    return (
+        sum(
+            cumulative
+            for name, cumulative in import_times(_ENTRY_POINT).items()
+            if not name.startswith(" ") and name not in startup
+        )
+        / 1e3
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=_IMPORT_BUDGET_MS)
+    args = parser.parse_args()
+
+    # The fastest run, to ignore a busy machine.
+    fastest = min(measure_ms() for _ in range(args.runs))
+    print(f"import time: {fastest:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if fastest > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
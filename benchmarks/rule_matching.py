@@ -0,0 +1,78 @@
+"""Micro-benchmark for resize rule resolution.
+
+Compares the compiled `RuleMatcher` against calling `re.match` on every rule,
+for increasing rule counts. Run from the repository root with::
+
+    python -m benchmarks.rule_matching
+"""
+
+import argparse
+import random
+import re
+import time
+from typing import List
+
+from src.img_to_webp import ResizeRule
+from src.img_to_webp._rule_matcher import RuleMatcher
+
+
+def make_rules(count: int) -> List[ResizeRule]:
+    """Mostly per-SKU prefix rules, with a few suffix and regex rules."""
+    rules = [ResizeRule(f"sku_{i:06d}_", (128, 128)) for i in range(count)]
+    rules[:: max(count // 10, 1)] = [
+        ResizeRule(rf".*_v{i}\.png$", (256, 256))
+        for i in range(len(rules[:: max(count // 10, 1)]))
+    ]
+    rules.append(ResizeRule(r".*_(small|thumb)\..*", (64, 64)))
+    return rules
+
+
+def make_filenames(count: int, rule_count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [f"sku_{rng.randrange(rule_count * 2):06d}_{i}.jpg" for i in range(count)]
+
+
+def naive_match(rules: List[ResizeRule], filename: str):
+    for rule in rules:
+        if re.match(rule.pattern, filename):
+            return rule
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=20000)
+    parser.add_argument(
+        "--rule-counts", type=int, nargs="+", default=[10, 100, 1000, 10000]
+    )
+    args = parser.parse_args()
+
+    print(
+        f"{'rules':>8} {'build ms':>9} {'matcher us/file':>16} {'re.match us/file':>17}"
+    )
+    for rule_count in args.rule_counts:
+        rules = make_rules(rule_count)
+        filenames = make_filenames(args.files, rule_count)
+
+        start = time.perf_counter()
+        matcher = RuleMatcher(rules)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        start = time.perf_counter()
+        for filename in filenames:
+            matcher.match(filename)
+        matcher_us = (time.perf_counter() - start) / len(filenames) * 1e6
+
+        # re.match recompiles every pattern once its cache thrashes, so only a
+        # small sample is timed for large rule counts.
+        sample = filenames[: max(len(filenames) // rule_count, 10)]
+        start = time.perf_counter()
+        for filename in sample:
+            naive_match(rules, filename)
+        naive_us = (time.perf_counter() - start) / len(sample) * 1e6
+
+        print(f"{rule_count:>8} {build_ms:>9.1f} {matcher_us:>16.2f} {naive_us:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
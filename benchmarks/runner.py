@@ -0,0 +1,248 @@
+"""Throughput benchmark for the conversion pipeline.
+
+Generates a synthetic corpus, converts it under every combination of resize
+mode and quality, and reports images/sec, MB/s, per-stage latency percentiles
+and peak RSS. Results can be saved as a JSON baseline, and a later run fails
+when it regresses beyond a threshold. Run from the repository root with::
+
+    python -m benchmarks --save-baseline baseline.json
+    python -m benchmarks --baseline baseline.json --threshold 0.1
+"""
+
+import argparse
+import json
+import logging
+import math
+import platform
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import PIL
+
+from src.img_to_webp import ImageMetrics, ImageProcessor, PipelineStage, ResizeMode
+
+from .corpus import QUICK_RESOLUTIONS, RESOLUTIONS, generate_corpus
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+
+STAGES = [str(stage) for stage in PipelineStage] + ["total"]
+PERCENTILES = [50, 90, 99]
+
+
+@dataclass
+class Scenario:
+    mode: ResizeMode
+    quality: int
+    size: Tuple[int, int]
+
+    @property
+    def name(self) -> str:
+        return f"{self.mode}-q{self.quality}-{self.size[0]}x{self.size[1]}"
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_scenario(
+    scenario: Scenario, corpus_dir: Path, paths: List[Path], repeat: int
+) -> Dict[str, Any]:
+    """Converts every corpus file `repeat` times, timing each pipeline stage."""
+    timings: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    input_bytes = 0
+
+    def record(metrics: ImageMetrics):
+        nonlocal input_bytes
+        input_bytes += metrics.input_bytes
+        for stage, seconds in metrics.stage_seconds.items():
+            timings[stage].append(seconds * 1000)
+        timings["total"].append(metrics.total_seconds * 1000)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        processor = ImageProcessor(
+            input_dir=str(corpus_dir),
+            output_dir=output_dir,
+            overwrite=True,
+            default_size=scenario.size,
+            default_resize_mode=scenario.mode,
+            quality=scenario.quality,
+            hooks=[record],
+        )
+        # Per-image "Processed" lines would dominate the benchmark output.
+        logging.getLogger(ImageProcessor.__module__).setLevel(logging.WARNING)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for path in paths:
+                processor.process_image(path)
+        elapsed = time.perf_counter() - started
+
+    images = len(paths) * repeat
+    return {
+        "images": images,
+        "seconds": elapsed,
+        "images_per_sec": images / elapsed,
+        "mb_per_sec": input_bytes / elapsed / 1e6,
+        "latency_ms": {
+            stage: {f"p{p}": percentile(values, p) for p in PERCENTILES}
+            for stage, values in timings.items()
+        },
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def run_benchmarks(
+    scenarios: List[Scenario], corpus_dir: Path, paths: List[Path], repeat: int
+) -> Dict[str, Dict[str, Any]]:
+    """Runs each scenario in a fresh process so peak RSS is measured per scenario."""
+    results = {}
+    for scenario in scenarios:
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as executor:
+            results[scenario.name] = executor.submit(
+                run_scenario, scenario, corpus_dir, paths, repeat
+            ).result()
+        print(format_result(scenario.name, results[scenario.name]), flush=True)
+    return results
+
+
+def format_result(name: str, result: Dict[str, Any]) -> str:
+    total = result["latency_ms"]["total"]
+    rss = result["peak_rss_mb"]
+    return (
+        f"{name:<28} {result['images_per_sec']:>8.1f} img/s "
+        f"{result['mb_per_sec']:>7.2f} MB/s "
+        f"p50 {total['p50']:>7.1f} ms p99 {total['p99']:>7.1f} ms "
+        f"rss {'n/a' if rss is None else f'{rss:.0f} MB'}"
+    )
+
+
+def compare(
+    results: Dict[str, Any], baseline: Dict[str, Any], threshold: float
+) -> List[str]:
+    """Lists scenarios that regressed beyond `threshold` relative to the baseline."""
+    regressions = []
+    for name, base in baseline["scenarios"].items():
+        current = results["scenarios"].get(name)
+        if current is None:
+            continue
+        # (metric, current value, baseline value, higher is better)
+        checks = [
+            ("images/sec", current["images_per_sec"], base["images_per_sec"], True),
+            (
+                "p50 latency ms",
+                current["latency_ms"]["total"]["p50"],
+                base["latency_ms"]["total"]["p50"],
+                False,
+            ),
+        ]
+        if current["peak_rss_mb"] is not None and base["peak_rss_mb"] is not None:
+            checks.append(
+                ("peak RSS MB", current["peak_rss_mb"], base["peak_rss_mb"], False)
+            )
+        for metric, value, base_value, higher_is_better in checks:
+            regressed = (
+                value < base_value * (1 - threshold)
+                if higher_is_better
+                else value > base_value * (1 + threshold)
+            )
+            if regressed:
+                regressions.append(
+                    f"{name}: {metric} {value:.2f} vs baseline {base_value:.2f}"
+                )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="img-to-webp throughput benchmark")
+    parser.add_argument(
+        "--corpus-dir",
+        type=str,
+        default=str(Path(tempfile.gettempdir()) / "img-to-webp-bench-corpus"),
+        help="Directory for the generated corpus (reused between runs)",
+    )
+    parser.add_argument("--quick", action="store_true", help="Use a small corpus")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus random seed")
+    parser.add_argument(
+        "--modes",
+        type=ResizeMode,
+        nargs="+",
+        choices=list(ResizeMode),
+        default=list(ResizeMode),
+    )
+    parser.add_argument("--qualities", type=int, nargs="+", default=[50, 80, 95])
+    parser.add_argument("--size", type=int, nargs=2, default=[256, 256])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--output", type=str, help="Write results to a JSON file")
+    parser.add_argument("--save-baseline", type=str, help="Save results as a baseline")
+    parser.add_argument("--baseline", type=str, help="Baseline JSON to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed relative regression before failing (default 0.1)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    corpus_dir = Path(args.corpus_dir)
+    paths = generate_corpus(
+        corpus_dir, QUICK_RESOLUTIONS if args.quick else RESOLUTIONS, args.seed
+    )
+    scenarios = [
+        Scenario(mode, quality, tuple(args.size))
+        for mode in args.modes
+        for quality in args.qualities
+    ]
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+        },
+        "corpus": {
+            "files": len(paths),
+            "bytes": sum(p.stat().st_size for p in paths),
+            "quick": args.quick,
+            "seed": args.seed,
+        },
+        "scenarios": run_benchmarks(scenarios, corpus_dir, paths, args.repeat),
+    }
+
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, "w") as file:
+                json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.threshold:.0%} of the baseline.")
+    return 0
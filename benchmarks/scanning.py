@@ -0,0 +1,75 @@
+"""Micro-benchmark for input directory scanning.
+
+Builds a tree of empty files, mostly non-images plus a generated ``.webp``
+output tree inside the input directory, and compares `DirectoryScanner`
+with the previous ``rglob("*")`` scan. Also reports how long the first file
+takes to arrive, since conversion starts from the first yielded file. Run
+from the repository root with::
+
+    python -m benchmarks.scanning --dirs 200 --files 100
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable
+
+from src.img_to_webp import SUPPORTED_FORMATS
+from src.img_to_webp._scanner import DirectoryScanner
+
+
+def make_tree(root: Path, dirs: int, files: int):
+    """Creates `dirs` directories of `files` entries, a tenth of them images."""
+    for tree in ("photos", "webp"):
+        for i in range(dirs):
+            directory = root / tree / f"{i // 10:03d}" / f"{i:04d}"
+            directory.mkdir(parents=True)
+            for j in range(files):
+                suffix = ".webp" if tree == "webp" else (".jpg" if j % 10 else ".json")
+                (directory / f"{j:05d}{suffix}").touch()
+
+
+def rglob_scan(root: Path) -> Iterable[Path]:
+    return (
+        path for path in root.rglob("*") if path.suffix.lower() in SUPPORTED_FORMATS
+    )
+
+
+def measure(scan: Callable[[], Iterable[Path]]):
+    start = time.perf_counter()
+    first = None
+    count = 0
+    for _ in scan():
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    return count, time.perf_counter() - start, first
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dirs", type=int, default=200)
+    parser.add_argument("--files", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        make_tree(root, args.dirs, args.files)
+        scans = {
+            "rglob": lambda: rglob_scan(root),
+            "scanner": lambda: DirectoryScanner(
+                root, SUPPORTED_FORMATS, prune=[Path("webp")]
+            ),
+        }
+
+        print(f"{'scan':>8} {'files':>8} {'total ms':>9} {'first ms':>9}")
+        for name, scan in scans.items():
+            # Warm the dentry cache so both scans see the same conditions.
+            measure(scan)
+            count, total, first = measure(scan)
+            print(f"{name:>8} {count:>8} {total * 1e3:>9.1f} {first * 1e3:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Load generator for the on-demand conversion server.
+
+Starts `ImageServer` on a synthetic corpus in a separate process and drives it
+with keep-alive HTTP clients: a cold pass requests every URL once, with
+several clients per URL so conversions are coalesced, and a warm pass
+requests random URLs that are served from the memory cache. Reports
+requests/sec and latency percentiles for each pass. Run from the repository
+root with::
+
+    python -m benchmarks.serve --concurrency 32 --requests 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from src.img_to_webp import ImageProcessor, ImageServer
+
+from .corpus import QUICK_RESOLUTIONS, generate_corpus
+from .runner import PERCENTILES, percentile
+
+WIDTHS = [128, 256, 512]
+MODES = ["contain", "cover"]
+
+
+def _serve(input_dir: str, port: int, jobs: int):
+    logging.getLogger().setLevel(logging.WARNING)
+    processor = ImageProcessor(input_dir=input_dir, jobs=jobs)
+    ImageServer(processor, port=port).run()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _client(port: int, targets: List[str], latencies: List[float]):
+    """Requests each target in turn over one keep-alive connection."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for target in targets:
+            start = time.perf_counter()
+            writer.write(f"GET {target} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            status = await reader.readline()
+            length = 0
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                name, _, value = line.decode().partition(":")
+                if name.lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            if b" 200 " not in status:
+                raise RuntimeError(f"{target}: {status.decode().strip()}")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def _run_pass(
+    port: int, targets: List[str], concurrency: int
+) -> Tuple[float, List[float]]:
+    latencies: List[float] = []
+    chunks = [targets[i::concurrency] for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, chunk, latencies) for chunk in chunks))
+    return time.perf_counter() - start, latencies
+
+
+async def _wait_for_server(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--jobs", type=int, default=0, help="Server worker processes")
+    parser.add_argument(
+        "--corpus-dir", type=Path, help="Reuse a corpus directory between runs"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus_dir = args.corpus_dir or Path(tmp)
+        paths = generate_corpus(corpus_dir, QUICK_RESOLUTIONS)
+        urls = [
+            f"/{path.name}?w={width}&h={width}&mode={mode}"
+            for path in paths
+            for width in WIDTHS
+            for mode in MODES
+        ]
+
+        port = _free_port()
+        # Not a daemon, so the server can start its own worker pool.
+        server = multiprocessing.Process(
+            target=_serve, args=(str(corpus_dir), port, args.jobs)
+        )
+        server.start()
+        try:
+            asyncio.run(_wait_for_server(port))
+            rng = random.Random(0)
+            # Each URL is requested by up to four clients at once.
+            cold = [url for url in urls for _ in range(min(4, args.concurrency))]
+            warm = [rng.choice(urls) for _ in range(args.requests)]
+
+            print(f"{'pass':>6} {'requests':>9} {'req/s':>9}", end="")
+            print("".join(f" {f'p{pct} ms':>9}" for pct in PERCENTILES))
+            for name, targets in [("cold", cold), ("warm", warm)]:
+                seconds, latencies = asyncio.run(
+                    _run_pass(port, targets, args.concurrency)
+                )
+                print(
+                    f"{name:>6} {len(targets):>9} {len(targets) / seconds:>9.1f}",
+                    end="",
+                )
+                print(
+                    "".join(
+                        f" {percentile(latencies, pct) * 1e3:>9.2f}"
+                        for pct in PERCENTILES
+                    )
+                )
+        finally:
+            # Interrupted rather than terminated, so it shuts its pool down.
+            os.kill(server.pid, signal.SIGINT)
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
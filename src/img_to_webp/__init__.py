@@ -1,20 +1,101 @@
-from ._cli import parse_args
-from ._config import Config
-from ._exceptions import InputDirNotFoundError
-from ._image_processor import ImageProcessor, SUPPORTED_FORMATS
-from ._main import main
-from ._models import ResizeRule, ResizeMode
-from ._resize_strategy import ResizeStrategy, ResizeStrategyFactory
+import importlib
+from typing import TYPE_CHECKING
+
+# Public names and the modules defining them. Modules are imported on first
+# access, so the command line starts without importing Pillow, yaml or the
+# worker pools until a run needs them.
+_EXPORTS = {
+    "main": "._main",
+    "Config": "._config",
+    "ImageProcessor": "._image_processor",
+    "ImageServer": "._server",
+    "parse_args": "._cli",
+    "ResizeRule": "._models",
+    "InputDirNotFoundError": "._exceptions",
+    "ResizeMode": "._models",
+    "Variant": "._models",
+    "EncodeSettings": "._models",
+    "Compression": "._models",
+    "ExecutorType": "._models",
+    "DedupMode": "._models",
+    "Gravity": "._models",
+    "ResampleFilter": "._models",
+    "Shard": "._shard",
+    "JobPlan": "._planner",
+    "PlanAction": "._planner",
+    "PlannedJob": "._planner",
+    "PlanSummary": "._planner",
+    "ImageMetrics": "._metrics",
+    "MetricsHook": "._metrics",
+    "PipelineStage": "._metrics",
+    "RunReport": "._metrics",
+    "ResizeStrategy": "._resize_strategy",
+    "ResizeStrategyFactory": "._resize_strategy",
+    "SUPPORTED_FORMATS": "._image_processor",
+}
 
 __all__ = [
     "main",
     "Config",
     "ImageProcessor",
+    "ImageServer",
     "parse_args",
     "ResizeRule",
     "InputDirNotFoundError",
     "ResizeMode",
+    "Variant",
+    "EncodeSettings",
+    "Compression",
+    "ExecutorType",
+    "DedupMode",
+    "Gravity",
+    "ResampleFilter",
+    "Shard",
+    "JobPlan",
+    "PlanAction",
+    "PlannedJob",
+    "PlanSummary",
+    "ImageMetrics",
+    "MetricsHook",
+    "PipelineStage",
+    "RunReport",
     "ResizeStrategy",
     "ResizeStrategyFactory",
     "SUPPORTED_FORMATS",
 ]
+
+if TYPE_CHECKING:
+    from ._cli import parse_args
+    from ._config import Config
+    from ._exceptions import InputDirNotFoundError
+    from ._image_processor import ImageProcessor, SUPPORTED_FORMATS
+    from ._main import main
+    from ._metrics import ImageMetrics, MetricsHook, PipelineStage, RunReport
+    from ._models import (
+        ResizeRule,
+        ResizeMode,
+        ExecutorType,
+        DedupMode,
+        Gravity,
+        ResampleFilter,
+        Variant,
+        EncodeSettings,
+        Compression,
+    )
+    from ._planner import JobPlan, PlanAction, PlannedJob, PlanSummary
+    from ._resize_strategy import ResizeStrategy, ResizeStrategyFactory
+    from ._server import ImageServer
+    from ._shard import Shard
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted([*globals(), *_EXPORTS])
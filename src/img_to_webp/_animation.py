@@ -0,0 +1,218 @@
+import io
+import logging
+from typing import List, Optional, Tuple
+
+from PIL import Image, ImageChops, _webp
+
+from ._encoder import resolve_compression, to_near_lossless
+from ._exceptions import AnimationTooLargeError
+from ._models import Compression, EncodeSettings
+
+# Browsers play GIF frames without a delay at roughly this rate (ms).
+_DEFAULT_FRAME_DURATION = 100
+
+# Frames are kept in memory for `save_all` when Pillow's animation encoder is
+# unavailable; larger animations fail instead (pixels over all kept frames).
+_MAX_PENDING_PIXELS = 100_000_000
+
+logger = logging.getLogger(__name__)
+
+
+def _new_encoder(encoder_class, size: Tuple[int, int], loop: int, kmin: int, kmax: int):
+    return encoder_class(
+        size,
+        0,  # Transparent background.
+        loop,
+        False,  # minimize_size
+        kmin,
+        kmax,
+        False,  # allow_mixed
+        False,  # verbose
+    )
+
+
+def _add_frame(
+    encoder,
+    frame: Optional[Image.Image],
+    timestamp: int,
+    lossless: bool,
+    settings: EncodeSettings,
+    method: int,
+):
+    """Adds a frame, or with `frame` None ends the animation at `timestamp`."""
+    encoder.add(
+        None if frame is None else frame.getim(),
+        timestamp,
+        lossless,
+        float(settings.quality),
+        float(settings.alpha_quality),
+        method,
+    )
+
+
+def _probe_encoder():
+    """Returns libwebp's animation encoder as Pillow 11 exposes it, if it works.
+
+    It is private, so a 1x1 animation is encoded with it first; if anything
+    about it changed, frames go through the public `save_all` path instead.
+    """
+    encoder_class = getattr(_webp, "WebPAnimEncoder", None)
+    if encoder_class is None or not hasattr(Image.Image, "getim"):
+        return None
+    settings = EncodeSettings(quality=80, method=0, alpha_quality=100)
+    try:
+        encoder = _new_encoder(encoder_class, (1, 1), 0, 3, 5)
+        _add_frame(encoder, Image.new("RGB", (1, 1)), 0, False, settings, 0)
+        _add_frame(encoder, None, 100, False, settings, 0)
+        data = encoder.assemble("", b"", "")
+    except (AttributeError, TypeError, ValueError, RuntimeError, OSError):
+        # A changed signature, a missing method or a failing encoder.
+        return None
+    return encoder_class if data[:4] == b"RIFF" else None
+
+
+_ANIM_ENCODER = _probe_encoder()
+_fallback_warned = False
+
+
+def get_loop(img: Image.Image) -> int:
+    """Returns the source's loop count; 0 loops forever.
+
+    GIFs without a NETSCAPE loop extension play once.
+    """
+    if "loop" in img.info:
+        return img.info["loop"]
+    return 1 if img.format == "GIF" else 0
+
+
+class AnimationWriter:
+    """Streams frames into an animated WebP, merging identical consecutive frames.
+
+    Frames are handed to libwebp's animation encoder as they arrive; it keeps
+    them compressed, and only the previous frame is held here for comparison,
+    so memory does not grow with the frame count. Sources provide fully
+    composited frames, so the encoder chooses the disposal and blending of
+    each output frame itself.
+
+    Without Pillow's private animation encoder, or if its signature changed,
+    the unique frames are kept and saved with ``save_all`` when finished, up
+    to `_MAX_PENDING_PIXELS`.
+    """
+
+    def __init__(self, settings: EncodeSettings, loop: int):
+        self._settings = settings
+        self._loop = loop
+        self._encoder = None
+        # Frames and durations kept for `save_all` when not streaming.
+        self._pending: Optional[List[Image.Image]] = None
+        self._durations: List[int] = []
+        self._pending_pixels = 0
+        self._previous: Optional[Image.Image] = None
+        self._timestamp = 0
+        self.compression: Optional[Compression] = None
+        self.size: Optional[Tuple[int, int]] = None
+        self.reason: Optional[str] = None
+        self.frames = 0
+        self.unique_frames = 0
+
+    def add(self, frame: Image.Image, duration: Optional[int]):
+        """Adds an RGB or RGBA frame shown for `duration` milliseconds."""
+        self.frames += 1
+        duration = duration or _DEFAULT_FRAME_DURATION
+        if self._previous is not None and self._is_repeat(frame):
+            self._timestamp += duration
+            if self._pending is not None:
+                self._durations[-1] += duration
+            return
+
+        if self.compression is None:
+            self._start(frame)
+        self._previous = frame
+        if self.compression == Compression.NEAR_LOSSLESS:
+            frame = to_near_lossless(frame)
+        if self._pending is not None:
+            self._pending_pixels += frame.width * frame.height
+            if self._pending_pixels > _MAX_PENDING_PIXELS:
+                raise AnimationTooLargeError(_MAX_PENDING_PIXELS)
+            self._pending.append(frame)
+            self._durations.append(duration)
+        else:
+            _add_frame(
+                self._encoder,
+                frame,
+                round(self._timestamp),
+                self.compression != Compression.LOSSY,
+                self._settings,
+                self._settings.method,
+            )
+        self._timestamp += duration
+        self.unique_frames += 1
+
+    def finish(self) -> io.BytesIO:
+        """Assembles the animation, returning a buffer positioned at its end."""
+        if self._pending is not None:
+            return self._save_all()
+        _add_frame(
+            self._encoder,
+            None,
+            round(self._timestamp),
+            self.compression != Compression.LOSSY,
+            self._settings,
+            0,
+        )
+        buffer = io.BytesIO()
+        buffer.write(self._encoder.assemble("", b"", ""))
+        return buffer
+
+    def _start(self, frame: Image.Image):
+        # Auto compression is decided on the first frame; targets do not apply.
+        self.compression, self.reason = resolve_compression(frame, self._settings)
+        self.size = frame.size
+        if _ANIM_ENCODER is not None:
+            self._encoder = _new_encoder(
+                _ANIM_ENCODER, frame.size, self._loop, *self._keyframe_interval
+            )
+            return
+        global _fallback_warned
+        if not _fallback_warned:
+            logger.warning(
+                "Pillow's animation encoder is unavailable: animation frames are "
+                "kept in memory until saved"
+            )
+            _fallback_warned = True
+        self._pending = []
+
+    @property
+    def _keyframe_interval(self) -> Tuple[int, int]:
+        """Bounds of the keyframe interval, as in gif2webp."""
+        return (3, 5) if self.compression == Compression.LOSSY else (9, 17)
+
+    def _save_all(self) -> io.BytesIO:
+        """Encodes the kept frames through Pillow's public animated WebP writer."""
+        first, *rest = self._pending
+        kmin, kmax = self._keyframe_interval
+        buffer = io.BytesIO()
+        first.save(
+            buffer,
+            "WEBP",
+            save_all=True,
+            append_images=rest,
+            duration=self._durations,
+            loop=self._loop,
+            background=(0, 0, 0, 0),
+            minimize_size=False,
+            kmin=kmin,
+            kmax=kmax,
+            allow_mixed=False,
+            lossless=self.compression != Compression.LOSSY,
+            quality=self._settings.quality,
+            alpha_quality=self._settings.alpha_quality,
+            method=self._settings.method,
+        )
+        return buffer
+
+    def _is_repeat(self, frame: Image.Image) -> bool:
+        if frame.mode != self._previous.mode or frame.size != self._previous.size:
+            return False
+        difference = ImageChops.difference(frame, self._previous)
+        return difference.getbbox(alpha_only=False) is None
@@ -0,0 +1,141 @@
+import io
+import logging
+import os
+import tarfile
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Tar compression by suffix, for tarfile's "r|<mode>" and "w|<mode>" streams.
+_TAR_SUFFIXES = {
+    ".tar": "",
+    ".tar.gz": "gz",
+    ".tgz": "gz",
+    ".tar.bz2": "bz2",
+    ".tbz2": "bz2",
+    ".tar.xz": "xz",
+    ".txz": "xz",
+}
+ARCHIVE_SUFFIXES = {".zip", *_TAR_SUFFIXES}
+
+# Stream-mode tarfile keeps every member it has seen; the list is dropped
+# this often so memory does not grow with the number of members.
+_TAR_MEMBER_FLUSH = 1024
+
+
+def _get_suffix(path: Path) -> Optional[str]:
+    name = path.name.lower()
+    return next((suffix for suffix in ARCHIVE_SUFFIXES if name.endswith(suffix)), None)
+
+
+def _get_member_name(name: str) -> Optional[str]:
+    """Normalizes a member name, or returns None if it would escape the archive root."""
+    path = PurePosixPath(name)
+    if path.is_absolute() or ".." in path.parts or not path.parts:
+        logger.warning(f"Skipping archive member outside the archive root: {name}")
+        return None
+    return path.as_posix()
+
+
+def is_archive(path: Optional[Path]) -> bool:
+    """Whether a path names a zip or tar archive by its suffix."""
+    return path is not None and _get_suffix(path) is not None
+
+
+@dataclass
+class ArchiveMember:
+    """A regular file in an archive, readable only until the next member is reached."""
+
+    name: str
+    size: int
+    mtime_ns: int
+    open: Callable[[], BinaryIO]
+
+
+def iter_members(path: Path) -> Iterator[ArchiveMember]:
+    """Yields the regular files of a zip or tar archive in archive order.
+
+    Tar archives, compressed or not, are read as a single forward stream and
+    zip archives member by member, so nothing is extracted to disk.
+    """
+    if _get_suffix(path) == ".zip":
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                name = None if info.is_dir() else _get_member_name(info.filename)
+                if name is None:
+                    continue
+                yield ArchiveMember(
+                    name,
+                    info.file_size,
+                    int(time.mktime(info.date_time + (0, 0, -1))) * 10**9,
+                    lambda info=info: archive.open(info),
+                )
+        return
+
+    with tarfile.open(
+        os.fspath(path), f"r|{_TAR_SUFFIXES[_get_suffix(path)]}"
+    ) as archive:
+        for count, info in enumerate(archive, 1):
+            name = _get_member_name(info.name) if info.isfile() else None
+            if name is not None:
+                yield ArchiveMember(
+                    name,
+                    info.size,
+                    int(info.mtime * 10**9),
+                    lambda info=info: archive.extractfile(info),
+                )
+            if count % _TAR_MEMBER_FLUSH == 0:
+                archive.members = []
+
+
+class ArchiveWriter:
+    """Appends files to a new zip or tar archive, replacing the target once closed.
+
+    Zip members are stored, since WebP data does not compress further; tar
+    archives are compressed according to their suffix.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = _get_suffix(path)
+        self._archive: Union[zipfile.ZipFile, tarfile.TarFile]
+        if suffix == ".zip":
+            self._archive = zipfile.ZipFile(self._tmp_path, "w", zipfile.ZIP_STORED)
+        else:
+            self._archive = tarfile.open(
+                os.fspath(self._tmp_path), f"w|{_TAR_SUFFIXES[suffix]}"
+            )
+        self._count = 0
+
+    def add(self, name: str, data: bytes):
+        now = time.time()
+        if isinstance(self._archive, zipfile.ZipFile):
+            info = zipfile.ZipInfo(name, time.localtime(now)[:6])
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(now)
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+            self._count += 1
+            if self._count % _TAR_MEMBER_FLUSH == 0:
+                self._archive.members = []
+
+    def close(self):
+        self._archive.close()
+        os.replace(self._tmp_path, self.path)
+        logger.info(f"Archive written: {self.path}")
+
+    def abort(self):
+        """Discards the partially written archive."""
+        try:
+            self._archive.close()
+        finally:
+            self._tmp_path.unlink(missing_ok=True)
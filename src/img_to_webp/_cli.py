@@ -1,26 +1,301 @@
 import argparse
+from typing import List, Optional
 
-from ._models import ResizeMode
+from ._memory import parse_memory_size
+from ._models import (
+    Compression,
+    DedupMode,
+    Gravity,
+    ResampleFilter,
+    ResizeMode,
+    ExecutorType,
+)
+from ._shard import Shard
 
 
-def parse_args():
-    """Parses command-line arguments."""
-    parser = argparse.ArgumentParser(description="Image processing CLI tool")
-
-    parser.add_argument("--config", type=str, help="Path to config YAML file")
-    parser.add_argument("--input-dir", type=str, help="Path to input directory")
-    parser.add_argument("--output-dir", type=str, help="Path to output directory")
-    parser.add_argument(
+def _add_options(options: argparse.ArgumentParser):
+    """Adds the options shared by directory runs, subcommands and single files."""
+    options.add_argument("--config", type=str, help="Path to config YAML file")
+    options.add_argument("--input-dir", type=str, help="Path to input directory")
+    options.add_argument("--output-dir", type=str, help="Path to output directory")
+    options.add_argument(
         "--overwrite", action="store_true", help="Overwrite existing files"
     )
-    parser.add_argument(
+    options.add_argument(
         "--default-resize-mode",
         type=ResizeMode,
         choices=list(ResizeMode),
         help="Resize mode",
     )
-    parser.add_argument("--default-size", type=int, nargs=2, help="Default image size")
-    parser.add_argument("--quality", type=int, help="WebP image quality")
-    parser.add_argument("--verbose", action="store_true", help="Enable verbose logging")
+    options.add_argument("--default-size", type=int, nargs=2, help="Default image size")
+    options.add_argument(
+        "--gravity",
+        type=Gravity,
+        choices=list(Gravity),
+        help="Where cover mode crops from: the centre, the most detailed region "
+        "(entropy) or the region with the strongest edges (attention)",
+    )
+    options.add_argument(
+        "--resample",
+        type=ResampleFilter,
+        choices=list(ResampleFilter),
+        help="Resampling filter, or a preset: fast, quality, or auto to pick the "
+        "cheapest filter for each image's scale",
+    )
+    options.add_argument(
+        "--reducing-gap",
+        type=float,
+        help="Shrink large sources by an integer factor first, down to this many "
+        "times the target size, before resampling (1.0 or greater)",
+    )
+    options.add_argument(
+        "--no-upscale",
+        action="store_true",
+        help="Never enlarge sources smaller than the target size; cover mode "
+        "only crops them to the target aspect ratio",
+    )
+    options.add_argument("--quality", type=int, help="WebP image quality")
+    options.add_argument(
+        "--method",
+        type=int,
+        choices=range(7),
+        help="WebP encoder effort, 0 (fast) to 6 (smallest output)",
+    )
+    options.add_argument(
+        "--alpha-quality", type=int, help="WebP alpha channel quality (0-100)"
+    )
+    options.add_argument(
+        "--lossless", action="store_true", help="Encode lossless WebP images"
+    )
+    options.add_argument(
+        "--compression",
+        type=Compression,
+        choices=list(Compression),
+        help="WebP compression; auto picks one per image from its content",
+    )
+    options.add_argument(
+        "--all-pages",
+        action="store_true",
+        help="Convert every page of multi-page TIFFs, not just the first",
+    )
+    options.add_argument(
+        "--include",
+        type=str,
+        action="append",
+        help="Only convert files matching this glob (repeatable)",
+    )
+    options.add_argument(
+        "--exclude",
+        type=str,
+        action="append",
+        help="Skip files and directories matching this glob (repeatable)",
+    )
+    options.add_argument(
+        "--max-depth",
+        type=int,
+        help="Scan at most this many directory levels below the input directory",
+    )
+    options.add_argument(
+        "--follow-symlinks",
+        action="store_true",
+        help="Follow symbolic links to directories, skipping link loops",
+    )
+    options.add_argument(
+        "--skip-hidden",
+        action="store_true",
+        help="Skip files and directories whose names start with a dot",
+    )
+    options.add_argument(
+        "--max-bytes",
+        type=int,
+        help="Use the highest quality whose output fits in this many bytes",
+    )
+    options.add_argument(
+        "--min-ssim",
+        type=float,
+        help="Use the lowest quality whose output reaches this SSIM (0-1)",
+    )
+    options.add_argument(
+        "--min-psnr",
+        type=float,
+        help="Use the lowest quality whose output reaches this PSNR in dB",
+    )
+    options.add_argument(
+        "--max-output-ratio",
+        type=float,
+        help="Warn about outputs larger than this many times their source, e.g. 1.0",
+    )
+    options.add_argument(
+        "--skip-oversized",
+        action="store_true",
+        help="Do not write outputs over --max-output-ratio",
+    )
+    options.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of parallel workers (0 uses all CPU cores)",
+    )
+    options.add_argument(
+        "--executor",
+        type=ExecutorType,
+        choices=list(ExecutorType),
+        help="Worker pool type used when --jobs is greater than 1",
+    )
+    options.add_argument(
+        "--max-memory",
+        type=parse_memory_size,
+        help="Memory budget for images converted at once, e.g. 4G; "
+        "the largest images are converted first",
+    )
+    options.add_argument(
+        "--tile-pixels",
+        type=int,
+        help="Convert and resize sources with more pixels than this in strips "
+        "(default 64000000)",
+    )
+    options.add_argument(
+        "--prefetch",
+        type=int,
+        help="Read this many upcoming sources ahead on background threads and "
+        "write outputs on a separate thread",
+    )
+    options.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip unchanged sources using a manifest in the output directory",
+    )
+    options.add_argument(
+        "--hash-sources",
+        action="store_true",
+        help="Compare source contents when size or mtime changed (with --incremental)",
+    )
+    options.add_argument(
+        "--dedup",
+        type=DedupMode,
+        choices=list(DedupMode),
+        nargs="?",
+        const=DedupMode.HARDLINK,
+        help="Convert identical sources once and link the other outputs "
+        "(hardlink by default, reflink or copy)",
+    )
+    options.add_argument(
+        "--no-decode-reduction",
+        action="store_true",
+        help="Always decode sources at full resolution before resizing",
+    )
+    options.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Plan the run and report what would be converted without writing files",
+    )
+    options.add_argument(
+        "--save-plan", type=str, help="Save the job plan to a JSON file"
+    )
+    options.add_argument(
+        "--plan", type=str, help="Execute a job plan saved with --save-plan"
+    )
+    options.add_argument(
+        "--report",
+        type=str,
+        help="Write per-image stage timings and sizes to a JSON or CSV (.csv) file",
+    )
+    options.add_argument(
+        "--prometheus-file",
+        type=str,
+        help="Write run metrics to a Prometheus textfile-collector file",
+    )
+    options.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and convert images as they are added, changed or removed",
+    )
+    options.add_argument(
+        "--debounce",
+        type=float,
+        help="Seconds a file must stay unchanged before it is converted (with --watch)",
+    )
+    options.add_argument(
+        "--poll-interval",
+        type=float,
+        help="Seconds between scans when polling for changes (with --watch)",
+    )
+    options.add_argument(
+        "--polling",
+        action="store_true",
+        help="Poll for changes instead of using inotify, e.g. on network shares",
+    )
+    options.add_argument(
+        "--shard",
+        type=Shard.parse,
+        metavar="INDEX/COUNT",
+        help="Only convert this shard of the sources, e.g. 2/4 (1-based)",
+    )
+    options.add_argument(
+        "--verbose", action="store_true", help="Enable verbose logging"
+    )
+
 
-    return parser.parse_args()
+def parse_args(argv: Optional[List[str]] = None):
+    """Parses command-line arguments.
+
+    A single source file can be given instead of ``--input-dir``, as
+    ``img-to-webp [options] SOURCE [-o OUTPUT]``.
+    """
+    options = argparse.ArgumentParser(add_help=False)
+    _add_options(options)
+    # Subcommands take the same options after their name. They only set the
+    # options given there, keeping those given before the name.
+    command_options = argparse.ArgumentParser(
+        add_help=False, argument_default=argparse.SUPPRESS
+    )
+    _add_options(command_options)
+
+    parser = argparse.ArgumentParser(
+        description="Image processing CLI tool",
+        parents=[options],
+        epilog="To convert a single file: %(prog)s [options] SOURCE [-o OUTPUT]",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser(
+        "serve",
+        parents=[command_options],
+        help="Serve WebP conversions of the input directory over HTTP",
+        description="Serve /<path>?w=&h=&mode=&q= as WebP, converting on demand. "
+        "The options configure the conversion.",
+    )
+    serve_parser.add_argument("--host", type=str, help="Address to listen on")
+    serve_parser.add_argument("--port", type=int, help="Port to listen on")
+    serve_parser.add_argument(
+        "--cache-size", type=int, help="In-memory output cache size in MB"
+    )
+    serve_parser.add_argument(
+        "--cache-dir", type=str, help="Directory for an on-disk output cache"
+    )
+    subparsers.add_parser(
+        "merge",
+        parents=[command_options],
+        help="Combine the per-shard reports of a sharded run into one report",
+        description="Read the reports written by every shard for --report and "
+        "write the combined report to --report.",
+    )
+    # Present even when no subcommand is given.
+    parser.set_defaults(
+        host=None, port=None, cache_size=None, cache_dir=None, source=None, output=None
+    )
+
+    # argparse cannot tell a positional source from a subcommand name, so the
+    # source is parsed separately and only used if it is not a subcommand.
+    file_parser = argparse.ArgumentParser(
+        prog=parser.prog, parents=[options], add_help=False
+    )
+    file_parser.add_argument("source", nargs="?", help="Image file to convert")
+    file_parser.add_argument(
+        "-o", "--output", type=str, help="Output file (default: SOURCE as .webp)"
+    )
+    file_parser.set_defaults(
+        command=None, host=None, port=None, cache_size=None, cache_dir=None
+    )
+    file_args, _ = file_parser.parse_known_args(argv)
+    if file_args.source is not None and file_args.source not in subparsers.choices:
+        return file_parser.parse_args(argv)
+    return parser.parse_args(argv)
@@ -3,9 +3,19 @@ import os
 from dataclasses import dataclass, field
 from typing import List, Optional, Tuple
 
-import yaml
-
-from ._models import ResizeRule, ResizeMode
+from ._memory import parse_memory_size
+from ._models import (
+    Compression,
+    DedupMode,
+    Gravity,
+    ResampleFilter,
+    ExecutorType,
+    ResizeMode,
+    ResizeRule,
+    Variant,
+    parse_variants,
+)
+from ._shard import Shard
 
 
 @dataclass
@@ -14,10 +24,53 @@ class Config:
     output_dir: str
     default_size: Optional[Tuple[int, int]] = None
     resize_rules: List[ResizeRule] = field(default_factory=list)
+    variants: List[Variant] = field(default_factory=list)
     default_resize_mode: ResizeMode = ResizeMode.CONTAIN
+    gravity: Gravity = Gravity.CENTER
+    resample: ResampleFilter = ResampleFilter.LANCZOS
+    reducing_gap: Optional[float] = None
+    no_upscale: bool = False
     quality: int = 80
+    method: int = 4
+    alpha_quality: int = 100
+    lossless: bool = False
+    compression: Optional[Compression] = None
+    all_pages: bool = False
+    include: List[str] = field(default_factory=list)
+    exclude: List[str] = field(default_factory=list)
+    max_depth: Optional[int] = None
+    follow_symlinks: bool = False
+    skip_hidden: bool = False
+    max_bytes: Optional[int] = None
+    min_ssim: Optional[float] = None
+    min_psnr: Optional[float] = None
+    max_output_ratio: Optional[float] = None
+    skip_oversized: bool = False
     overwrite: bool = False
     verbose: bool = False
+    jobs: int = 1
+    max_memory: Optional[int] = None
+    tile_pixels: Optional[int] = None
+    prefetch: int = 0
+    executor: ExecutorType = ExecutorType.PROCESS
+    incremental: bool = False
+    hash_sources: bool = False
+    dedup: Optional[DedupMode] = None
+    decode_reduction: bool = True
+    dry_run: bool = False
+    plan: Optional[str] = None
+    save_plan: Optional[str] = None
+    report: Optional[str] = None
+    prometheus_file: Optional[str] = None
+    watch: bool = False
+    debounce: float = 1.0
+    poll_interval: float = 1.0
+    polling: bool = False
+    shard: Optional[Shard] = None
+    host: str = "127.0.0.1"
+    port: int = 8080
+    cache_size: int = 64
+    cache_dir: Optional[str] = None
 
     @classmethod
     def from_yaml(cls, yaml_path: str) -> "Config":
@@ -25,6 +78,9 @@ class Config:
         if not os.path.exists(yaml_path):
             raise FileNotFoundError(f"Config file not found: {yaml_path}")
 
+        # Only needed with a config file; keeps yaml off the startup path.
+        import yaml
+
         with open(yaml_path, "r") as file:
             config_dict = yaml.safe_load(file)
 
@@ -36,13 +92,59 @@ class Config:
             input_dir=input_dir,
             output_dir=config_dict.get("output_dir", input_dir),
             resize_rules=resize_rules,
+            variants=parse_variants(config_dict.get("variants", [])),
             quality=config_dict.get("quality", 80),
+            method=config_dict.get("method", 4),
+            alpha_quality=config_dict.get("alpha_quality", 100),
+            lossless=config_dict.get("lossless", False),
+            compression=Compression(config_dict["compression"])
+            if config_dict.get("compression")
+            else None,
+            all_pages=config_dict.get("all_pages", False),
+            include=config_dict.get("include", []),
+            exclude=config_dict.get("exclude", []),
+            max_depth=config_dict.get("max_depth"),
+            follow_symlinks=config_dict.get("follow_symlinks", False),
+            skip_hidden=config_dict.get("skip_hidden", False),
+            max_bytes=config_dict.get("max_bytes"),
+            min_ssim=config_dict.get("min_ssim"),
+            min_psnr=config_dict.get("min_psnr"),
+            max_output_ratio=config_dict.get("max_output_ratio"),
+            skip_oversized=config_dict.get("skip_oversized", False),
             default_size=tuple(config_dict.get("default_size")) or None,
             default_resize_mode=ResizeMode(
                 config_dict.get("default_resize_mode", "contain")
             ),
+            gravity=Gravity(config_dict.get("gravity", "center")),
+            resample=ResampleFilter(config_dict.get("resample", "lanczos")),
+            reducing_gap=config_dict.get("reducing_gap"),
+            no_upscale=config_dict.get("no_upscale", False),
             overwrite=config_dict.get("overwrite", False),
             verbose=config_dict.get("verbose", False),
+            jobs=config_dict.get("jobs", 1),
+            max_memory=parse_memory_size(config_dict["max_memory"])
+            if config_dict.get("max_memory")
+            else None,
+            tile_pixels=config_dict.get("tile_pixels"),
+            prefetch=config_dict.get("prefetch", 0),
+            executor=ExecutorType(config_dict.get("executor", "process")),
+            incremental=config_dict.get("incremental", False),
+            hash_sources=config_dict.get("hash_sources", False),
+            dedup=DedupMode(config_dict["dedup"]) if config_dict.get("dedup") else None,
+            decode_reduction=config_dict.get("decode_reduction", True),
+            report=config_dict.get("report"),
+            prometheus_file=config_dict.get("prometheus_file"),
+            watch=config_dict.get("watch", False),
+            debounce=config_dict.get("debounce", 1.0),
+            poll_interval=config_dict.get("poll_interval", 1.0),
+            polling=config_dict.get("polling", False),
+            shard=Shard.parse(config_dict["shard"])
+            if config_dict.get("shard")
+            else None,
+            host=config_dict.get("host", "127.0.0.1"),
+            port=config_dict.get("port", 8080),
+            cache_size=config_dict.get("cache_size", 64),
+            cache_dir=config_dict.get("cache_dir"),
         )
 
     @classmethod
@@ -53,7 +155,12 @@ class Config:
         yaml_config = cls.from_yaml(yaml_path) if yaml_path else None
 
         input_dir = args.input_dir or (yaml_config.input_dir if yaml_config else "")
-        if not input_dir:
+        if (
+            not input_dir
+            and not args.plan
+            and not args.source
+            and args.command != "merge"
+        ):
             raise ValueError("Input directory is required")
 
         return cls(
@@ -61,7 +168,36 @@ class Config:
             output_dir=args.output_dir
             or (yaml_config.output_dir if yaml_config else input_dir),
             resize_rules=yaml_config.resize_rules if yaml_config else [],
+            variants=yaml_config.variants if yaml_config else [],
             quality=args.quality or (yaml_config.quality if yaml_config else 80),
+            method=args.method
+            if args.method is not None
+            else (yaml_config.method if yaml_config else 4),
+            alpha_quality=args.alpha_quality
+            if args.alpha_quality is not None
+            else (yaml_config.alpha_quality if yaml_config else 100),
+            lossless=args.lossless or (yaml_config.lossless if yaml_config else False),
+            compression=args.compression
+            or (yaml_config.compression if yaml_config else None),
+            all_pages=args.all_pages
+            or (yaml_config.all_pages if yaml_config else False),
+            include=args.include or (yaml_config.include if yaml_config else []),
+            exclude=args.exclude or (yaml_config.exclude if yaml_config else []),
+            max_depth=args.max_depth
+            if args.max_depth is not None
+            else (yaml_config.max_depth if yaml_config else None),
+            follow_symlinks=args.follow_symlinks
+            or (yaml_config.follow_symlinks if yaml_config else False),
+            skip_hidden=args.skip_hidden
+            or (yaml_config.skip_hidden if yaml_config else False),
+            max_bytes=args.max_bytes
+            or (yaml_config.max_bytes if yaml_config else None),
+            min_ssim=args.min_ssim or (yaml_config.min_ssim if yaml_config else None),
+            min_psnr=args.min_psnr or (yaml_config.min_psnr if yaml_config else None),
+            max_output_ratio=args.max_output_ratio
+            or (yaml_config.max_output_ratio if yaml_config else None),
+            skip_oversized=args.skip_oversized
+            or (yaml_config.skip_oversized if yaml_config else False),
             default_size=tuple(args.default_size)
             if args.default_size is not None
             else (
@@ -73,6 +209,59 @@ class Config:
                 args.default_resize_mode
                 or (yaml_config.default_resize_mode if yaml_config else "contain")
             ),
+            gravity=args.gravity
+            or (yaml_config.gravity if yaml_config else Gravity.CENTER),
+            resample=args.resample
+            or (yaml_config.resample if yaml_config else ResampleFilter.LANCZOS),
+            reducing_gap=args.reducing_gap
+            if args.reducing_gap is not None
+            else (yaml_config.reducing_gap if yaml_config else None),
+            no_upscale=args.no_upscale
+            or (yaml_config.no_upscale if yaml_config else False),
             overwrite=args.overwrite,
             verbose=args.verbose,
+            jobs=args.jobs
+            if args.jobs is not None
+            else (yaml_config.jobs if yaml_config else 1),
+            max_memory=args.max_memory
+            or (yaml_config.max_memory if yaml_config else None),
+            tile_pixels=args.tile_pixels
+            or (yaml_config.tile_pixels if yaml_config else None),
+            prefetch=args.prefetch
+            if args.prefetch is not None
+            else (yaml_config.prefetch if yaml_config else 0),
+            executor=ExecutorType(
+                args.executor or (yaml_config.executor if yaml_config else "process")
+            ),
+            incremental=args.incremental
+            or (yaml_config.incremental if yaml_config else False),
+            hash_sources=args.hash_sources
+            or (yaml_config.hash_sources if yaml_config else False),
+            dedup=args.dedup or (yaml_config.dedup if yaml_config else None),
+            decode_reduction=not args.no_decode_reduction
+            and (yaml_config.decode_reduction if yaml_config else True),
+            dry_run=args.dry_run,
+            plan=args.plan,
+            save_plan=args.save_plan,
+            report=args.report or (yaml_config.report if yaml_config else None),
+            prometheus_file=args.prometheus_file
+            or (yaml_config.prometheus_file if yaml_config else None),
+            watch=args.watch or (yaml_config.watch if yaml_config else False),
+            debounce=args.debounce
+            if args.debounce is not None
+            else (yaml_config.debounce if yaml_config else 1.0),
+            poll_interval=args.poll_interval
+            if args.poll_interval is not None
+            else (yaml_config.poll_interval if yaml_config else 1.0),
+            polling=args.polling or (yaml_config.polling if yaml_config else False),
+            shard=args.shard or (yaml_config.shard if yaml_config else None),
+            host=args.host or (yaml_config.host if yaml_config else "127.0.0.1"),
+            port=args.port
+            if args.port is not None
+            else (yaml_config.port if yaml_config else 8080),
+            cache_size=args.cache_size
+            if args.cache_size is not None
+            else (yaml_config.cache_size if yaml_config else 64),
+            cache_dir=args.cache_dir
+            or (yaml_config.cache_dir if yaml_config else None),
         )
@@ -0,0 +1,182 @@
+import errno
+import json
+import logging
+import os
+import shutil
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ._manifest import file_digest
+from ._models import DedupMode
+from ._shard import Shard
+
+DEDUP_INDEX_FILENAME = ".img-to-webp-dedup.jsonl"
+
+# FICLONE ioctl(2) request: share the source file's extents (Linux).
+_FICLONE = 0x40049409
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DedupEntry:
+    """Outputs converted from one source content with one set of settings."""
+
+    outputs: List[str]
+    # Size and modification time (ns) of each output when it was written.
+    stats: List[List[int]]
+    output_bytes: int = 0
+    seconds: float = 0.0
+
+
+@dataclass
+class _SourceDigest:
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class DedupIndex:
+    """Persistent map from source contents and settings to the outputs converted from them.
+
+    Stored as JSON lines in the output directory next to the manifest.
+    Source digests are cached by size and modification time, so unchanged
+    sources are not read again in later runs. Each shard of a sharded run
+    keeps its own index.
+    """
+
+    def __init__(self, output_dir: Path, shard: Optional[Shard] = None):
+        self._output_dir = output_dir
+        self._shard = shard
+        self._entries: Dict[str, DedupEntry] = {}
+        self._digests: Dict[str, _SourceDigest] = {}
+        # First output of each entry, to drop entries whose output was replaced.
+        self._keys_by_output: Dict[str, str] = {}
+
+    @property
+    def path(self) -> Path:
+        path = self._output_dir / DEDUP_INDEX_FILENAME
+        return path if self._shard is None else self._shard.path(path)
+
+    @classmethod
+    def load(cls, output_dir: Path, shard: Optional[Shard] = None) -> "DedupIndex":
+        """Loads the index from the output directory, or starts an empty one."""
+        index = cls(output_dir, shard)
+        if not index.path.exists():
+            return index
+
+        with open(index.path, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    if "key" in record:
+                        index._add(record.pop("key"), DedupEntry(**record))
+                    else:
+                        source = record.pop("source")
+                        index._digests[source] = _SourceDigest(**record)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Ignoring malformed dedup index line: {e}")
+        return index
+
+    def key(
+        self, source: str, src_path: Path, file_size: int, mtime_ns: int, settings: str
+    ) -> str:
+        """Returns the content and settings key of a source, hashing it if it changed."""
+        cached = self._digests.get(source)
+        if cached is None or (cached.size, cached.mtime_ns) != (file_size, mtime_ns):
+            cached = _SourceDigest(file_size, mtime_ns, file_digest(src_path))
+            self._digests[source] = cached
+        return f"{cached.digest}-{settings}"
+
+    def find(self, key: str) -> Optional[DedupEntry]:
+        """Returns the entry for a key if all its outputs are still as they were written."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        for output, stat in zip(entry.outputs, entry.stats):
+            try:
+                output_stat = (self._output_dir / output).stat()
+            except FileNotFoundError:
+                break
+            if [output_stat.st_size, output_stat.st_mtime_ns] != stat:
+                break
+        else:
+            return entry
+        self._remove(key)
+        return None
+
+    def record(self, key: str, output_paths: List[Path], seconds: float) -> DedupEntry:
+        """Records the outputs just converted for a key."""
+        stats = [output_path.stat() for output_path in output_paths]
+        self._remove(self._keys_by_output.get(self._relative(output_paths[0])))
+        entry = DedupEntry(
+            outputs=[self._relative(output_path) for output_path in output_paths],
+            stats=[[stat.st_size, stat.st_mtime_ns] for stat in stats],
+            output_bytes=sum(stat.st_size for stat in stats),
+            seconds=seconds,
+        )
+        self._add(key, entry)
+        return entry
+
+    def save(self):
+        """Atomically writes the index to the output directory."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as file:
+            for source, digest in self._digests.items():
+                file.write(json.dumps({"source": source, **asdict(digest)}) + "\n")
+            for key, entry in self._entries.items():
+                file.write(json.dumps({"key": key, **asdict(entry)}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _add(self, key: str, entry: DedupEntry):
+        self._remove(key)
+        self._entries[key] = entry
+        self._keys_by_output[entry.outputs[0]] = key
+
+    def _remove(self, key: Optional[str]):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._keys_by_output.pop(entry.outputs[0], None)
+
+    def _relative(self, output_path: Path) -> str:
+        return output_path.relative_to(self._output_dir).as_posix()
+
+
+def link_file(src: Path, dst: Path, mode: DedupMode) -> DedupMode:
+    """Makes `dst` a hardlink, reflink or copy of `src`, replacing it atomically.
+
+    Falls back to a copy where the filesystem cannot link; returns the mode
+    that was used.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = dst.with_name(f"{dst.name}.{os.getpid()}.tmp")
+    try:
+        try:
+            if mode == DedupMode.HARDLINK:
+                os.link(src, tmp_path)
+            elif mode == DedupMode.REFLINK:
+                _reflink(src, tmp_path)
+        except OSError as e:
+            logger.debug(f"Cannot {mode} {src}, copying instead: {e}")
+            tmp_path.unlink(missing_ok=True)
+            mode = DedupMode.COPY
+        if mode == DedupMode.COPY:
+            shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return mode
+
+
+def _reflink(src: Path, dst: Path):
+    """Clones a file's extents on copy-on-write filesystems (Btrfs, XFS)."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are not supported on this platform")
+    with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+        fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
@@ -0,0 +1,295 @@
+import functools
+import io
+import math
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageMath, ImageStat
+
+# Registers the WebP encoder; otherwise the first save imports every plugin.
+from PIL import WebPImagePlugin  # noqa: F401
+
+from ._models import Compression, EncodeSettings
+
+# SSIM is averaged over non-overlapping blocks of this size.
+_SSIM_BLOCK = 8
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+_MAX_QUALITY = 100
+
+# Auto compression thresholds, calibrated on synthetic logos, charts,
+# screenshots and photos. Images with at most this many colors are
+# palette-encoded by lossless WebP and always come out smaller than lossy.
+_PALETTE_COLORS = 256
+# Graphics such as text, UI and diagrams have large flat areas and many hard
+# edges, where lossy WebP rings and spends the most bytes. Flat photos
+# (products on a plain background) have few hard edges and stay lossy.
+_FLAT_RATIO = 0.35
+_EDGE_RATIO = 0.05
+# Neighbor difference that counts as a hard edge.
+_EDGE_THRESHOLD = 32
+
+# Near-lossless rounds each color channel to a multiple of 4 (error <= 2)
+# before lossless encoding; alpha is kept exact.
+_NEAR_LOSSLESS_LUT = [min((value + 2) & ~3, 255) for value in range(256)]
+_IDENTITY_LUT = list(range(256))
+
+
+@dataclass
+class EncodeResult:
+    """An encoded image; ``buffer`` is the caller's stream when one was given."""
+
+    buffer: BinaryIO
+    quality: int
+    compression: Compression = Compression.LOSSY
+    trials: int = 1
+    reason: Optional[str] = None
+
+
+@dataclass
+class ContentStats:
+    """Cheap statistics of a resized image used to pick its compression."""
+
+    colors: Optional[int]
+    flat_ratio: float
+    edge_ratio: float
+
+    def __str__(self) -> str:
+        colors = f">{_PALETTE_COLORS}" if self.colors is None else self.colors
+        return (
+            f"colors {colors}, flat {self.flat_ratio:.2f}, edges {self.edge_ratio:.3f}"
+        )
+
+
+def analyze_content(img: Image.Image) -> ContentStats:
+    """Counts colors and compares each pixel with its left neighbor."""
+    colors = img.getcolors(_PALETTE_COLORS)
+    if img.width < 2:
+        return ContentStats(len(colors) if colors else None, 0.0, 0.0)
+
+    difference = ImageChops.difference(
+        img.crop((1, 0, img.width, img.height)),
+        img.crop((0, 0, img.width - 1, img.height)),
+    )
+    # Largest difference over all bands, so a pixel is flat only if every band matches.
+    largest = functools.reduce(ImageChops.lighter, difference.split())
+    histogram = largest.histogram()
+    pixels = sum(histogram)
+    return ContentStats(
+        colors=len(colors) if colors else None,
+        flat_ratio=histogram[0] / pixels,
+        edge_ratio=sum(histogram[_EDGE_THRESHOLD:]) / pixels,
+    )
+
+
+def choose_compression(stats: ContentStats) -> Compression:
+    """Picks lossless for palette-able images, near-lossless for graphics, else lossy."""
+    if stats.colors is not None:
+        return Compression.LOSSLESS
+    if stats.flat_ratio >= _FLAT_RATIO and stats.edge_ratio >= _EDGE_RATIO:
+        return Compression.NEAR_LOSSLESS
+    return Compression.LOSSY
+
+
+def resolve_compression(
+    img: Image.Image, settings: EncodeSettings
+) -> Tuple[Compression, Optional[str]]:
+    """Returns the compression for an image and, for auto, the statistics behind it."""
+    compression = settings.compression or Compression.LOSSY
+    if compression != Compression.AUTO:
+        return compression, None
+    stats = analyze_content(img)
+    return choose_compression(stats), str(stats)
+
+
+def to_near_lossless(img: Image.Image) -> Image.Image:
+    """Rounds the color channels of an RGB(A) image for near-lossless encoding."""
+    return img.point(_NEAR_LOSSLESS_LUT * 3 + _IDENTITY_LUT * (len(img.getbands()) - 3))
+
+
+def measure_psnr(reference: Image.Image, candidate: Image.Image) -> float:
+    """Peak signal-to-noise ratio in dB over the visible RGB channels."""
+    difference = ImageChops.difference(_flatten(reference), _flatten(candidate))
+    stat = ImageStat.Stat(difference)
+    mse = sum(stat.sum2) / (len(stat.sum2) * reference.width * reference.height)
+    return math.inf if mse == 0 else 10 * math.log10(255**2 / mse)
+
+
+def measure_ssim(reference: Image.Image, candidate: Image.Image) -> float:
+    """Structural similarity of the luma channels, averaged over 8x8 blocks."""
+    x = _flatten(reference).convert("L").convert("F")
+    y = _flatten(candidate).convert("L").convert("F")
+    block = min(_SSIM_BLOCK, x.width, x.height)
+
+    def mean(img: Image.Image) -> Image.Image:
+        return img.reduce(block)
+
+    def product(a: Image.Image, b: Image.Image) -> Image.Image:
+        return ImageMath.lambda_eval(lambda args: args["a"] * args["b"], a=a, b=b)
+
+    ssim_map = ImageMath.lambda_eval(
+        lambda args: (
+            (
+                (2 * args["mx"] * args["my"] + _SSIM_C1)
+                * (2 * (args["xy"] - args["mx"] * args["my"]) + _SSIM_C2)
+            )
+            / (
+                (args["mx"] * args["mx"] + args["my"] * args["my"] + _SSIM_C1)
+                * (
+                    args["xx"]
+                    - args["mx"] * args["mx"]
+                    + args["yy"]
+                    - args["my"] * args["my"]
+                    + _SSIM_C2
+                )
+            )
+        ),
+        mx=mean(x),
+        my=mean(y),
+        xx=mean(product(x, x)),
+        yy=mean(product(y, y)),
+        xy=mean(product(x, y)),
+    )
+    return ssim_map.resize((1, 1), Image.Resampling.BOX).getpixel((0, 0))
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    """Composites an image onto black so only visible pixels are compared."""
+    if img.mode != "RGBA":
+        return img.convert("RGB")
+    background = Image.new("RGBA", img.size, (0, 0, 0, 255))
+    return Image.alpha_composite(background, img).convert("RGB")
+
+
+class WebPEncoder:
+    """Encodes images to WebP in memory, searching the quality when a target is set.
+
+    The search is a bisection over integer qualities. It starts from the
+    quality chosen for the previous image of a similar size and gallops away
+    from it, so similar images usually settle in two or three trial encodes.
+    """
+
+    def __init__(self):
+        self._seeds: Dict[Tuple, int] = {}
+
+    def encode(
+        self,
+        img: Image.Image,
+        settings: EncodeSettings,
+        dst: Optional[BinaryIO] = None,
+    ) -> EncodeResult:
+        """Encodes an image, into ``dst`` if given.
+
+        Without a target there is a single encode, written straight to
+        ``dst``; a target search keeps its trials in memory and copies the
+        chosen one.
+        """
+        compression, reason = resolve_compression(img, settings)
+        if compression != Compression.LOSSY:
+            if compression == Compression.NEAR_LOSSLESS:
+                img = to_near_lossless(img)
+            buffer = self._save(img, settings, settings.quality, True, dst)
+            return EncodeResult(buffer, settings.quality, compression, reason=reason)
+
+        if not settings.has_target:
+            buffer = self._save(img, settings, settings.quality, dst=dst)
+            return EncodeResult(buffer, settings.quality, reason=reason)
+
+        trials: Dict[int, io.BytesIO] = {}
+
+        def trial(quality: int) -> io.BytesIO:
+            if quality not in trials:
+                trials[quality] = self._save(img, settings, quality)
+            return trials[quality]
+
+        if settings.max_bytes is not None:
+            # The highest quality that fits the budget, or the smallest output.
+            def fits(quality: int) -> bool:
+                return trial(quality).tell() <= settings.max_bytes
+
+            seed_key = self._seed_key(img, "max_bytes", settings.max_bytes)
+            quality = self._find_last(fits, self._seeds.get(seed_key, settings.quality))
+            quality = max(quality, 0)
+        else:
+            # The lowest quality that reaches the score, searched as the last
+            # failing quality counted down from 100, or 100 if none reach it.
+            if settings.min_ssim is not None:
+                measure, goal = measure_ssim, settings.min_ssim
+                seed_key = self._seed_key(img, "min_ssim", goal)
+            else:
+                measure, goal = measure_psnr, settings.min_psnr
+                seed_key = self._seed_key(img, "min_psnr", goal)
+
+            def reaches(inverted: int) -> bool:
+                buffer = trial(_MAX_QUALITY - inverted)
+                buffer.seek(0)
+                with Image.open(buffer) as decoded:
+                    return measure(img, decoded) >= goal
+
+            seed = self._seeds.get(seed_key, settings.quality)
+            quality = _MAX_QUALITY - max(
+                self._find_last(reaches, _MAX_QUALITY - seed), 0
+            )
+
+        self._seeds[seed_key] = quality
+        buffer = trial(quality)
+        buffer.seek(0, io.SEEK_END)
+        if dst is not None:
+            dst.write(buffer.getbuffer())
+            buffer = dst
+        return EncodeResult(buffer, quality, trials=len(trials), reason=reason)
+
+    @staticmethod
+    def _save(
+        img: Image.Image,
+        settings: EncodeSettings,
+        quality: int,
+        lossless=False,
+        dst: Optional[BinaryIO] = None,
+    ) -> BinaryIO:
+        """Encodes one trial, into ``dst`` or a new buffer; in lossless mode the
+        quality sets the encoder effort."""
+        options = {
+            name: getattr(settings, name)
+            for name in ("method", "alpha_quality")
+            if getattr(settings, name) is not None
+        }
+        buffer = io.BytesIO() if dst is None else dst
+        img.save(buffer, "WEBP", quality=quality, lossless=lossless, **options)
+        return buffer
+
+    @staticmethod
+    def _seed_key(img: Image.Image, target: str, goal: float) -> Tuple:
+        """Groups images whose pixel counts are within a factor of two."""
+        return target, goal, img.mode, round(math.log2(max(img.width * img.height, 1)))
+
+    @staticmethod
+    def _find_last(ok: Callable[[int], bool], seed: int) -> int:
+        """Returns the largest value in [0, 100] for which `ok` holds, or -1.
+
+        `ok` must hold for every value below the result and for none above it.
+        The bracket is found by galloping from `seed`, then bisected.
+        """
+        seed = min(max(seed, 0), _MAX_QUALITY)
+        step = 1
+        if ok(seed):
+            low = seed
+            while low + step <= _MAX_QUALITY and ok(low + step):
+                low += step
+                step *= 2
+            high = min(low + step, _MAX_QUALITY + 1)
+        else:
+            high = seed
+            while high - step >= 0 and not ok(high - step):
+                high -= step
+                step *= 2
+            low = max(high - step, -1)
+
+        while high - low > 1:
+            middle = (low + high) // 2
+            if ok(middle):
+                low = middle
+            else:
+                high = middle
+        return low
@@ -9,3 +9,11 @@ class InputDirNotFoundError(RuntimeError):
 class ImageFileAlreadyExistsError(RuntimeError):
     def __init__(self, output_path: Path):
         super().__init__(f"Output file already exists: {output_path}")
+
+
+class AnimationTooLargeError(RuntimeError):
+    def __init__(self, max_pixels: int):
+        super().__init__(
+            f"Animation exceeds {max_pixels} pixels, which must be kept in memory "
+            "without Pillow's animation encoder"
+        )
@@ -1,20 +1,127 @@
+import contextlib
+import hashlib
+import io
+import json
 import logging
-import re
+import math
+import os
+import queue
+import signal
+import threading
+from collections import deque
+from dataclasses import replace
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Optional
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple, Optional, Deque
 
-import PIL
-from PIL import Image
+from PIL import Image, ImageSequence
 
-from ._exceptions import InputDirNotFoundError, ImageFileAlreadyExistsError
-from ._models import ResizeRule, ResizeMode
+from ._animation import AnimationWriter, get_loop
+from ._archive import ArchiveMember, ArchiveWriter, is_archive, iter_members
+from ._dedup import DedupEntry, DedupIndex, link_file
+from ._encoder import EncodeResult, WebPEncoder
+from ._exceptions import (
+    AnimationTooLargeError,
+    InputDirNotFoundError,
+    ImageFileAlreadyExistsError,
+)
+from ._manifest import BuildManifest, ManifestStatus
+from ._metrics import DedupStats, ImageMetrics, MetricsHook, PipelineStage, RunReport
+from ._models import (
+    Compression,
+    DedupMode,
+    EncodeSettings,
+    ExecutorType,
+    Gravity,
+    ResampleFilter,
+    ResizeMode,
+    ResizeRule,
+    Variant,
+    parse_variants,
+)
+from ._memory import MemoryBudget, estimate_memory, largest_first
+from ._pipeline import prefetch, write_atomic
+from ._plugins import load_plugin
+from ._planner import JobPlan, PlanAction, PlannedJob, PlanSummary
 from ._resize_strategy import ResizeStrategyFactoryProxy, ResizeStrategy
+from ._rule_matcher import RuleMatcher
+from ._shard import Shard
+from ._scanner import DirectoryScanner
+from ._tiling import resize_in_strips
+from ._streams import BufferLike, open_buffer
+from ._watcher import ChangeType, DirectoryWatcher, FileChange
 
 SUPPORTED_FORMATS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff"}
 
-logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# Number of in-flight jobs per worker; bounds memory when the input tree is huge.
+_JOBS_PER_WORKER = 4
+
+# With a memory budget, jobs are reordered largest first within this many
+# upcoming jobs.
+_REORDER_WINDOW = 256
+
+# Sources with more pixels than this are converted and resized in strips.
+_TILE_PIXELS = 64_000_000
+
+# Decode-time reduction leaves at least this much downscaling to the final
+# resample, matching Pillow's thumbnail default. Against a full-resolution
+# decode this keeps PSNR above 50 dB on photographic content.
+_DECODE_REDUCING_GAP = 2.0
+
+_VARIANT_INDEX_SUFFIX = ".variants.json"
+
+# Detected changes waiting for conversion in watch mode; the watcher blocks
+# when the queue is full.
+_WATCH_QUEUE_SIZE = 1024
+# Longest wait before checking whether watch mode should stop (seconds).
+_WATCH_WAKEUP_INTERVAL = 0.5
+# Images listed in the report in watch mode; its totals cover every image.
+_WATCH_REPORT_IMAGES = 1000
+
+# Modes that can be box-reduced without palette or premultiplied-alpha issues.
+_REDUCIBLE_MODES = {"L", "RGB", "CMYK"}
+
+# Modes that resample correctly and widen to RGB(A) pixel by pixel, so they are
+# resized natively and converted for the encoder afterwards, at output size.
+_RESAMPLE_MODES = {"L", "LA", "RGB", "RGBA"}
+
+# Modes the WebP encoder accepts without conversion.
+_WEBP_MODES = {"RGB", "RGBA"}
+
+_worker_processor: Optional["ImageProcessor"] = None
+
+# Outputs of the job being converted on this thread, when they go to an
+# archive instead of the output directory.
+_captured_outputs = threading.local()
+
+# Paths written (None on failure), the job's metrics, and the captured
+# (path, data) outputs when writing to an archive.
+_JobResult = Tuple[
+    Optional[List[Path]], Optional[ImageMetrics], Optional[List[Tuple[Path, bytes]]]
+]
+
+
+def _init_worker(processor: "ImageProcessor"):
+    """Stores the processor in a pool worker and leaves Ctrl-C to the parent."""
+    global _worker_processor
+    _worker_processor = processor
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _process_in_worker(job: PlannedJob) -> _JobResult:
+    return _worker_processor._try_convert(job)
+
+
+def _render_in_worker(
+    img_path: Path,
+    size: Optional[Tuple[int, int]] = None,
+    resize_mode: Optional[ResizeMode] = None,
+    quality: Optional[int] = None,
+) -> bytes:
+    return _worker_processor.render(img_path, size, resize_mode, quality)
+
 
 class ImageProcessor:
     def __init__(
@@ -27,6 +134,39 @@ class ImageProcessor:
         resize_rules: Optional[List[ResizeRule]] = None,
         default_size: Optional[Tuple[int, int]] = None,
         quality: Optional[int] = 80,
+        method: Optional[int] = 4,
+        alpha_quality: Optional[int] = 100,
+        lossless: Optional[bool] = False,
+        max_bytes: Optional[int] = None,
+        min_ssim: Optional[float] = None,
+        min_psnr: Optional[float] = None,
+        compression: Optional[Compression] = None,
+        all_pages: Optional[bool] = False,
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_depth: Optional[int] = None,
+        follow_symlinks: Optional[bool] = False,
+        skip_hidden: Optional[bool] = False,
+        jobs: Optional[int] = 1,
+        executor: Optional[ExecutorType] = ExecutorType.PROCESS,
+        incremental: Optional[bool] = False,
+        hash_sources: Optional[bool] = False,
+        dedup: Optional[DedupMode] = None,
+        decode_reduction: Optional[bool] = True,
+        variants: Optional[List[Variant]] = None,
+        hooks: Optional[List[MetricsHook]] = None,
+        report: Optional[str] = None,
+        prometheus_file: Optional[str] = None,
+        shard: Optional[Shard] = None,
+        gravity: Optional[Gravity] = Gravity.CENTER,
+        resample: Optional[ResampleFilter] = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+        max_memory: Optional[int] = None,
+        tile_pixels: Optional[int] = None,
+        prefetch: Optional[int] = 0,
+        no_upscale: Optional[bool] = False,
+        max_output_ratio: Optional[float] = None,
+        skip_oversized: Optional[bool] = False,
     ):
         self._input_dir = Path(input_dir) if input_dir else None
         self._output_dir = Path(output_dir) if output_dir else None
@@ -34,82 +174,1635 @@ class ImageProcessor:
         self._default_resize_mode = default_resize_mode
         self._verbose = verbose
         self._resize_rules = resize_rules or []
+        self._rule_matcher = RuleMatcher(self._resize_rules)
         self._default_size = default_size
-        self._quality = quality
+        self._gravity = Gravity(gravity) if gravity else Gravity.CENTER
+        self._resample = (
+            ResampleFilter(resample) if resample else ResampleFilter.LANCZOS
+        )
+        if reducing_gap is not None and reducing_gap < 1:
+            raise ValueError(f"reducing_gap must be 1.0 or greater: {reducing_gap}")
+        self._reducing_gap = reducing_gap
+        self._max_memory = max_memory
+        self._tile_pixels = tile_pixels or _TILE_PIXELS
+        self._prefetch = prefetch or 0
+        self._no_upscale = bool(no_upscale)
+        if max_output_ratio is not None and max_output_ratio <= 0:
+            raise ValueError(f"max_output_ratio must be positive: {max_output_ratio}")
+        self._max_output_ratio = max_output_ratio
+        self._skip_oversized = skip_oversized
+        self._encoding = EncodeSettings(
+            quality,
+            method,
+            alpha_quality,
+            lossless,
+            max_bytes,
+            min_ssim,
+            min_psnr,
+            compression,
+        )
+        self._encoder = WebPEncoder()
+        self._all_pages = all_pages
+        self._include = include or []
+        self._exclude = exclude or []
+        self._max_depth = max_depth
+        self._follow_symlinks = follow_symlinks
+        self._skip_hidden = skip_hidden
+        self._jobs = jobs if jobs and jobs > 0 else (os.cpu_count() or 1)
+        self._executor = executor
+        self._incremental = incremental
+        self._hash_sources = hash_sources
+        self._dedup = DedupMode(dedup) if dedup else None
+        self._dedup_index: Optional[DedupIndex] = None
+        self._dedup_stats = DedupStats()
+        self._archive_writer: Optional[ArchiveWriter] = None
+        self._decode_reduction = decode_reduction
+        self._variants = parse_variants(variants or [])
+        self._hooks = list(hooks or [])
+        self._shard = Shard.parse(shard) if isinstance(shard, str) else shard
+        # Each shard writes its own report for `merge_shard_reports`.
+        self._report_path = (
+            str(self._shard.path(Path(report)))
+            if report and self._shard is not None
+            else report
+        )
+        self._prometheus_file = prometheus_file
+        self._report = RunReport() if report or prometheus_file else None
+        if self._report is not None:
+            self._hooks.append(self._report)
+            if self._shard is not None:
+                self._report.shard = str(self._shard)
+            if self._dedup is not None:
+                self._report.dedup = self._dedup_stats
+        # Metrics are only recorded when something consumes them; dedup
+        # records conversion times to report the time saved.
+        self._instrumented = bool(self._hooks) or self._dedup is not None
 
         self._resize_strategy_factory = ResizeStrategyFactoryProxy()
+        self._check_archives()
 
         log_level = logging.DEBUG if verbose else logging.INFO
         logging.getLogger().setLevel(log_level)
 
+    def __getstate__(self):
+        # Hooks run in the parent process; pool workers only record metrics.
+        state = self.__dict__.copy()
+        state["_hooks"] = []
+        state["_report"] = None
+        state["_dedup_index"] = None
+        state["_archive_writer"] = None
+        return state
+
     def process_all_images(self):
         """Processes all images in the input directory."""
-        if not self._input_dir.exists():
-            raise InputDirNotFoundError(self._input_dir)
+        self._check_input_dir()
+        self._initialize_output_dir()
+
+        manifest = self._load_manifest()
+        with self._archive_output():
+            summary = self._process_tree(manifest)
+        self._write_reports()
+        self._log_summary(summary, manifest is not None)
+
+    def watch(
+        self,
+        debounce: float = 1.0,
+        poll_interval: float = 1.0,
+        polling: bool = False,
+        stop: Optional[threading.Event] = None,
+    ):
+        """Converts new and changed images as they appear, until interrupted or `stop` is set.
+
+        The input directory is processed incrementally first. Then a
+        `DirectoryWatcher` queues settled changes and each batch is converted
+        like an incremental run over just those files; deleted and renamed
+        sources are resolved through the manifest, which is always kept in
+        watch mode. Images and batches that fail are logged and skipped.
+        """
+        self._check_input_dir()
+        if is_archive(self._input_dir):
+            raise ValueError("Archives cannot be watched")
         self._initialize_output_dir()
+        stop = stop or threading.Event()
+        # The report is rewritten after every batch.
+        if self._report is not None:
+            self._report.keep_recent(_WATCH_REPORT_IMAGES)
 
-        [total_images, processed_images] = [0, 0]
-        for image_path in self._input_dir.rglob("*"):
-            if image_path.suffix.lower() in SUPPORTED_FORMATS:
+        watcher = DirectoryWatcher(
+            self._input_dir,
+            self._create_scanner().accepts,
+            debounce,
+            poll_interval,
+            polling,
+        )
+        # Watch before the initial scan so changes made during it are not lost.
+        watcher.start()
+        changes: queue.Queue = queue.Queue(maxsize=_WATCH_QUEUE_SIZE)
+        thread = threading.Thread(
+            target=watcher.run, args=(changes, stop), name="img-to-webp-watcher"
+        )
+        thread.start()
+        try:
+            manifest = BuildManifest.load(
+                self._output_dir, self._hash_sources, self._shard
+            )
+            summary = self._process_tree(manifest)
+            self._write_reports()
+            self._log_summary(summary, True)
+            logger.info(f"Watching {self._input_dir} for changes ({watcher.backend}).")
+
+            while not stop.is_set():
                 try:
-                    total_images += 1
-                    self.process_image(image_path)
-                    processed_images += 1
-                except (PIL.UnidentifiedImageError, ImageFileAlreadyExistsError) as e:
-                    logger.error(f"Skipping {image_path.name}: {e}")
+                    batch = [changes.get(timeout=_WATCH_WAKEUP_INTERVAL)]
+                except queue.Empty:
+                    continue
+                # Enough changes to keep every worker busy.
+                while len(batch) < self._jobs * _JOBS_PER_WORKER:
+                    try:
+                        batch.append(changes.get_nowait())
+                    except queue.Empty:
+                        break
+                try:
+                    self._process_changes(batch, manifest)
+                except Exception:
+                    # E.g. an output that cannot be written; later changes
+                    # are still converted.
+                    logger.exception("Cannot apply changes")
+        except KeyboardInterrupt:
+            logger.info("Stopped watching.")
+        finally:
+            stop.set()
+            thread.join()
+            watcher.close()
+        if watcher.error is not None:
+            raise watcher.error
 
-        logger.info("Processing complete.")
-        logger.info(f"Total images: {total_images}")
-        logger.info(f"Processed images: {processed_images}")
+    def _process_tree(self, manifest: Optional[BuildManifest]) -> PlanSummary:
+        """Converts every image in the input directory, pruning outputs of removed sources."""
+        seen_sources = set()
+
+        def jobs() -> Iterator[PlannedJob]:
+            for job in self._iter_plan(
+                manifest, read_headers=self._max_memory is not None, read_data=True
+            ):
+                seen_sources.add(job.source)
+                yield job
+
+        try:
+            summary = self._execute(jobs(), manifest)
+            if manifest is not None:
+                for output_path in manifest.prune(seen_sources):
+                    logger.info(f"Pruned stale output: {output_path}")
+        finally:
+            if manifest is not None:
+                manifest.save()
+        return summary
+
+    def _process_changes(self, changes: List[FileChange], manifest: BuildManifest):
+        """Applies a batch of watched changes: converts, renames or removes outputs."""
+        paths = {}
+        for change in changes:
+            if change.type == ChangeType.DELETED:
+                self._remove_outputs(change.path, manifest)
+                continue
+            if change.type == ChangeType.MOVED:
+                if self._move_outputs(change.old_path, change.path, manifest):
+                    continue
+                self._remove_outputs(change.old_path, manifest)
+            paths[self._input_dir / change.path] = None
+
+        try:
+            self._execute(
+                self._iter_plan(manifest, self._max_memory is not None, paths=paths),
+                manifest,
+            )
+        finally:
+            manifest.save()
+        self._write_reports()
+
+    def _remove_outputs(self, source: Path, manifest: BuildManifest):
+        for output_path in manifest.remove(source.as_posix()):
+            logger.info(f"Removed output: {output_path}")
+
+    def _move_outputs(
+        self, old_source: Path, new_source: Path, manifest: BuildManifest
+    ) -> bool:
+        """Renames a renamed source's output instead of converting it again.
+
+        Only applies to single-output sources whose settings and contents are
+        unchanged by the rename.
+        """
+        entry = manifest.get(old_source.as_posix())
+        new_path = self._input_dir / new_source
+        if (
+            entry is None
+            or len(entry.outputs) != 1
+            or not new_path.exists()
+            or not self._in_shard(new_source)
+        ):
+            return False
+        size, resize_mode = self._get_size_and_resize_mode(new_path.name)
+        variants = self._get_variants(new_path.name, size, resize_mode)
+        settings = self._get_settings_key(
+            size,
+            resize_mode,
+            self._get_encoding(new_path.name),
+            variants,
+            new_path.name,
+        )
+        src_stat = new_path.stat()
+        old_output = self._output_dir / entry.outputs[0]
+        new_output = self._output_dir / self._get_output_path(new_source, variants)
+        if (
+            variants
+            or settings != entry.settings
+            or (src_stat.st_size, src_stat.st_mtime_ns) != (entry.size, entry.mtime_ns)
+            or not old_output.exists()
+            or (new_output.exists() and not self._overwrite)
+        ):
+            return False
 
-    def process_image(self, img_path: Path) -> Optional[Path]:
-        """Processes a single image file."""
+        new_output.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(old_output, new_output)
+        manifest.move(old_source.as_posix(), new_source.as_posix(), [new_output])
+        logger.info(f"Moved: {old_output} -> {new_output}")
+        return True
 
-        with Image.open(img_path) as img:
-            img = img.convert("RGBA")
+    def create_plan(self, read_headers: bool = True) -> JobPlan:
+        """Scans the input directory and plans every conversion without writing anything.
 
-            size, resize_mode = self._get_size_and_resize_mode(img_path.name)
+        With ``read_headers`` each source's header is read for its dimensions; pixel
+        data is never decoded.
+        """
+        self._check_input_dir()
+        output_dir = self._output_dir or self._input_dir
+        manifest = (
+            BuildManifest.load(output_dir, self._hash_sources, self._shard)
+            if self._incremental
+            else None
+        )
+        return JobPlan(
+            input_dir=str(self._input_dir),
+            output_dir=str(output_dir),
+            jobs=list(self._iter_plan(manifest, read_headers, output_dir)),
+        )
+
+    def execute_plan(self, plan: JobPlan):
+        """Executes a plan created by `create_plan`, possibly in an earlier run."""
+        self._input_dir = Path(plan.input_dir)
+        self._output_dir = Path(plan.output_dir)
+        self._check_input_dir()
+        self._initialize_output_dir()
 
-            resize_strategy: ResizeStrategy = (
-                self._resize_strategy_factory.get_strategy(resize_mode)
+        manifest = self._load_manifest()
+        jobs = (
+            self._read_archive_jobs(plan.jobs)
+            if is_archive(self._input_dir)
+            else plan.jobs
+        )
+        try:
+            with self._archive_output():
+                summary = self._execute(jobs, manifest)
+        finally:
+            if manifest is not None:
+                manifest.save()
+
+        self._write_reports()
+        self._log_summary(summary, manifest is not None)
+
+    @staticmethod
+    def log_plan(plan: JobPlan):
+        """Logs a plan's jobs (at debug level) and its summary."""
+        for job in plan.jobs:
+            logger.debug(
+                f"{job.action}: {job.source} -> {job.output} ({job.size}) ({job.mode})"
+                + (f": {job.reason}" if job.reason else "")
             )
+        summary = plan.summarize()
+        logger.info(f"Planned images: {summary.total}")
+        logger.info(f"To convert: {summary.convert}")
+        logger.info(f"To skip: {summary.skip}")
+        logger.info(f"Collisions: {summary.collision}")
+        logger.info(f"Invalid images: {summary.invalid}")
+        logger.info(f"Input pixels: {summary.input_pixels}")
+        logger.info(f"Input bytes: {summary.input_bytes}")
 
-            img = resize_strategy.resize(img, size)
+    def _iter_plan(
+        self,
+        manifest: Optional[BuildManifest],
+        read_headers: bool,
+        output_dir: Optional[Path] = None,
+        paths: Optional[Iterable[Path]] = None,
+        read_data: bool = False,
+    ) -> Iterator[PlannedJob]:
+        """Scans the input directory, yielding a planned job per supported image.
 
-            relative_path = img_path.relative_to(self._input_dir)
-            output_path = self._output_dir / relative_path.with_suffix(".webp")
-            output_path.parent.mkdir(parents=True, exist_ok=True)
+        With ``paths``, only those sources are planned. For an input archive,
+        ``read_data`` attaches each member's bytes to its job, since members
+        can only be read while the archive is being scanned.
+        """
+        output_dir = output_dir or self._output_dir
+        output_sources = {}
+        for image_path, file_size, mtime_ns, member in self._iter_sources(
+            output_dir, paths
+        ):
+            relative_path = image_path.relative_to(self._input_dir)
+            if not self._in_shard(relative_path):
+                continue
+            size, resize_mode = self._get_size_and_resize_mode(image_path.name)
+            variants = self._get_variants(image_path.name, size, resize_mode)
+            job = PlannedJob(
+                source=relative_path.as_posix(),
+                output=self._get_output_path(relative_path, variants).as_posix(),
+                action=PlanAction.CONVERT,
+                size=size,
+                mode=resize_mode,
+                file_size=file_size,
+                mtime_ns=mtime_ns,
+                settings=self._get_settings_key(
+                    size,
+                    resize_mode,
+                    self._get_encoding(image_path.name),
+                    variants,
+                    image_path.name,
+                ),
+                variants=variants,
+            )
+
+            if job.output in output_sources:
+                job.action = PlanAction.COLLISION
+                job.reason = f"Output collides with {output_sources[job.output]}"
+                yield job
+                continue
+            output_sources[job.output] = job.source
+
+            if manifest is not None:
+                status = manifest.check(
+                    job.source, image_path, job.file_size, job.mtime_ns, job.settings
+                )
+                if status == ManifestStatus.UNCHANGED:
+                    job.action = PlanAction.UNCHANGED
+                elif status != ManifestStatus.NEW:
+                    job.overwrite = True
 
-            if not self._overwrite and output_path.exists():
-                raise ImageFileAlreadyExistsError(output_path)
+            output_path = output_dir / job.output
+            if (
+                job.action == PlanAction.CONVERT
+                and not (self._overwrite or job.overwrite)
+                and output_path.exists()
+            ):
+                job.action = PlanAction.EXISTS
+                job.reason = str(ImageFileAlreadyExistsError(output_path))
+
+            data = None
+            if member is not None and job.action == PlanAction.CONVERT:
+                if read_headers or read_data:
+                    with member.open() as file:
+                        data = file.read()
+                if read_data:
+                    job.data = data
+
+            if read_headers and job.action == PlanAction.CONVERT:
+                load_plugin(image_path.name)
+                try:
+                    with Image.open(
+                        image_path if data is None else open_buffer(data)
+                    ) as img:
+                        job.width, job.height = img.size
+                except (OSError, Image.DecompressionBombError) as e:
+                    job.action = PlanAction.INVALID
+                    job.reason = str(e)
+
+            yield job
+
+    def _in_shard(self, relative_path: Path) -> bool:
+        """Whether a source belongs to this run's shard.
+
+        Sources are assigned by their path without the suffix, so sources
+        whose outputs would collide (``a.png`` and ``a.jpg``) share a shard
+        and shards never write the same output.
+        """
+        return self._shard is None or self._shard.contains(
+            relative_path.with_suffix("").as_posix()
+        )
+
+    def _iter_sources(
+        self, output_dir: Path, paths: Optional[Iterable[Path]] = None
+    ) -> Iterator[Tuple[Path, int, int, Optional[ArchiveMember]]]:
+        """Yields each supported source with its size, modification time (ns) and archive member.
+
+        Members of an input archive are mapped to paths below the archive's
+        path, so rules and outputs use their names within the archive.
+        """
+        if paths is None and is_archive(self._input_dir):
+            scanner = self._create_scanner(output_dir)
+            for member in iter_members(self._input_dir):
+                if scanner.accepts(Path(member.name)):
+                    yield (
+                        self._input_dir / member.name,
+                        member.size,
+                        member.mtime_ns,
+                        member,
+                    )
+            return
+
+        for image_path in self._create_scanner(output_dir) if paths is None else paths:
+            if image_path.suffix.lower() not in SUPPORTED_FORMATS:
+                continue
+            try:
+                src_stat = image_path.stat()
+            except FileNotFoundError:
+                # Removed since it was listed.
+                continue
+            yield image_path, src_stat.st_size, src_stat.st_mtime_ns, None
+
+    def _read_archive_jobs(self, jobs: List[PlannedJob]) -> Iterator[PlannedJob]:
+        """Reads the input archive once, yielding saved jobs in archive order with their bytes."""
+        jobs_by_source = {job.source: job for job in jobs}
+        for member in iter_members(self._input_dir):
+            job = jobs_by_source.pop(member.name, None)
+            if job is None:
+                continue
+            if job.action == PlanAction.CONVERT:
+                with member.open() as file:
+                    job.data = file.read()
+            yield job
+        for job in jobs_by_source.values():
+            if job.action == PlanAction.CONVERT:
+                job.action = PlanAction.INVALID
+                job.reason = f"Not found in {self._input_dir}"
+            yield job
+
+    @contextlib.contextmanager
+    def _archive_output(self):
+        """Appends outputs to an archive while active, if the output directory names one.
+
+        The archive replaces its target only once everything was written.
+        """
+        if not is_archive(self._output_dir):
+            yield
+            return
+        self._archive_writer = ArchiveWriter(self._output_dir)
+        try:
+            yield
+        except BaseException:
+            self._archive_writer.abort()
+            raise
+        else:
+            self._archive_writer.close()
+        finally:
+            self._archive_writer = None
+
+    def _execute(
+        self, jobs: Iterable[PlannedJob], manifest: Optional[BuildManifest]
+    ) -> PlanSummary:
+        """Converts planned jobs, recording results in the manifest.
+
+        With dedup, each source is keyed by its contents and settings; a job
+        whose key was converted before (in this or an earlier run) gets links
+        to those outputs, and duplicates of a conversion still in progress
+        wait for it.
+
+        With a memory budget and several workers, jobs are converted largest
+        first within a window of upcoming jobs, so that the longest
+        conversions do not start last while conversion still starts during
+        the scan. Archive members are kept in archive order, since they are
+        read in that order.
+        """
+        if (
+            self._max_memory is not None
+            and self._jobs > 1
+            and not is_archive(self._input_dir)
+        ):
+            jobs = largest_first(jobs, self._estimate_memory, _REORDER_WINDOW)
+        summary = PlanSummary()
+        # Jobs awaiting a result, in the same order as their results.
+        pending: Deque[PlannedJob] = deque()
+        index = self._load_dedup_index()
+        # Dedup key of each pending job, and duplicates waiting for it.
+        keys: Dict[int, str] = {}
+        duplicates: Dict[str, List[PlannedJob]] = {}
+
+        def record(job: PlannedJob, output_paths: List[Path]):
+            summary.add(job)
+            if manifest is not None:
+                manifest.record(
+                    job.source,
+                    self._input_dir / job.source,
+                    job.file_size,
+                    job.mtime_ns,
+                    job.settings,
+                    output_paths,
+                )
+
+        def convert_jobs() -> Iterator[PlannedJob]:
+            for job in jobs:
+                if job.action != PlanAction.CONVERT:
+                    summary.add(job)
+                    if job.action == PlanAction.UNCHANGED:
+                        logger.debug(f"Unchanged: {Path(job.source).name}")
+                    else:
+                        logger.error(f"Skipping {Path(job.source).name}: {job.reason}")
+                    continue
+
+                if index is not None:
+                    try:
+                        key = index.key(
+                            job.source,
+                            self._input_dir / job.source,
+                            job.file_size,
+                            job.mtime_ns,
+                            job.settings,
+                        )
+                    except OSError as e:
+                        logger.warning(f"Cannot hash {job.source}: {e}")
+                    else:
+                        if key in duplicates:
+                            duplicates[key].append(job)
+                            continue
+                        entry = index.find(key)
+                        if entry is not None:
+                            try:
+                                record(job, self._link_outputs(job, entry))
+                                continue
+                            except OSError as e:
+                                logger.warning(f"Cannot link {job.source}: {e}")
+                        keys[id(job)] = key
+                        duplicates[key] = []
+                pending.append(job)
+                yield job
+
+        def finish(
+            job: PlannedJob,
+            output_paths: Optional[List[Path]],
+            metrics: Optional[ImageMetrics],
+        ):
+            key = keys.pop(id(job), None)
+            waiting = duplicates.pop(key, []) if key is not None else []
+            if output_paths is None:
+                for duplicate in waiting:
+                    logger.error(
+                        f"Skipping {Path(duplicate.source).name}: "
+                        f"same contents as {job.source}, which failed"
+                    )
+                summary.invalid += 1 + len(waiting)
+                return
+            record(job, output_paths)
+            if key is not None and not output_paths:
+                # Identical sources would not be written either.
+                for duplicate in waiting:
+                    record(duplicate, [])
+            elif key is not None:
+                entry = index.record(key, output_paths, metrics.total_seconds)
+                for duplicate in waiting:
+                    try:
+                        record(duplicate, self._link_outputs(duplicate, entry))
+                    except OSError as e:
+                        logger.error(f"Skipping {duplicate.source}: {e}")
+                        summary.invalid += 1
+
+        sources = convert_jobs()
+        if self._prefetch:
+            sources = prefetch(sources, self._prefetch_source, self._prefetch)
+        results = (
+            self._process_in_parallel(sources)
+            if self._jobs > 1
+            else map(self._try_convert, sources)
+        )
+
+        # With prefetching, outputs are written on a separate thread. Jobs
+        # are only recorded once their outputs are written, and conversion
+        # waits while too many jobs' outputs are still being written.
+        writer = (
+            ThreadPoolExecutor(1, thread_name_prefix="writer")
+            if self._prefetch and self._archive_writer is None
+            else None
+        )
+        writes = deque()
+        try:
+            for output_paths, metrics, files in results:
+                job = pending.popleft()
+                # Saved plans keep their jobs; source bytes are not kept with them.
+                job.data = None
+                if metrics is not None:
+                    self._emit_metrics(metrics)
+                if writer is None:
+                    for output_path, data in files or []:
+                        self._archive_writer.add(
+                            output_path.relative_to(self._output_dir).as_posix(), data
+                        )
+                    finish(job, output_paths, metrics)
+                    continue
+
+                writes.append(
+                    (
+                        writer.submit(self._save_all, files or []),
+                        job,
+                        output_paths,
+                        metrics,
+                    )
+                )
+                while writes and (writes[0][0].done() or len(writes) > self._prefetch):
+                    future, *result = writes.popleft()
+                    future.result()
+                    finish(*result)
+            while writes:
+                future, *result = writes.popleft()
+                future.result()
+                finish(*result)
+        finally:
+            if writer is not None:
+                writer.shutdown(wait=True)
+            if index is not None:
+                index.save()
+        return summary
+
+    def _link_outputs(self, job: PlannedJob, entry: DedupEntry) -> List[Path]:
+        """Materializes a duplicate job's outputs from those of an identical source.
+
+        Outputs are named after the job's output like the originals are named
+        after theirs; a variant index is rewritten to list the job's own paths.
+        """
+        stem = self._get_output_stem(entry.outputs[0])
+        output_path = self._output_dir / job.output
+        new_stem = self._get_output_stem(job.output)
+
+        def link_path(output: str) -> Path:
+            return output_path.with_name(new_stem + Path(output).name[len(stem) :])
+
+        output_paths = []
+        for output in entry.outputs:
+            src = self._output_dir / output
+            dst = link_path(output)
+            output_paths.append(dst)
+            if dst == src:
+                continue
+            if not output.endswith(_VARIANT_INDEX_SUFFIX):
+                mode = link_file(src, dst, self._dedup)
+                logger.info(f"Deduplicated: {job.source} -> {dst} ({mode} of {src})")
+                continue
+            with open(src, "r") as file:
+                index = json.load(file)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            for variant in index["variants"]:
+                variant["path"] = (
+                    link_path(variant["path"]).relative_to(self._output_dir).as_posix()
+                )
+            self._write_variant_index(
+                self._input_dir / job.source,
+                dst,
+                (index["width"], index["height"]),
+                index["variants"],
+            )
+        self._dedup_stats.add(entry.output_bytes, entry.seconds)
+        return output_paths
+
+    def _process_in_parallel(self, jobs: Iterable[PlannedJob]) -> Iterator[_JobResult]:
+        """Processes images on a worker pool, yielding results in input order.
+
+        With a memory budget, a job is only submitted once its estimated
+        memory fits next to that of the jobs still running.
+        """
+        executor = self._create_executor()
+        fn = (
+            self._try_convert
+            if isinstance(executor, ThreadPoolExecutor)
+            else _process_in_worker
+        )
+        budget = MemoryBudget(self._max_memory) if self._max_memory else None
+        pending = deque()
+        try:
+            for job in jobs:
+                if budget is None:
+                    pending.append(executor.submit(fn, job))
+                else:
+                    amount = budget.acquire(self._estimate_memory(job))
+                    future = executor.submit(fn, job)
+                    future.add_done_callback(lambda _, a=amount: budget.release(a))
+                    pending.append(future)
+                if len(pending) >= self._jobs * _JOBS_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        except KeyboardInterrupt:
+            logger.warning(f"Interrupted, cancelling {len(pending)} pending images.")
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _estimate_memory(self, job: PlannedJob) -> int:
+        """Estimates a job's peak memory from the dimensions in its header."""
+        sizes = [variant.size for variant in job.variants] or [job.size]
+        output_pixels = sum(
+            size[0] * size[1] if size is not None else job.pixels for size in sizes
+        )
+        tiled = job.pixels > self._tile_pixels and not job.variants
+        # Prefetched sources and archive members are held in memory as well.
+        held = job.file_size if self._prefetch or job.data is not None else 0
+        return estimate_memory(job.pixels, output_pixels, tiled) + held
+
+    def _create_executor(self) -> Executor:
+        """Creates the worker pool for the configured executor type."""
+        if self._executor == ExecutorType.THREAD:
+            return ThreadPoolExecutor(max_workers=self._jobs)
+        # Imports multiprocessing, which single-image runs do not need.
+        from concurrent.futures import ProcessPoolExecutor
+
+        return ProcessPoolExecutor(
+            max_workers=self._jobs, initializer=_init_worker, initargs=(self,)
+        )
+
+    @property
+    def _captures_outputs(self) -> bool:
+        """Whether outputs are returned to the main process instead of written by workers."""
+        return bool(self._prefetch) or is_archive(self._output_dir)
+
+    def _prefetch_source(self, job: PlannedJob):
+        """Reads a job's source into memory ahead of its conversion."""
+        if job.data is not None:
+            return
+        try:
+            job.data = (self._input_dir / job.source).read_bytes()
+        except OSError:
+            # Reported when the job is converted.
+            pass
+
+    def _try_convert(self, job: PlannedJob) -> _JobResult:
+        """Converts a planned job, logging and swallowing per-image errors.
+
+        Returns the paths written (None on failure), the job's metrics when
+        instrumentation is enabled and, when the output is an archive, the
+        outputs' contents for the main process to append.
+        """
+        img_path = self._input_dir / job.source
+        metrics = ImageMetrics(job.source) if self._instrumented else None
+        files = [] if self._captures_outputs else None
+        _captured_outputs.files = files
+        try:
+            output_paths = self._convert(
+                img_path,
+                self._output_dir / job.output,
+                job.size,
+                job.mode,
+                self._overwrite if job.overwrite is None else job.overwrite,
+                job.variants,
+                metrics,
+                None if job.data is None else open_buffer(job.data),
+            )
+        except (
+            OSError,
+            Image.DecompressionBombError,
+            ImageFileAlreadyExistsError,
+            AnimationTooLargeError,
+        ) as e:
+            # E.g. unidentified or truncated images, or sources removed since
+            # they were planned.
+            logger.error(f"Skipping {img_path.name}: {e}")
+            return None, None, None
+        finally:
+            _captured_outputs.files = None
+        return output_paths, metrics, files
+
+    def process_image(
+        self, img_path: Path, output_path: Optional[Path] = None
+    ) -> Optional[Path]:
+        """Processes a single image file.
+
+        The output goes to ``output_path`` if given, otherwise to the source's
+        place in the output directory. With variants, the returned path is the
+        source's variant index (see `_write_variants`); a given ``out.webp``
+        becomes ``out.variants.json`` and the variants ``out<suffix>.webp``.
+        Returns None if the output was not written because it was oversized.
+        """
+        size, resize_mode = self._get_size_and_resize_mode(img_path.name)
+        variants = self._get_variants(img_path.name, size, resize_mode)
+        relative_path = img_path.relative_to(self._input_dir)
+        if output_path is None:
+            output_path = self._output_dir / self._get_output_path(
+                relative_path, variants
+            )
+        elif variants and not output_path.name.endswith(_VARIANT_INDEX_SUFFIX):
+            output_path = output_path.with_name(
+                output_path.stem + _VARIANT_INDEX_SUFFIX
+            )
+        metrics = ImageMetrics(relative_path.as_posix()) if self._instrumented else None
+        output_paths = self._convert(
+            img_path, output_path, size, resize_mode, self._overwrite, variants, metrics
+        )
+        if metrics is not None:
+            self._emit_metrics(metrics)
+        return output_paths[0] if output_paths else None
+
+    def _convert(
+        self,
+        img_path: Path,
+        output_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        overwrite: bool,
+        variants: Optional[List[Variant]] = None,
+        metrics: Optional[ImageMetrics] = None,
+        src: Optional[BinaryIO] = None,
+    ) -> List[Path]:
+        """Converts a source image to WebP, returning the paths written.
+
+        The first path is the job's output: the WebP image, or the variant
+        index when variants are configured. Stage timings and sizes are
+        recorded in ``metrics`` when given. The source is read from ``src``
+        instead of ``img_path`` when given, e.g. for archive members. No path
+        is returned for a still image skipped as oversized.
+        """
+        if not overwrite and output_path.exists():
+            raise ImageFileAlreadyExistsError(output_path)
+
+        input_bytes = None
+        if metrics is not None or self._max_output_ratio is not None:
+            input_bytes = (
+                img_path.stat().st_size if src is None else len(src.getbuffer())
+            )
+        if metrics is not None:
+            metrics.input_bytes = input_bytes
+            metrics.start()
+        load_plugin(img_path.name)
+        with Image.open(src or img_path) as img:
+            if metrics is not None:
+                metrics.input_pixels = img.width * img.height
+            if getattr(img, "is_animated", False):
+                if img.format != "TIFF":
+                    return self._write_animation(
+                        img, img_path, output_path, size, resize_mode, variants, metrics
+                    )
+                if self._all_pages:
+                    return self._write_pages(
+                        img, img_path, output_path, size, resize_mode, variants, metrics
+                    )
+            return self._write_still(
+                img,
+                img_path,
+                output_path,
+                size,
+                resize_mode,
+                variants,
+                metrics,
+                input_bytes,
+            )
+
+    def _write_still(
+        self,
+        img: Image.Image,
+        img_path: Path,
+        output_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        variants: Optional[List[Variant]] = None,
+        metrics: Optional[ImageMetrics] = None,
+        input_bytes: Optional[int] = None,
+    ) -> List[Path]:
+        """Converts a single frame or page to WebP.
+
+        With ``input_bytes``, the output is checked against the configured
+        ratio of the source's size; see `_is_oversized`.
+        """
+        if variants:
+            return self._write_variants(img, img_path, output_path, variants, metrics)
+
+        img = self._resize(img, size, resize_mode, metrics, img_path.name)
+        encoding = self._get_encoding(img_path.name)
+        result = self._encode(img, encoding, metrics)
+        if self._is_oversized(img_path, output_path, result.buffer.tell(), input_bytes):
+            return []
+        self._write(output_path, result.buffer, metrics)
+        logger.info(
+            f"Processed: {img_path.name} -> {output_path} ({size}) ({resize_mode})"
+            + self._describe_encoding(result)
+        )
+        return [output_path]
 
-            img.save(output_path, "WEBP", quality=self._quality)
+    def _write_pages(
+        self,
+        img: Image.Image,
+        img_path: Path,
+        output_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        variants: Optional[List[Variant]] = None,
+        metrics: Optional[ImageMetrics] = None,
+    ) -> List[Path]:
+        """Converts every page of a multi-page TIFF, one page at a time.
+
+        The first page is written to the job's output path and later pages get
+        a ``_page<n>`` suffix.
+        """
+        output_paths = []
+        for page in range(img.n_frames):
+            img.seek(page)
+            page_path = (
+                output_path if page == 0 else self._get_page_path(output_path, page + 1)
+            )
+            # Resizing may modify the image in place, so each page is copied.
+            output_paths += self._write_still(
+                img.copy(), img_path, page_path, size, resize_mode, variants, metrics
+            )
+        # The job's output stays first.
+        return output_paths
+
+    def _write_animation(
+        self,
+        img: Image.Image,
+        img_path: Path,
+        output_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        variants: Optional[List[Variant]] = None,
+        metrics: Optional[ImageMetrics] = None,
+    ) -> List[Path]:
+        """Converts an animation to animated WebP, streaming one frame at a time.
+
+        Each frame is decoded once and resized for the output (or every
+        variant), then handed to a per-output `AnimationWriter`. Frame
+        durations and the loop count are preserved.
+        """
+        encoding = self._get_encoding(img_path.name)
+        if variants:
+            stem = output_path.name[: -len(_VARIANT_INDEX_SUFFIX)]
+            targets = [
+                (
+                    output_path.with_name(f"{stem}{variant.suffix}.webp"),
+                    variant.size,
+                    variant.mode,
+                    replace(encoding, quality=variant.quality),
+                )
+                for variant in variants
+            ]
+        else:
+            targets = [(output_path, size, resize_mode, encoding)]
+
+        loop = get_loop(img)
+        writers = [AnimationWriter(settings, loop) for *_, settings in targets]
+        for frame in ImageSequence.Iterator(img):
+            duration = frame.info.get("duration")
+            frame.load()
+            if metrics is not None:
+                metrics.mark(PipelineStage.DECODE)
+
+            converted = self._to_resample_mode(frame)
+            # Writers keep the previous frame, which seeking would overwrite.
+            if converted is img:
+                converted = img.copy()
+            if metrics is not None:
+                metrics.mark(PipelineStage.CONVERT)
+
+            for (_, target_size, target_mode, _), writer in zip(targets, writers):
+                strategy = self._get_strategy(target_mode, img_path.name)
+                resized = strategy.resize(
+                    converted.copy()
+                    if target_mode == ResizeMode.CONTAIN
+                    else converted,
+                    target_size,
+                )
+                resized = self._to_webp_mode(resized)
+                if metrics is not None:
+                    metrics.mark(PipelineStage.RESIZE)
+
+                writer.add(resized, duration)
+                if metrics is not None:
+                    metrics.mark(PipelineStage.ENCODE)
+
+        index = []
+        for (path, target_size, target_mode, _), writer in zip(targets, writers):
+            buffer = writer.finish()
+            if metrics is not None:
+                metrics.mark(PipelineStage.ENCODE)
+                metrics.output_pixels += (
+                    writer.size[0] * writer.size[1] * writer.unique_frames
+                )
+                metrics.compressions.append(str(writer.compression))
+            self._write(path, buffer, metrics)
+            index.append((path, writer.size))
+            logger.info(
+                f"Processed: {img_path.name} -> {path} ({target_size}) ({target_mode}) "
+                f"(animated: {writer.unique_frames} of {writer.frames} frames kept)"
+                + (f" ({writer.compression}: {writer.reason})" if writer.reason else "")
+            )
+
+        if not variants:
+            return [output_path]
+        self._write_variant_index(
+            img_path,
+            output_path,
+            img.size,
+            [
+                {
+                    "path": path.relative_to(self._output_dir).as_posix(),
+                    "width": width,
+                    "height": height,
+                    **variant.to_dict(),
+                }
+                for (path, (width, height)), variant in zip(index, variants)
+            ],
+            metrics,
+        )
+        return [output_path, *(path for path, _ in index)]
+
+    def convert_bytes(self, data: BufferLike, filename: str = "") -> bytes:
+        """Converts an in-memory image to WebP bytes without touching the filesystem.
+
+        ``filename`` is only used to select the resize rule. Variants are not
+        applied.
+        """
+        output = io.BytesIO()
+        self.convert_stream(open_buffer(data), output, filename)
+        return output.getvalue()
+
+    def convert_stream(
+        self,
+        src: BinaryIO,
+        dst: BinaryIO,
+        filename: str = "",
+        size: Optional[Tuple[int, int]] = None,
+        resize_mode: Optional[ResizeMode] = None,
+        quality: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """Reads an image from a file object and writes WebP to another.
+
+        ``dst`` can be any writable binary file object, such as a caller-owned
+        `io.BytesIO` or socket file. ``size``, ``resize_mode`` and ``quality``
+        override the values selected by the rules. Returns the output dimensions.
+        """
+        size, resize_mode, encoding = self._get_render_settings(
+            Path(filename).name, size, resize_mode, quality
+        )
+        load_plugin(filename)
+        with Image.open(src) as img:
+            img = self._resize(img, size, resize_mode, filename=Path(filename).name)
+            self._encode(img, encoding, dst=dst)
+            return img.size
+
+    def render(
+        self,
+        img_path: Path,
+        size: Optional[Tuple[int, int]] = None,
+        resize_mode: Optional[ResizeMode] = None,
+        quality: Optional[int] = None,
+    ) -> bytes:
+        """Converts a source file to WebP bytes; see `convert_stream` for the overrides."""
+        output = io.BytesIO()
+        with open(img_path, "rb") as src:
+            self.convert_stream(src, output, img_path.name, size, resize_mode, quality)
+        return output.getvalue()
+
+    def render_key(
+        self,
+        filename: str,
+        size: Optional[Tuple[int, int]] = None,
+        resize_mode: Optional[ResizeMode] = None,
+        quality: Optional[int] = None,
+    ) -> str:
+        """Hashes the effective settings `render` would use for a file."""
+        return self._get_settings_key(
+            *self._get_render_settings(filename, size, resize_mode, quality),
+            filename=filename,
+        )
+
+    def _resize(
+        self,
+        img: Image.Image,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        metrics: Optional[ImageMetrics] = None,
+        filename: str = "",
+    ) -> Image.Image:
+        """Decodes and resizes an opened source image.
+
+        ``filename`` selects the rule that the crop position and resampling
+        filter are taken from. Sources that the header shows to be the output
+        size already are only converted, without decode reduction or resampling.
+        """
+        resize_strategy: ResizeStrategy = self._get_strategy(resize_mode, filename)
+        # Opened images only have their header read until they are loaded.
+        output_size = (
+            img.size if size is None else resize_strategy.get_size(img.size, size)
+        )
+        passthrough = output_size == img.size
+
+        if self._decode_reduction and not passthrough:
+            img = self._reduce_on_decode(img, resize_strategy.get_scale(img.size, size))
+        img.load()
+        if metrics is not None:
+            metrics.mark(PipelineStage.DECODE)
+
+        target = (
+            resize_strategy.get_target(img, size)
+            if img.width * img.height > self._tile_pixels and not passthrough
+            else None
+        )
+        if target is not None:
+            # Conversion happens strip by strip and is timed with the resize.
+            img = resize_in_strips(img, target, self._to_resample_mode)
+        else:
+            img = self._to_resample_mode(img)
+            if metrics is not None:
+                metrics.mark(PipelineStage.CONVERT)
+
+            if not passthrough:
+                img = resize_strategy.resize(img, size)
+        if metrics is not None:
+            metrics.mark(PipelineStage.RESIZE)
+
+        img = self._to_webp_mode(img)
+        if metrics is not None:
+            metrics.mark(PipelineStage.CONVERT)
+        return img
+
+    @staticmethod
+    def _to_resample_mode(img: Image.Image) -> Image.Image:
+        """Converts a decoded source to the narrowest mode that resamples correctly.
+
+        Opaque L/RGB and LA/RGBA sources are kept as they are. Palette and
+        color-keyed sources are expanded (to RGBA only if they carry
+        transparency), 16-bit grayscale is scaled down to L and other modes
+        such as CMYK become RGB.
+        """
+        if img.mode in _RESAMPLE_MODES and "transparency" not in img.info:
+            return img
+        if img.has_transparency_data:
+            return img.convert("RGBA")
+        if img.mode.startswith("I;16"):
+            return img.convert("I").point(lambda value: value / 256).convert("L")
+        if img.mode in ("1", "I", "F"):
+            return img.convert("L")
+        return img.convert("RGB")
+
+    @staticmethod
+    def _to_webp_mode(img: Image.Image) -> Image.Image:
+        """Widens a resized image to a mode the WebP encoder accepts."""
+        if img.mode in _WEBP_MODES:
+            return img
+        return img.convert("RGBA" if img.mode == "LA" else "RGB")
+
+    def _encode(
+        self,
+        img: Image.Image,
+        encoding: EncodeSettings,
+        metrics: Optional[ImageMetrics] = None,
+        dst: Optional[BinaryIO] = None,
+    ) -> EncodeResult:
+        """Encodes an image to WebP, choosing compression and quality.
+
+        The output goes to ``dst`` if given, otherwise to a buffer in memory.
+        """
+        result = self._encoder.encode(img, encoding, dst)
+        if metrics is not None:
+            metrics.mark(PipelineStage.ENCODE)
+            metrics.output_pixels += img.width * img.height
+            metrics.compressions.append(str(result.compression))
+        return result
+
+    def _is_oversized(
+        self,
+        img_path: Path,
+        output_path: Path,
+        output_bytes: int,
+        input_bytes: Optional[int],
+    ) -> bool:
+        """Whether an encoded output is skipped for exceeding the size ratio.
+
+        Outputs larger than ``max_output_ratio`` times their source are
+        written with a warning, or with ``skip_oversized`` not written at all;
+        an output left from an earlier run is then removed.
+        """
+        if (
+            input_bytes is None
+            or self._max_output_ratio is None
+            or output_bytes <= input_bytes * self._max_output_ratio
+        ):
+            return False
+        message = (
+            f"{img_path.name} -> {output_path} is {output_bytes} bytes, "
+            f"more than {self._max_output_ratio:g} times the source's {input_bytes}"
+        )
+        if not self._skip_oversized:
+            logger.warning(f"Oversized: {message}")
+            return False
+        logger.info(f"Not written: {message}")
+        if not is_archive(self._output_dir):
+            output_path.unlink(missing_ok=True)
+        return True
+
+    @staticmethod
+    def _describe_encoding(result: EncodeResult) -> str:
+        """Describes automatic encoding decisions for the processed log line."""
+        if result.reason is not None:
+            return f" ({result.compression}: {result.reason})"
+        if result.trials > 1:
+            return f" (quality {result.quality} after {result.trials} trials)"
+        return ""
+
+    @staticmethod
+    def _write(
+        output_path: Path, buffer: io.BytesIO, metrics: Optional[ImageMetrics] = None
+    ):
+        """Writes an encoded image to disk."""
+        ImageProcessor._save(output_path, buffer.getbuffer())
+        if metrics is not None:
+            metrics.mark(PipelineStage.WRITE)
+            metrics.output_bytes += buffer.tell()
+
+    @staticmethod
+    def _save(output_path: Path, data: BufferLike):
+        """Writes an output file, or captures it for the main process to write.
+
+        Outputs are captured when they go to an archive or a writer thread.
+        """
+        files = getattr(_captured_outputs, "files", None)
+        if files is not None:
+            files.append((output_path, bytes(data)))
+            return
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(output_path, data)
+
+    @staticmethod
+    def _save_all(files: List[Tuple[Path, bytes]]):
+        for output_path, data in files:
+            ImageProcessor._save(output_path, data)
+
+    def _write_variants(
+        self,
+        img: Image.Image,
+        img_path: Path,
+        index_path: Path,
+        variants: List[Variant],
+        metrics: Optional[ImageMetrics] = None,
+    ) -> List[Path]:
+        """Encodes every variant from a single decode.
+
+        Variants are produced largest first. Each one is resized from the
+        smallest uncropped, undistorted intermediate (the decoded source or an
+        earlier `contain` variant) that still covers its target resolution.
+        The produced paths and dimensions are written to a JSON index.
+        """
+        if self._decode_reduction:
+            img = self._reduce_on_decode(
+                img, max(self._get_variant_scale(img.size, v) for v in variants)
+            )
+        img.load()
+        if metrics is not None:
+            metrics.mark(PipelineStage.DECODE)
+
+        img = self._to_resample_mode(img)
+        if metrics is not None:
+            metrics.mark(PipelineStage.CONVERT)
+
+        encoding = self._get_encoding(img_path.name)
+        # Full-frame intermediates that later variants can be derived from.
+        intermediates = [img]
+        index = []
+        output_paths = []
+        stem = index_path.name[: -len(_VARIANT_INDEX_SUFFIX)]
+        for variant in sorted(variants, key=self._get_variant_order):
+            strategy = self._get_strategy(variant.mode, img_path.name)
+            scale = self._get_variant_scale(img.size, variant)
+            required = (img.width * scale, img.height * scale)
+            base = min(
+                (
+                    i
+                    for i in intermediates
+                    if i.width >= required[0] and i.height >= required[1]
+                ),
+                key=lambda i: i.width * i.height,
+                # Upscaled variants are resized from the source itself.
+                default=img,
+            )
+            # The contain strategy resizes in place, so shared intermediates are copied.
+            resized = strategy.resize(
+                base.copy() if variant.mode == ResizeMode.CONTAIN else base,
+                variant.size,
+            )
+            if variant.mode == ResizeMode.CONTAIN and resized is not img:
+                intermediates.append(resized)
+            if metrics is not None:
+                metrics.mark(PipelineStage.RESIZE)
+
+            resized = self._to_webp_mode(resized)
+            if metrics is not None:
+                metrics.mark(PipelineStage.CONVERT)
+
+            variant_path = index_path.with_name(f"{stem}{variant.suffix}.webp")
+            variant_encoding = replace(encoding, quality=variant.quality)
+            result = self._encode(resized, variant_encoding, metrics)
+            self._write(variant_path, result.buffer, metrics)
+            output_paths.append(variant_path)
+            index.append(
+                {
+                    "path": variant_path.relative_to(self._output_dir).as_posix(),
+                    "width": resized.width,
+                    "height": resized.height,
+                    **variant.to_dict(),
+                }
+            )
             logger.info(
-                f"Processed: {img_path.name} -> {output_path} ({size}) ({resize_mode})"
+                f"Processed: {img_path.name} -> {variant_path} "
+                f"({variant.size}) ({variant.mode})" + self._describe_encoding(result)
+            )
+
+        self._write_variant_index(img_path, index_path, img.size, index, metrics)
+        return [index_path, *output_paths]
+
+    def _write_variant_index(
+        self,
+        img_path: Path,
+        index_path: Path,
+        img_size: Tuple[int, int],
+        index: List[dict],
+        metrics: Optional[ImageMetrics] = None,
+    ):
+        """Writes the JSON index listing a source's variants."""
+        data = json.dumps(
+            {
+                "source": img_path.relative_to(self._input_dir).as_posix(),
+                "width": img_size[0],
+                "height": img_size[1],
+                "variants": index,
+            },
+            indent=2,
+        )
+        self._save(index_path, data.encode())
+        if metrics is not None:
+            metrics.mark(PipelineStage.WRITE)
+
+    def _get_variant_scale(self, img_size: Tuple[int, int], variant: Variant) -> float:
+        if variant.size is None:
+            return 1.0
+        strategy = self._resize_strategy_factory.get_strategy(variant.mode)
+        return strategy.get_scale(img_size, variant.size)
+
+    @staticmethod
+    def _get_variant_order(variant: Variant) -> Tuple[bool, int]:
+        """Sorts full-size variants first, then by decreasing target area."""
+        if variant.size is None:
+            return False, 0
+        return True, -variant.size[0] * variant.size[1]
+
+    @staticmethod
+    def _reduce_on_decode(img: Image.Image, scale: float) -> Image.Image:
+        """Shrinks a source by an integer factor before the final resample.
+
+        JPEG sources are decoded at a reduced scale via `Image.draft`; other
+        opaque sources are box-reduced right after decoding.
+        """
+        factor = math.floor(1 / (scale * _DECODE_REDUCING_GAP))
+        if factor < 2:
+            return img
+
+        if img.format == "JPEG":
+            width = img.width
+            img.draft(
+                img.mode,
+                (math.ceil(img.width / factor), math.ceil(img.height / factor)),
             )
-            return output_path
+            factor = math.floor(1 / (scale * width / img.width * _DECODE_REDUCING_GAP))
+
+        if factor >= 2 and img.mode in _REDUCIBLE_MODES:
+            return img.reduce(factor)
+        return img
 
     def _get_size_and_resize_mode(
         self, filename: str
     ) -> Tuple[Optional[Tuple[int, int]], Optional[ResizeMode]]:
         """Determines the resize rule for an image based on pattern patterns in resize_rules."""
-        for resize_rule in self._resize_rules:
-            if re.match(resize_rule.pattern, filename):
-                size = resize_rule.size or self._default_size
-                mode = (
-                    ResizeMode.NONE
-                    if size is None
-                    else (resize_rule.mode or self._default_resize_mode)
-                )
-                return size, mode
+        resize_rule = self._rule_matcher.match(filename)
+        if resize_rule is not None:
+            size = resize_rule.size or self._default_size
+            mode = (
+                ResizeMode.NONE
+                if size is None
+                else (resize_rule.mode or self._default_resize_mode)
+            )
+            return size, mode
         mode = (
             ResizeMode.NONE if self._default_size is None else self._default_resize_mode
         )
         return self._default_size, mode
 
+    def _get_variants(
+        self,
+        filename: str,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+    ) -> List[Variant]:
+        """Resolves an image's variants, filling unset fields from its rule."""
+        resize_rule = self._rule_matcher.match(filename)
+        variants = (
+            resize_rule.variants
+            if resize_rule is not None and resize_rule.variants
+            else self._variants
+        )
+        resolved = []
+        for variant in variants:
+            variant_size = variant.size or size
+            resolved.append(
+                Variant(
+                    size=variant_size,
+                    mode=ResizeMode.NONE
+                    if variant_size is None
+                    else (variant.mode or resize_mode),
+                    quality=variant.quality or self._get_encoding(filename).quality,
+                    suffix=variant.suffix,
+                )
+            )
+        return resolved
+
+    def _get_crop(self, filename: str) -> Tuple[Gravity, Optional[Tuple[float, float]]]:
+        """Resolves where an image is cropped from in `cover` mode."""
+        resize_rule = self._rule_matcher.match(filename)
+        if resize_rule is None:
+            return self._gravity, None
+        return resize_rule.gravity or self._gravity, resize_rule.focal_point
+
+    def _get_resampling(self, filename: str) -> Tuple[ResampleFilter, Optional[float]]:
+        """Resolves an image's resampling filter and reducing gap."""
+        resize_rule = self._rule_matcher.match(filename)
+        if resize_rule is None:
+            return self._resample, self._reducing_gap
+        return (
+            resize_rule.resample or self._resample,
+            self._reducing_gap
+            if resize_rule.reducing_gap is None
+            else resize_rule.reducing_gap,
+        )
+
+    def _get_no_upscale(self, filename: str) -> bool:
+        """Resolves whether an image may be enlarged to its target size."""
+        resize_rule = self._rule_matcher.match(filename)
+        if resize_rule is None or resize_rule.no_upscale is None:
+            return self._no_upscale
+        return resize_rule.no_upscale
+
+    def _get_strategy(self, mode: ResizeMode, filename: str) -> ResizeStrategy:
+        return self._resize_strategy_factory.get_strategy(
+            mode,
+            *self._get_crop(filename),
+            *self._get_resampling(filename),
+            self._get_no_upscale(filename),
+        )
+
+    def _get_render_settings(
+        self,
+        filename: str,
+        size: Optional[Tuple[int, int]],
+        resize_mode: Optional[ResizeMode],
+        quality: Optional[int],
+    ) -> Tuple[Optional[Tuple[int, int]], ResizeMode, EncodeSettings]:
+        """Returns the rule's size, mode and encoder settings with any overrides applied."""
+        rule_size, rule_mode = self._get_size_and_resize_mode(filename)
+        encoding = self._get_encoding(filename)
+        if quality is not None:
+            encoding = replace(encoding, quality=quality)
+        return size or rule_size, resize_mode or rule_mode, encoding
+
+    def _get_encoding(self, filename: str) -> EncodeSettings:
+        """Resolves an image's encoder settings from its rule and the defaults."""
+        resize_rule = self._rule_matcher.match(filename)
+        if resize_rule is None:
+            return self._encoding
+        return resize_rule.encoding.merged_with(self._encoding)
+
+    @staticmethod
+    def _get_page_path(output_path: Path, page: int) -> Path:
+        """Returns the output path for a later page of a multi-page source."""
+        name = output_path.name
+        suffix = (
+            _VARIANT_INDEX_SUFFIX if name.endswith(_VARIANT_INDEX_SUFFIX) else ".webp"
+        )
+        return output_path.with_name(f"{name[: -len(suffix)]}_page{page}{suffix}")
+
+    @staticmethod
+    def _get_output_stem(output: str) -> str:
+        """Returns the name that a job's output and its other outputs start with."""
+        name = Path(output).name
+        suffix = (
+            _VARIANT_INDEX_SUFFIX if name.endswith(_VARIANT_INDEX_SUFFIX) else ".webp"
+        )
+        return name[: -len(suffix)]
+
+    @staticmethod
+    def _get_output_path(relative_path: Path, variants: List[Variant]) -> Path:
+        """Returns a source's output path relative to the output directory."""
+        if variants:
+            return relative_path.with_name(relative_path.stem + _VARIANT_INDEX_SUFFIX)
+        return relative_path.with_suffix(".webp")
+
+    def _get_settings_key(
+        self,
+        size: Optional[Tuple[int, int]],
+        resize_mode: ResizeMode,
+        encoding: EncodeSettings,
+        variants: Optional[List[Variant]] = None,
+        filename: Optional[str] = None,
+    ) -> str:
+        """Hashes the effective output settings for an image.
+
+        With a ``filename``, the crop position, resampling filter and upscale
+        policy selected for it are included, as is the output size guard.
+        """
+        settings = (
+            size,
+            str(resize_mode),
+            encoding.to_dict(),
+            [variant.to_dict() for variant in variants or []],
+        )
+        # Default resize options leave the key unchanged, so earlier outputs
+        # stay current.
+        if filename is not None:
+            gravity, focal_point = self._get_crop(filename)
+            resample, reducing_gap = self._get_resampling(filename)
+            if (gravity, focal_point) != (Gravity.CENTER, None):
+                settings += (str(gravity), focal_point)
+            if (resample, reducing_gap) != (ResampleFilter.LANCZOS, None):
+                settings += (str(resample), reducing_gap)
+            if self._get_no_upscale(filename):
+                settings += ("no_upscale",)
+            if self._max_output_ratio is not None:
+                settings += (self._max_output_ratio, bool(self._skip_oversized))
+        return hashlib.sha1(repr(settings).encode()).hexdigest()[:16]
+
+    def _create_scanner(self, output_dir: Optional[Path] = None) -> DirectoryScanner:
+        """Returns a scanner for the input directory that skips the output directory inside it."""
+        output_dir = (output_dir or self._output_dir or self._input_dir).resolve()
+        input_dir = self._input_dir.resolve()
+        return DirectoryScanner(
+            self._input_dir,
+            SUPPORTED_FORMATS,
+            include=self._include,
+            exclude=self._exclude,
+            max_depth=self._max_depth,
+            follow_symlinks=self._follow_symlinks,
+            skip_hidden=self._skip_hidden,
+            prune=[output_dir.relative_to(input_dir)]
+            if input_dir in output_dir.parents
+            else [],
+        )
+
+    def _load_dedup_index(self) -> Optional[DedupIndex]:
+        """Loads the dedup index once; later batches in watch mode reuse it."""
+        if self._dedup is not None and self._dedup_index is None:
+            self._dedup_index = DedupIndex.load(self._output_dir, self._shard)
+        return self._dedup_index
+
+    def _load_manifest(self) -> Optional[BuildManifest]:
+        if not self._incremental:
+            return None
+        return BuildManifest.load(self._output_dir, self._hash_sources, self._shard)
+
+    def _emit_metrics(self, metrics: ImageMetrics):
+        for hook in self._hooks:
+            hook(metrics)
+
+    def _write_reports(self):
+        """Writes the run report and Prometheus textfile, if configured."""
+        if self._report is None:
+            return
+        if self._report_path:
+            self._report.write(self._report_path)
+            logger.info(f"Report written: {self._report_path}")
+        if self._prometheus_file:
+            self._report.write_prometheus(self._prometheus_file)
+
+    def _log_summary(self, summary: PlanSummary, incremental: bool):
+        logger.info("Processing complete.")
+        if self._shard is not None:
+            logger.info(f"Shard: {self._shard}")
+        logger.info(f"Total images: {summary.total}")
+        logger.info(f"Processed images: {summary.convert}")
+        if incremental:
+            logger.info(f"Unchanged images: {summary.unchanged}")
+        if self._dedup is not None:
+            stats = self._dedup_stats
+            logger.info(
+                f"Deduplicated images: {stats.images} ({stats.bytes_saved} bytes, "
+                f"{stats.seconds_saved:.1f}s of conversion saved)"
+            )
+
+    def _check_archives(self):
+        if not (is_archive(self._input_dir) or is_archive(self._output_dir)):
+            return
+        if self._incremental or self._dedup is not None:
+            raise ValueError(
+                "Archives cannot be used with incremental runs or deduplication"
+            )
+        if is_archive(self._input_dir) and self._output_dir in (None, self._input_dir):
+            raise ValueError("Archive input requires a separate output")
+        if is_archive(self._output_dir) and self._shard is not None:
+            raise ValueError("Sharded runs cannot write to an archive")
+
+    def _check_input_dir(self):
+        if not self._input_dir.exists():
+            raise InputDirNotFoundError(self._input_dir)
+
     def _initialize_output_dir(self):
         """Initializes the output directory."""
         if not self._output_dir:
             logger.info("Output directory not specified, using input directory.")
             self._output_dir = self._input_dir
-        self._output_dir.mkdir(parents=True, exist_ok=True)
+        if not is_archive(self._output_dir):
+            self._output_dir.mkdir(parents=True, exist_ok=True)
@@ -1,21 +1,113 @@
+import logging
+from pathlib import Path
+
 from ._cli import parse_args
 from ._config import Config
-from ._image_processor import ImageProcessor
+from ._exceptions import ImageFileAlreadyExistsError
+from ._planner import JobPlan
+from ._shard import merge_shard_reports
+
+logger = logging.getLogger(__name__)
 
 
 def main():
     args = parse_args()
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(levelname)s: %(message)s",
+    )
     config = Config.from_args(args, args.config)
 
+    if args.command == "merge":
+        if not config.report:
+            raise ValueError("merge requires --report")
+        merge_shard_reports(Path(config.report))
+        return
+
+    # Imported once a conversion is needed: Pillow and the worker pools
+    # dominate the startup time of short runs.
+    from ._image_processor import ImageProcessor
+
+    input_dir, output_dir = config.input_dir, config.output_dir
+    if args.source:
+        source = Path(args.source)
+        output = Path(args.output) if args.output else None
+        input_dir = str(source.parent)
+        output_dir = str(output.parent if output else source.parent)
+
     processor = ImageProcessor(
-        input_dir=config.input_dir,
-        output_dir=config.output_dir,
+        input_dir=input_dir,
+        output_dir=output_dir,
         overwrite=config.overwrite,
         default_resize_mode=config.default_resize_mode,
         verbose=config.verbose,
         resize_rules=config.resize_rules,
         default_size=config.default_size,
         quality=config.quality,
+        method=config.method,
+        alpha_quality=config.alpha_quality,
+        lossless=config.lossless,
+        compression=config.compression,
+        all_pages=config.all_pages,
+        include=config.include,
+        exclude=config.exclude,
+        max_depth=config.max_depth,
+        follow_symlinks=config.follow_symlinks,
+        skip_hidden=config.skip_hidden,
+        max_bytes=config.max_bytes,
+        min_ssim=config.min_ssim,
+        min_psnr=config.min_psnr,
+        jobs=config.jobs,
+        executor=config.executor,
+        incremental=config.incremental,
+        hash_sources=config.hash_sources,
+        dedup=config.dedup,
+        decode_reduction=config.decode_reduction,
+        variants=config.variants,
+        report=config.report,
+        prometheus_file=config.prometheus_file,
+        shard=config.shard,
+        gravity=config.gravity,
+        resample=config.resample,
+        reducing_gap=config.reducing_gap,
+        max_memory=config.max_memory,
+        tile_pixels=config.tile_pixels,
+        prefetch=config.prefetch,
+        no_upscale=config.no_upscale,
+        max_output_ratio=config.max_output_ratio,
+        skip_oversized=config.skip_oversized,
     )
 
-    processor.process_all_images()
+    if args.source:
+        try:
+            processor.process_image(source, output)
+        except (OSError, ImageFileAlreadyExistsError) as e:
+            logger.error(f"Cannot convert {source}: {e}")
+            raise SystemExit(1)
+    elif args.command == "serve":
+        from ._server import ImageServer
+
+        ImageServer(
+            processor,
+            host=config.host,
+            port=config.port,
+            cache_size=config.cache_size * 1024 * 1024,
+            cache_dir=config.cache_dir,
+        ).run()
+    elif config.plan:
+        processor.execute_plan(JobPlan.load(config.plan))
+    elif config.dry_run or config.save_plan:
+        plan = processor.create_plan()
+        processor.log_plan(plan)
+        if config.save_plan:
+            plan.save(config.save_plan)
+        if not config.dry_run:
+            processor.execute_plan(plan)
+    elif config.watch:
+        processor.watch(
+            debounce=config.debounce,
+            poll_interval=config.poll_interval,
+            polling=config.polling,
+        )
+    else:
+        processor.process_all_images()
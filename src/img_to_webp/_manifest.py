@@ -0,0 +1,189 @@
+import hashlib
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from ._shard import Shard
+
+MANIFEST_FILENAME = ".img-to-webp-manifest.jsonl"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def file_digest(path: Path) -> str:
+    """Hashes a file's contents in fixed-size chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ManifestStatus(Enum):
+    NEW = "new"
+    UNCHANGED = "unchanged"
+    MODIFIED = "modified"
+    SETTINGS_CHANGED = "settings_changed"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class ManifestEntry:
+    size: int
+    mtime_ns: int
+    settings: str
+    outputs: List[str]
+    digest: Optional[str] = None
+
+
+class BuildManifest:
+    """Persistent record of converted sources, stored as JSON lines in the output directory.
+
+    Each shard of a sharded run keeps its own manifest.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        hash_sources: bool = False,
+        entries: Optional[Dict[str, ManifestEntry]] = None,
+        shard: Optional[Shard] = None,
+    ):
+        self._output_dir = output_dir
+        self._hash_sources = hash_sources
+        self._entries = entries or {}
+        self._shard = shard
+
+    @property
+    def path(self) -> Path:
+        path = self._output_dir / MANIFEST_FILENAME
+        return path if self._shard is None else self._shard.path(path)
+
+    @classmethod
+    def load(
+        cls, output_dir: Path, hash_sources: bool = False, shard: Optional[Shard] = None
+    ) -> "BuildManifest":
+        """Loads the manifest from the output directory, or starts an empty one."""
+        manifest = cls(output_dir, hash_sources, shard=shard)
+        if not manifest.path.exists():
+            return manifest
+
+        with open(manifest.path, "r") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    source = record.pop("source")
+                    manifest._entries[source] = ManifestEntry(**record)
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.warning(f"Ignoring malformed manifest line: {e}")
+        return manifest
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, source: str) -> bool:
+        return source in self._entries
+
+    def check(
+        self,
+        source: str,
+        src_path: Path,
+        file_size: int,
+        mtime_ns: int,
+        settings: str,
+    ) -> ManifestStatus:
+        """Compares a source against its recorded entry without opening the image."""
+        entry = self._entries.get(source)
+        if entry is None or not all(
+            (self._output_dir / output).exists() for output in entry.outputs
+        ):
+            return ManifestStatus.NEW
+        if not self._source_matches(entry, src_path, file_size, mtime_ns):
+            return ManifestStatus.MODIFIED
+        if entry.settings != settings:
+            return ManifestStatus.SETTINGS_CHANGED
+        return ManifestStatus.UNCHANGED
+
+    def record(
+        self,
+        source: str,
+        src_path: Path,
+        file_size: int,
+        mtime_ns: int,
+        settings: str,
+        output_paths: List[Path],
+    ):
+        """Records a successfully converted source and every output written for it."""
+        self._entries[source] = ManifestEntry(
+            size=file_size,
+            mtime_ns=mtime_ns,
+            settings=settings,
+            outputs=[
+                output_path.relative_to(self._output_dir).as_posix()
+                for output_path in output_paths
+            ],
+            digest=file_digest(src_path) if self._hash_sources else None,
+        )
+
+    def get(self, source: str) -> Optional[ManifestEntry]:
+        return self._entries.get(source)
+
+    def move(self, old_source: str, new_source: str, output_paths: List[Path]):
+        """Records a renamed source whose outputs were renamed with it."""
+        entry = self._entries.pop(old_source)
+        entry.outputs = [
+            output_path.relative_to(self._output_dir).as_posix()
+            for output_path in output_paths
+        ]
+        self._entries[new_source] = entry
+
+    def remove(self, source: str) -> List[Path]:
+        """Removes a source's entry and deletes its outputs, returning those deleted."""
+        entry = self._entries.pop(source, None)
+        removed = []
+        for output in entry.outputs if entry else []:
+            output_path = self._output_dir / output
+            if output_path.exists():
+                output_path.unlink()
+                removed.append(output_path)
+        return removed
+
+    def prune(self, seen_sources: Iterable[str]) -> List[Path]:
+        """Removes entries and outputs whose sources no longer exist."""
+        seen_sources = set(seen_sources)
+        removed = []
+        for source in [s for s in self._entries if s not in seen_sources]:
+            removed += self.remove(source)
+        return removed
+
+    def save(self):
+        """Atomically writes the manifest to the output directory."""
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w") as file:
+            for source, entry in self._entries.items():
+                file.write(json.dumps({"source": source, **asdict(entry)}) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _source_matches(
+        self, entry: ManifestEntry, src_path: Path, file_size: int, mtime_ns: int
+    ) -> bool:
+        if entry.size != file_size:
+            return False
+        if entry.mtime_ns == mtime_ns:
+            return True
+        if not (self._hash_sources and entry.digest):
+            return False
+        if file_digest(src_path) != entry.digest:
+            return False
+        entry.mtime_ns = mtime_ns
+        return True
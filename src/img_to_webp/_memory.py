@@ -0,0 +1,75 @@
+import heapq
+import math
+import re
+import threading
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_SIZE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([KMGT]?)I?B?", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+# Decoded pixels are counted as RGBA, the widest mode the pipeline uses.
+_BYTES_PER_PIXEL = 4
+
+
+def parse_memory_size(text: str) -> int:
+    """Parses a byte count with an optional binary unit, e.g. ``512M`` or ``2GiB``."""
+    match = _SIZE_PATTERN.fullmatch(str(text).strip())
+    if match is None:
+        raise ValueError(f"Memory size must be a number of bytes, e.g. 2G: {text!r}")
+    return int(float(match[1]) * _SIZE_UNITS[match[2].upper()])
+
+
+def estimate_memory(pixels: int, output_pixels: int, tiled: bool) -> int:
+    """Estimates the peak memory of converting one image, in bytes.
+
+    The decoded source is converted to a second full-size copy unless it is
+    resized in strips, which hold the source resampled to the output width
+    instead (about ``sqrt(pixels * output_pixels)`` pixels when both axes are
+    scaled alike); each output is held as pixels and while encoding.
+    """
+    converted = math.isqrt(pixels * output_pixels) if tiled else pixels
+    return _BYTES_PER_PIXEL * (pixels + converted + 2 * output_pixels)
+
+
+def largest_first(
+    items: Iterable[T], key: Callable[[T], int], window: int
+) -> Iterator[T]:
+    """Yields items largest first among the next ``window`` ones.
+
+    Items are read from ``items`` only as slots free up, so the first item is
+    yielded once ``window`` items are read, not once all of them are.
+    """
+    heap = []
+    for order, item in enumerate(items):
+        heapq.heappush(heap, (-key(item), order, item))
+        if len(heap) >= window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+class MemoryBudget:
+    """Admits work while the memory it is estimated to use fits the limit.
+
+    Work larger than the whole budget is admitted once nothing else runs.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._in_use = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, amount: int) -> int:
+        """Waits until ``amount`` fits, returning what is held until `release`."""
+        amount = min(amount, self.limit)
+        with self._condition:
+            self._condition.wait_for(lambda: self._in_use + amount <= self.limit)
+            self._in_use += amount
+        return amount
+
+    def release(self, amount: int):
+        with self._condition:
+            self._in_use -= amount
+            self._condition.notify_all()
@@ -0,0 +1,276 @@
+import csv
+import json
+import os
+import time
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+
+class PipelineStage(Enum):
+    DECODE = "decode"
+    CONVERT = "convert"
+    RESIZE = "resize"
+    ENCODE = "encode"
+    WRITE = "write"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class ImageMetrics:
+    """Timings and sizes recorded while converting one source image."""
+
+    source: str
+    stage_seconds: Dict[str, float] = field(
+        default_factory=lambda: {str(stage): 0.0 for stage in PipelineStage}
+    )
+    input_bytes: int = 0
+    output_bytes: int = 0
+    input_pixels: int = 0
+    output_pixels: int = 0
+    # Compression of every encoded output, e.g. one per variant.
+    compressions: List[str] = field(default_factory=list)
+    _last_mark: float = field(default=0.0, repr=False, compare=False)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.stage_seconds.values())
+
+    @property
+    def compression_ratio(self) -> Optional[float]:
+        return self.input_bytes / self.output_bytes if self.output_bytes else None
+
+    @property
+    def compression(self) -> str:
+        return ",".join(dict.fromkeys(self.compressions))
+
+    def start(self):
+        """Starts timing the first stage."""
+        self._last_mark = time.perf_counter()
+
+    def mark(self, stage: PipelineStage):
+        """Attributes the time since the previous mark to `stage`."""
+        now = time.perf_counter()
+        self.stage_seconds[stage.value] += now - self._last_mark
+        self._last_mark = now
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            **{f"{stage}_seconds": s for stage, s in self.stage_seconds.items()},
+            "total_seconds": self.total_seconds,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "input_pixels": self.input_pixels,
+            "output_pixels": self.output_pixels,
+            "compression_ratio": self.compression_ratio,
+            "compression": self.compression,
+        }
+
+    @classmethod
+    def from_dict(cls, metrics_dict: Dict[str, Any]) -> "ImageMetrics":
+        """Rebuilds metrics from `to_dict` output, e.g. a row of a saved report."""
+        return cls(
+            source=metrics_dict["source"],
+            stage_seconds={
+                str(stage): float(metrics_dict[f"{stage}_seconds"])
+                for stage in PipelineStage
+            },
+            input_bytes=int(metrics_dict["input_bytes"]),
+            output_bytes=int(metrics_dict["output_bytes"]),
+            input_pixels=int(metrics_dict["input_pixels"]),
+            output_pixels=int(metrics_dict["output_pixels"]),
+            compressions=[c for c in metrics_dict["compression"].split(",") if c],
+        )
+
+
+MetricsHook = Callable[[ImageMetrics], None]
+
+# Per-image counts summed into a report's totals.
+_TOTALS = ["input_bytes", "output_bytes", "input_pixels", "output_pixels"]
+
+
+@dataclass
+class DedupStats:
+    """Duplicate sources whose outputs were linked instead of converted."""
+
+    images: int = 0
+    bytes_saved: int = 0
+    seconds_saved: float = 0.0
+
+    def add(self, output_bytes: int, seconds: float):
+        self.images += 1
+        self.bytes_saved += output_bytes
+        self.seconds_saved += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RunReport:
+    """Aggregates per-image metrics and writes them as JSON, CSV or Prometheus text.
+
+    Totals are kept as images are recorded, so they cover every image even
+    when only the most recent images' rows are kept (see `keep_recent`).
+    """
+
+    def __init__(self):
+        self.images: Deque[ImageMetrics] = deque()
+        self.dedup: Optional[DedupStats] = None
+        # "INDEX/COUNT" when the run converted one shard of the input.
+        self.shard: Optional[str] = None
+        self._count = 0
+        self._stage_seconds = {str(stage): 0.0 for stage in PipelineStage}
+        self._totals: Counter = Counter()
+        self._compressions: Counter = Counter()
+
+    def __call__(self, metrics: ImageMetrics):
+        self.images.append(metrics)
+        self._count += 1
+        for stage, seconds in metrics.stage_seconds.items():
+            self._stage_seconds[stage] += seconds
+        for name in _TOTALS:
+            self._totals[name] += getattr(metrics, name)
+        self._compressions[metrics.compression] += 1
+
+    def keep_recent(self, max_images: int):
+        """Keeps only the rows of the last `max_images` images, e.g. for a long watch."""
+        self.images = deque(self.images, maxlen=max_images)
+
+    @classmethod
+    def load(cls, path: str) -> "RunReport":
+        """Loads a report written by `write` as JSON or CSV."""
+        report = cls()
+        summary = None
+        with open(path, newline="") as file:
+            if Path(path).suffix.lower() == ".csv":
+                rows = list(csv.DictReader(file))
+            else:
+                report_dict = json.load(file)
+                rows = report_dict["images"]
+                summary = report_dict.get("summary", {})
+                if "dedup" in summary:
+                    report.dedup = DedupStats(**summary["dedup"])
+                report.shard = summary.get("shard")
+        for row in rows:
+            report(ImageMetrics.from_dict(row))
+        if summary and summary.get("images", 0) > len(rows):
+            # Written with only the recent rows kept; the summary has the totals.
+            report._count = summary["images"]
+            report._stage_seconds = dict(summary["stage_seconds"])
+            report._totals = Counter({name: summary[name] for name in _TOTALS})
+            report._compressions = Counter(summary["compression"])
+        return report
+
+    def merge(self, other: "RunReport"):
+        """Adds another run's images and dedup savings to this report."""
+        self.images.extend(other.images)
+        self._count += other._count
+        for stage, seconds in other._stage_seconds.items():
+            self._stage_seconds[stage] += seconds
+        self._totals.update(other._totals)
+        self._compressions.update(other._compressions)
+        if other.dedup is not None:
+            self.dedup = self.dedup or DedupStats()
+            self.dedup.images += other.dedup.images
+            self.dedup.bytes_saved += other.dedup.bytes_saved
+            self.dedup.seconds_saved += other.dedup.seconds_saved
+
+    def summarize(self) -> Dict[str, Any]:
+        input_bytes = self._totals["input_bytes"]
+        output_bytes = self._totals["output_bytes"]
+        count = self._count
+        return {
+            "images": count,
+            "stage_seconds": dict(self._stage_seconds),
+            "stage_mean_seconds": {
+                stage: total / count if count else 0.0
+                for stage, total in self._stage_seconds.items()
+            },
+            "total_seconds": sum(self._stage_seconds.values()),
+            "input_bytes": input_bytes,
+            "output_bytes": output_bytes,
+            "input_pixels": self._totals["input_pixels"],
+            "output_pixels": self._totals["output_pixels"],
+            "compression_ratio": input_bytes / output_bytes if output_bytes else None,
+            "compression": dict(self._compressions),
+            **({"dedup": self.dedup.to_dict()} if self.dedup is not None else {}),
+            **({"shard": self.shard} if self.shard is not None else {}),
+        }
+
+    def write(self, path: str):
+        """Writes the report as CSV if the path ends in ``.csv``, otherwise as JSON."""
+        if Path(path).suffix.lower() == ".csv":
+            self.write_csv(path)
+        else:
+            self.write_json(path)
+
+    def write_json(self, path: str):
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "summary": self.summarize(),
+                    "images": [m.to_dict() for m in self.images],
+                },
+                file,
+                indent=2,
+            )
+
+    def write_csv(self, path: str):
+        rows = [m.to_dict() for m in self.images]
+        fieldnames = list(ImageMetrics(source="").to_dict())
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+
+    def write_prometheus(self, path: str):
+        """Writes a node_exporter textfile-collector file, replacing it atomically."""
+        summary = self.summarize()
+        lines = [
+            "# HELP img_to_webp_images_total Images converted in the last run.",
+            "# TYPE img_to_webp_images_total gauge",
+            f"img_to_webp_images_total {summary['images']}",
+            "# HELP img_to_webp_stage_seconds Time spent per pipeline stage.",
+            "# TYPE img_to_webp_stage_seconds gauge",
+        ]
+        lines += [
+            f'img_to_webp_stage_seconds{{stage="{stage}"}} {seconds}'
+            for stage, seconds in summary["stage_seconds"].items()
+        ]
+        lines += [
+            "# HELP img_to_webp_compression_images Images per selected compression.",
+            "# TYPE img_to_webp_compression_images gauge",
+        ]
+        lines += [
+            f'img_to_webp_compression_images{{compression="{compression}"}} {count}'
+            for compression, count in summary["compression"].items()
+        ]
+        for name in _TOTALS:
+            lines += [
+                f"# HELP img_to_webp_{name} Total {name.replace('_', ' ')}.",
+                f"# TYPE img_to_webp_{name} gauge",
+                f"img_to_webp_{name} {summary[name]}",
+            ]
+        for name, value in summary.get("dedup", {}).items():
+            lines += [
+                f"# HELP img_to_webp_dedup_{name} Duplicate sources linked: "
+                f"{name.replace('_', ' ')}.",
+                f"# TYPE img_to_webp_dedup_{name} gauge",
+                f"img_to_webp_dedup_{name} {value}",
+            ]
+        if summary["compression_ratio"] is not None:
+            lines += [
+                "# HELP img_to_webp_compression_ratio Input bytes per output byte.",
+                "# TYPE img_to_webp_compression_ratio gauge",
+                f"img_to_webp_compression_ratio {summary['compression_ratio']}",
+            ]
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
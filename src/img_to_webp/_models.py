@@ -1,6 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field, fields
 from enum import Enum
-from typing import Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional, Union
 
 
 class ResizeMode(Enum):
@@ -13,21 +13,246 @@ class ResizeMode(Enum):
         return self.value
 
 
+class Gravity(Enum):
+    """Where the `cover` mode crops from."""
+
+    CENTER = "center"
+    ENTROPY = "entropy"
+    ATTENTION = "attention"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class ResampleFilter(Enum):
+    """Resampling filter, or a preset that picks the filter and reducing gap.
+
+    ``fast`` is bilinear with a reducing gap of 2, ``quality`` is exact
+    Lanczos and ``auto`` picks the cheapest filter for each image's scale.
+    """
+
+    NEAREST = "nearest"
+    BOX = "box"
+    BILINEAR = "bilinear"
+    HAMMING = "hamming"
+    BICUBIC = "bicubic"
+    LANCZOS = "lanczos"
+    FAST = "fast"
+    QUALITY = "quality"
+    AUTO = "auto"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class ExecutorType(Enum):
+    PROCESS = "process"
+    THREAD = "thread"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class DedupMode(Enum):
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+    COPY = "copy"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+class Compression(Enum):
+    LOSSY = "lossy"
+    LOSSLESS = "lossless"
+    NEAR_LOSSLESS = "near_lossless"
+    AUTO = "auto"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class EncodeSettings:
+    """WebP encoder settings, optionally with a goal that the quality is searched for.
+
+    ``max_bytes`` selects the highest quality whose output fits the budget;
+    ``min_ssim`` and ``min_psnr`` select the lowest quality that reaches the
+    score. Unset fields are filled in by `merged_with`. ``lossless`` is a
+    shorthand for the lossless ``compression``.
+    """
+
+    TARGETS = ("max_bytes", "min_ssim", "min_psnr")
+
+    quality: Optional[int] = None
+    method: Optional[int] = None
+    alpha_quality: Optional[int] = None
+    lossless: Optional[bool] = None
+    max_bytes: Optional[int] = None
+    min_ssim: Optional[float] = None
+    min_psnr: Optional[float] = None
+    compression: Optional[Compression] = None
+
+    def __post_init__(self):
+        if self.compression is not None:
+            self.compression = Compression(self.compression)
+        if self.lossless and self.compression not in (None, Compression.LOSSLESS):
+            raise ValueError(f"lossless conflicts with compression {self.compression}")
+        if self.compression is None and self.lossless is not None:
+            self.compression = (
+                Compression.LOSSLESS if self.lossless else Compression.LOSSY
+            )
+
+        for name, upper in [("quality", 100), ("method", 6), ("alpha_quality", 100)]:
+            value = getattr(self, name)
+            if value is not None and not 0 <= value <= upper:
+                raise ValueError(f"{name} must be between 0 and {upper}: {value}")
+        targets = [name for name in self.TARGETS if getattr(self, name) is not None]
+        if len(targets) > 1:
+            raise ValueError(f"Only one encoding target can be set: {targets}")
+
+    @property
+    def has_target(self) -> bool:
+        return any(getattr(self, name) is not None for name in self.TARGETS)
+
+    @property
+    def is_set(self) -> bool:
+        return any(getattr(self, f.name) is not None for f in fields(self))
+
+    def merged_with(self, defaults: "EncodeSettings") -> "EncodeSettings":
+        """Fills unset fields from `defaults`; a target set here replaces theirs."""
+        merged = {
+            f.name: getattr(defaults, f.name)
+            if getattr(self, f.name) is None
+            else getattr(self, f.name)
+            for f in fields(self)
+        }
+        if self.has_target:
+            merged.update({name: getattr(self, name) for name in self.TARGETS})
+        if self.compression is not None:
+            merged["lossless"] = self.compression == Compression.LOSSLESS
+        return EncodeSettings(**merged)
+
+    def to_dict(self) -> Dict[str, Any]:
+        settings = asdict(self)
+        settings["compression"] = str(self.compression) if self.compression else None
+        return settings
+
+
+@dataclass
+class Variant:
+    """One output derived from a source, written as ``<name><suffix>.webp``."""
+
+    size: Optional[Tuple[int, int]]
+    mode: Optional[ResizeMode]
+    quality: Optional[int]
+    suffix: str
+
+    def __init__(
+        self,
+        size: Optional[Tuple[int, int]] = None,
+        mode: Optional[str] = None,
+        quality: Optional[int] = None,
+        suffix: Optional[str] = None,
+    ):
+        self.size = tuple(size) if size else None
+        self.mode = ResizeMode(mode) if mode else None
+        self.quality = quality
+        if suffix is None:
+            suffix = f"_{self.size[0]}x{self.size[1]}" if self.size else ""
+        self.suffix = suffix
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "size": list(self.size) if self.size else None,
+            "mode": self.mode.value if self.mode else None,
+            "quality": self.quality,
+            "suffix": self.suffix,
+        }
+
+
+def parse_variants(variants: List[Union[Variant, Dict[str, Any]]]) -> List[Variant]:
+    """Builds variants from config dictionaries, rejecting duplicate suffixes."""
+    variants = [v if isinstance(v, Variant) else Variant(**v) for v in variants]
+    suffixes = [variant.suffix for variant in variants]
+    if len(set(suffixes)) != len(suffixes):
+        raise ValueError(f"Variant suffixes must be unique: {suffixes}")
+    return variants
+
+
 @dataclass
 class ResizeRule:
     pattern: str
     size: Optional[Tuple[int, int]]
     mode: Optional[ResizeMode]
+    variants: List[Variant] = field(default_factory=list)
+    encoding: EncodeSettings = field(default_factory=EncodeSettings)
+    gravity: Optional[Gravity] = None
+    focal_point: Optional[Tuple[float, float]] = None
+    resample: Optional[ResampleFilter] = None
+    reducing_gap: Optional[float] = None
+    no_upscale: Optional[bool] = None
 
     def __init__(
         self,
         pattern: str,
         size: Optional[Tuple[int, int]] = None,
         mode: Optional[str] = None,
+        variants: Optional[List[Union[Variant, Dict[str, Any]]]] = None,
+        quality: Optional[int] = None,
+        method: Optional[int] = None,
+        alpha_quality: Optional[int] = None,
+        lossless: Optional[bool] = None,
+        max_bytes: Optional[int] = None,
+        min_ssim: Optional[float] = None,
+        min_psnr: Optional[float] = None,
+        compression: Optional[str] = None,
+        gravity: Optional[str] = None,
+        focal_point: Optional[Tuple[float, float]] = None,
+        resample: Optional[str] = None,
+        reducing_gap: Optional[float] = None,
+        no_upscale: Optional[bool] = None,
     ):
-        if not mode and not size:
-            raise ValueError("Either size or mode must be provided")
+        self.encoding = EncodeSettings(
+            quality,
+            method,
+            alpha_quality,
+            lossless,
+            max_bytes,
+            min_ssim,
+            min_psnr,
+            compression,
+        )
+        if (
+            not mode
+            and not size
+            and not variants
+            and not self.encoding.is_set
+            and not gravity
+            and focal_point is None
+            and not resample
+            and reducing_gap is None
+            and no_upscale is None
+        ):
+            raise ValueError(
+                "Either size, mode, variants, gravity, a focal point, resampling, "
+                "no_upscale or encoder settings must be provided"
+            )
+        if reducing_gap is not None and reducing_gap < 1:
+            raise ValueError(f"reducing_gap must be 1.0 or greater: {reducing_gap}")
+        if focal_point is not None and (
+            len(focal_point) != 2 or not all(0 <= value <= 1 for value in focal_point)
+        ):
+            raise ValueError(
+                f"focal_point must be two fractions between 0 and 1: {focal_point}"
+            )
 
         self.pattern = pattern
         self.size = tuple(size) if size else None
         self.mode = ResizeMode(mode) if mode else None
+        self.variants = parse_variants(variants or [])
+        self.gravity = Gravity(gravity) if gravity else None
+        self.focal_point = tuple(focal_point) if focal_point is not None else None
+        self.resample = ResampleFilter(resample) if resample else None
+        self.reducing_gap = reducing_gap
+        self.no_upscale = no_upscale
@@ -0,0 +1,46 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from ._streams import BufferLike
+
+T = TypeVar("T")
+
+
+def write_atomic(path: Path, data: BufferLike):
+    """Writes a file under a temporary name and renames it into place.
+
+    Readers see either the previous file or the complete new one. Renaming
+    replaces the directory entry, so other hardlinks to the previous file
+    keep its contents.
+    """
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as file:
+            file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def prefetch(items: Iterable[T], read: Callable[[T], None], count: int) -> Iterator[T]:
+    """Yields items in order while ``read`` runs on up to ``count`` upcoming ones.
+
+    Reads happen on background threads; an item is yielded once its read has
+    finished. At most ``count`` items are read ahead of the consumer.
+    """
+    with ThreadPoolExecutor(count, thread_name_prefix="prefetch") as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(read, item)))
+            if len(pending) > count:
+                item, future = pending.popleft()
+                future.result()
+                yield item
+        while pending:
+            item, future = pending.popleft()
+            future.result()
+            yield item
@@ -0,0 +1,128 @@
+import json
+from dataclasses import asdict, dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from ._models import ResizeMode, Variant
+
+
+class PlanAction(Enum):
+    CONVERT = "convert"
+    UNCHANGED = "unchanged"
+    EXISTS = "exists"
+    COLLISION = "collision"
+    INVALID = "invalid"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class PlannedJob:
+    """A single source file and the conversion decided for it."""
+
+    source: str
+    output: str
+    action: PlanAction
+    size: Optional[Tuple[int, int]]
+    mode: ResizeMode
+    overwrite: Optional[bool] = None
+    reason: Optional[str] = None
+    file_size: int = 0
+    mtime_ns: int = 0
+    settings: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    variants: List[Variant] = field(default_factory=list)
+    # Source bytes of an archive member; not saved with plans.
+    data: Optional[bytes] = field(default=None, repr=False, compare=False)
+
+    @property
+    def pixels(self) -> int:
+        return (self.width or 0) * (self.height or 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        job_dict = asdict(self)
+        del job_dict["data"]
+        job_dict["action"] = self.action.value
+        job_dict["mode"] = self.mode.value
+        job_dict["variants"] = [variant.to_dict() for variant in self.variants]
+        return job_dict
+
+    @classmethod
+    def from_dict(cls, job_dict: Dict[str, Any]) -> "PlannedJob":
+        job_dict = dict(job_dict)
+        job_dict["action"] = PlanAction(job_dict["action"])
+        job_dict["mode"] = ResizeMode(job_dict["mode"])
+        job_dict["size"] = tuple(job_dict["size"]) if job_dict.get("size") else None
+        job_dict["variants"] = [
+            Variant(**variant) for variant in job_dict.get("variants", [])
+        ]
+        return cls(**job_dict)
+
+
+@dataclass
+class PlanSummary:
+    convert: int = 0
+    unchanged: int = 0
+    exists: int = 0
+    collision: int = 0
+    invalid: int = 0
+    input_pixels: int = 0
+    input_bytes: int = 0
+
+    @property
+    def total(self) -> int:
+        return (
+            self.convert + self.unchanged + self.exists + self.collision + self.invalid
+        )
+
+    @property
+    def skip(self) -> int:
+        return self.unchanged + self.exists
+
+    def add(self, job: PlannedJob):
+        """Counts a job; pixels and bytes only cover jobs that will be converted."""
+        setattr(self, job.action.value, getattr(self, job.action.value) + 1)
+        if job.action == PlanAction.CONVERT:
+            self.input_pixels += job.pixels
+            self.input_bytes += job.file_size
+
+
+@dataclass
+class JobPlan:
+    """Every planned job for an input/output directory pair."""
+
+    input_dir: str
+    output_dir: str
+    jobs: List[PlannedJob] = field(default_factory=list)
+
+    def summarize(self) -> PlanSummary:
+        summary = PlanSummary()
+        for job in self.jobs:
+            summary.add(job)
+        return summary
+
+    def save(self, path: str):
+        """Serializes the plan to a JSON file."""
+        with open(path, "w") as file:
+            json.dump(
+                {
+                    "input_dir": self.input_dir,
+                    "output_dir": self.output_dir,
+                    "jobs": [job.to_dict() for job in self.jobs],
+                },
+                file,
+                indent=2,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "JobPlan":
+        """Loads a plan saved with `save`."""
+        with open(path, "r") as file:
+            plan_dict = json.load(file)
+        return cls(
+            input_dir=plan_dict["input_dir"],
+            output_dir=plan_dict["output_dir"],
+            jobs=[PlannedJob.from_dict(job) for job in plan_dict["jobs"]],
+        )
@@ -0,0 +1,19 @@
+import importlib
+from pathlib import Path
+
+# Image.open and Image.save import the BMP, GIF, JPEG, PNG and PPM plugins up
+# front and fall back to Image.init, which imports every plugin Pillow ships
+# (tens of milliseconds), for any other format. Importing just the plugin a
+# file needs keeps that off the startup path of short runs.
+_PLUGINS = {
+    ".tif": "TiffImagePlugin",
+    ".tiff": "TiffImagePlugin",
+    ".webp": "WebPImagePlugin",
+}
+
+
+def load_plugin(filename: str):
+    """Imports the Pillow plugin for a file's suffix unless Pillow preloads it."""
+    plugin = _PLUGINS.get(Path(filename).suffix.lower())
+    if plugin is not None:
+        importlib.import_module(f"PIL.{plugin}")
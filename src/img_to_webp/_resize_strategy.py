@@ -1,63 +1,376 @@
+import math
 from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional, Tuple
 
-from PIL import Image
+from PIL import Image, ImageFilter, ImageStat
 
-from ._models import ResizeMode
+from ._models import Gravity, ResampleFilter, ResizeMode
+
+# Longest side of the preview that entropy and attention crops are scored on.
+_PREVIEW_SIZE = 128
+
+# The `auto` filter by the smallest scale it is used for. Measured on
+# photo-like images, each stays above 45 dB PSNR against exact Lanczos.
+_AUTO_FILTERS = [
+    (0.25, Image.Resampling.BICUBIC, None),
+    (0.0, Image.Resampling.LANCZOS, 2.0),
+]
+_FAST_REDUCING_GAP = 2.0
+_THUMBNAIL_REDUCING_GAP = 2.0
+
+
+def get_resampling(
+    resample: ResampleFilter,
+    reducing_gap: Optional[float],
+    scale: float,
+    default_gap: Optional[float] = None,
+) -> Tuple[Image.Resampling, Optional[float]]:
+    """Resolves a filter or preset to a Pillow filter and reducing gap.
+
+    A set ``reducing_gap`` overrides the preset's; otherwise plain filters
+    use ``default_gap``.
+    """
+    if resample == ResampleFilter.AUTO:
+        _, pillow_filter, gap = next(row for row in _AUTO_FILTERS if scale > row[0])
+    elif resample == ResampleFilter.FAST:
+        pillow_filter, gap = Image.Resampling.BILINEAR, _FAST_REDUCING_GAP
+    elif resample == ResampleFilter.QUALITY:
+        pillow_filter, gap = Image.Resampling.LANCZOS, None
+    else:
+        pillow_filter, gap = Image.Resampling[resample.name], default_gap
+    return pillow_filter, gap if reducing_gap is None else reducing_gap
+
+
+@dataclass
+class ResizeTarget:
+    """What a resize produces: the output size, the source region it is
+    resampled from, and the filter used."""
+
+    size: Tuple[int, int]
+    box: Tuple[float, float, float, float]
+    resample: Image.Resampling
+    reducing_gap: Optional[float] = None
 
 
 class ResizeStrategy(ABC):
-    """Image resize strategy interface."""
+    """Image resize strategy interface.
+
+    ``resample`` and ``reducing_gap`` select the filter; see `get_resampling`.
+    """
+
+    def __init__(
+        self,
+        resample: ResampleFilter = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+    ):
+        self.resample = resample
+        self.reducing_gap = reducing_gap
 
     @abstractmethod
     def resize(self, img: Image, size: tuple[int, int]) -> Image:
         """Resizes an image to the specified size."""
         pass
 
+    def get_scale(self, img_size: tuple[int, int], size: tuple[int, int]) -> float:
+        """Returns the largest factor by which either side of the image is scaled."""
+        return 1.0
+
+    def get_target(self, img: Image, size: tuple[int, int]) -> Optional[ResizeTarget]:
+        """Returns what `resize` would produce, or None if the strategy cannot
+        tell without resizing; large images are then resized in one piece."""
+        return None
+
+    def get_size(
+        self, img_size: tuple[int, int], size: tuple[int, int]
+    ) -> Optional[tuple[int, int]]:
+        """Returns the output size for the source dimensions alone, as read from
+        a header before decoding, or None if the strategy cannot tell.
+
+        An output the size of the source is the whole source, unresampled.
+        """
+        return None
+
+    def get_resampling(
+        self,
+        img_size: tuple[int, int],
+        size: tuple[int, int],
+        default_gap: Optional[float] = None,
+    ) -> Tuple[Image.Resampling, Optional[float]]:
+        """Returns the Pillow filter and reducing gap for resizing an image."""
+        return get_resampling(
+            self.resample,
+            self.reducing_gap,
+            self.get_scale(img_size, size),
+            default_gap,
+        )
+
 
 class ResizeCoverStrategy(ResizeStrategy):
+    """Crops to the target aspect ratio, then resamples only the kept region.
+
+    The crop box is placed around ``focal_point`` (fractions of the width and
+    height) if given, otherwise according to ``gravity``. With ``no_upscale``,
+    sources smaller than the target are only cropped to its aspect ratio.
+    """
+
+    def __init__(
+        self,
+        gravity: Gravity = Gravity.CENTER,
+        focal_point: Optional[Tuple[float, float]] = None,
+        resample: ResampleFilter = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+        no_upscale: bool = False,
+    ):
+        super().__init__(resample, reducing_gap)
+        self.gravity = gravity
+        self.focal_point = focal_point
+        self.no_upscale = no_upscale
+
     def resize(self, img: Image, size: tuple[int, int]) -> Image:
+        target = self.get_target(img, size)
+        if target.size == img.size:
+            return img
+        left, top, right, bottom = target.box
+        if (right - left, bottom - top) == target.size and all(
+            value == int(value) for value in target.box
+        ):
+            # Whole pixels at a scale of one: nothing to resample.
+            return img.crop(tuple(int(value) for value in target.box))
+        return img.resize(
+            target.size,
+            target.resample,
+            box=target.box,
+            reducing_gap=target.reducing_gap,
+        )
+
+    def get_target(self, img: Image, size: tuple[int, int]) -> ResizeTarget:
+        box = self.get_box(img, size)
+        output_size = self.get_size(img.size, size)
+        if output_size != tuple(size):
+            # Kept at the source's resolution; the box is moved to whole pixels.
+            left = min(round(box[0]), img.width - output_size[0])
+            top = min(round(box[1]), img.height - output_size[1])
+            box = (left, top, left + output_size[0], top + output_size[1])
+        return ResizeTarget(
+            output_size, box, *self.get_resampling(img.size, output_size)
+        )
+
+    def get_size(
+        self, img_size: tuple[int, int], size: tuple[int, int]
+    ) -> tuple[int, int]:
+        if not self.no_upscale or self._get_cover_scale(img_size, size) <= 1:
+            return tuple(size)
+        box_size = self._get_box_size(img_size, size)
+        return (
+            max(min(round(box_size[0]), img_size[0]), 1),
+            max(min(round(box_size[1]), img_size[1]), 1),
+        )
+
+    def get_scale(self, img_size: tuple[int, int], size: tuple[int, int]) -> float:
+        scale = self._get_cover_scale(img_size, size)
+        return min(scale, 1.0) if self.no_upscale else scale
+
+    @staticmethod
+    def _get_cover_scale(img_size: tuple[int, int], size: tuple[int, int]) -> float:
+        return max(size[0] / img_size[0], size[1] / img_size[1])
+
+    @staticmethod
+    def _get_box_size(
+        img_size: tuple[int, int], size: tuple[int, int]
+    ) -> Tuple[float, float]:
+        """Returns the largest region of the source with the target aspect ratio."""
         width, height = size
-        if img.width * width > img.height * height:
-            scale = height / img.height
+        if img_size[0] * height > img_size[1] * width:
+            return img_size[1] * width / height, img_size[1]
+        return img_size[0], img_size[0] * height / width
+
+    def get_box(
+        self, img: Image, size: tuple[int, int]
+    ) -> Tuple[float, float, float, float]:
+        """Returns the region of the source, in source pixels, that is kept."""
+        box_size = self._get_box_size(img.size, size)
+
+        if self.focal_point is not None:
+            left = self.focal_point[0] * img.width - box_size[0] / 2
+            top = self.focal_point[1] * img.height - box_size[1] / 2
+        elif self.gravity == Gravity.CENTER:
+            left = (img.width - box_size[0]) / 2
+            top = (img.height - box_size[1]) / 2
         else:
-            scale = width / img.width
+            left, top = self._find_salient_offset(img, box_size)
+
+        left = min(max(left, 0), img.width - box_size[0])
+        top = min(max(top, 0), img.height - box_size[1])
+        return left, top, left + box_size[0], top + box_size[1]
+
+    def _find_salient_offset(
+        self, img: Image, box_size: Tuple[float, float]
+    ) -> Tuple[float, float]:
+        """Slides the box along the cropped axis of a small grayscale preview.
 
-        new_img_size = (int(img.width * scale), int(img.height * scale))
-        new_img = img.resize(new_img_size, Image.Resampling.LANCZOS)
+        Each position is scored by the entropy of its histogram, or for
+        ``attention`` by the strength of the edges inside it.
+        """
+        scale = min(_PREVIEW_SIZE / max(img.size), 1.0)
+        preview_size = (
+            max(round(img.width * scale), 1),
+            max(round(img.height * scale), 1),
+        )
+        preview = img.resize(preview_size, Image.Resampling.BOX).convert("L")
+        if self.gravity == Gravity.ATTENTION and min(preview_size) > 2:
+            # Filters copy the border pixels, which are not edges.
+            edges = preview.filter(ImageFilter.FIND_EDGES)
+            preview = Image.new("L", preview_size)
+            preview.paste(
+                edges.crop((1, 1, preview_size[0] - 1, preview_size[1] - 1)), (1, 1)
+            )
 
-        left = int((new_img_size[0] - width) / 2)
-        top = int((new_img_size[1] - height) / 2)
-        right = int(left + width)
-        bottom = int(top + height)
+        horizontal = box_size[0] < img.width
+        axis = 0 if horizontal else 1
+        window = min(max(round(box_size[axis] * scale), 1), preview_size[axis])
+        free = preview_size[axis] - window
+        if free <= 0:
+            return (img.width - box_size[0]) / 2, (img.height - box_size[1]) / 2
 
-        return new_img.crop((left, top, right, bottom))
+        def score(offset: int) -> float:
+            box = (
+                (offset, 0, offset + window, preview_size[1])
+                if horizontal
+                else (0, offset, preview_size[0], offset + window)
+            )
+            region = preview.crop(box)
+            if self.gravity == Gravity.ATTENTION:
+                return ImageStat.Stat(region).sum[0]
+            return region.entropy()
+
+        scores = [score(offset) for offset in range(free + 1)]
+        offset = max(range(free + 1), key=scores.__getitem__)
+        # The centre is kept unless some other position scores higher.
+        if scores[offset] <= scores[round(free / 2)]:
+            return (img.width - box_size[0]) / 2, (img.height - box_size[1]) / 2
+
+        # Maps the window's travel across the preview back to the source.
+        if horizontal:
+            return offset / free * (img.width - box_size[0]), 0
+        return 0, offset / free * (img.height - box_size[1])
 
 
 class ResizeContainStrategy(ResizeStrategy):
     def resize(self, img: Image, size: tuple[int, int]) -> Image:
-        img.thumbnail(size, Image.Resampling.LANCZOS)
+        # Keeps the reducing gap that `Image.thumbnail` applies by default.
+        pillow_filter, reducing_gap = self.get_resampling(
+            img.size, size, _THUMBNAIL_REDUCING_GAP
+        )
+        img.thumbnail(size, pillow_filter, reducing_gap)
         return img
 
+    def get_target(self, img: Image, size: tuple[int, int]) -> ResizeTarget:
+        box = (0, 0, img.width, img.height)
+        output_size = self.get_size(img.size, size)
+        if output_size == img.size:
+            return ResizeTarget(img.size, box, Image.Resampling.NEAREST)
+        return ResizeTarget(
+            output_size,
+            box,
+            *self.get_resampling(img.size, size, _THUMBNAIL_REDUCING_GAP),
+        )
+
+    def get_size(
+        self, img_size: tuple[int, int], size: tuple[int, int]
+    ) -> tuple[int, int]:
+        if size[0] >= img_size[0] and size[1] >= img_size[1]:
+            return tuple(img_size)
+
+        # The output size as `Image.thumbnail` rounds it.
+        width, height = size
+        aspect = img_size[0] / img_size[1]
+
+        def round_aspect(number: float, key) -> int:
+            return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+        if width / height >= aspect:
+            width = round_aspect(height * aspect, lambda n: abs(aspect - n / height))
+        else:
+            height = round_aspect(
+                width / aspect, lambda n: 0 if n == 0 else abs(aspect - width / n)
+            )
+        return width, height
+
+    def get_scale(self, img_size: tuple[int, int], size: tuple[int, int]) -> float:
+        return min(size[0] / img_size[0], size[1] / img_size[1], 1.0)
+
 
 class ResizeFillStrategy(ResizeStrategy):
+    """Stretches to the target size; with ``no_upscale``, neither side grows."""
+
+    def __init__(
+        self,
+        resample: ResampleFilter = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+        no_upscale: bool = False,
+    ):
+        super().__init__(resample, reducing_gap)
+        self.no_upscale = no_upscale
+
     def resize(self, img: Image, size: tuple[int, int]) -> Image:
-        return img.resize(size, Image.Resampling.LANCZOS)
+        size = self.get_size(img.size, size)
+        if size == img.size:
+            return img
+        pillow_filter, reducing_gap = self.get_resampling(img.size, size)
+        return img.resize(size, pillow_filter, reducing_gap=reducing_gap)
+
+    def get_target(self, img: Image, size: tuple[int, int]) -> ResizeTarget:
+        size = self.get_size(img.size, size)
+        return ResizeTarget(
+            size, (0, 0, img.width, img.height), *self.get_resampling(img.size, size)
+        )
+
+    def get_size(
+        self, img_size: tuple[int, int], size: tuple[int, int]
+    ) -> tuple[int, int]:
+        if self.no_upscale:
+            return min(size[0], img_size[0]), min(size[1], img_size[1])
+        return tuple(size)
+
+    def get_scale(self, img_size: tuple[int, int], size: tuple[int, int]) -> float:
+        size = self.get_size(img_size, size)
+        return max(size[0] / img_size[0], size[1] / img_size[1])
 
 
 class ResizeNoneStrategy(ResizeStrategy):
     def resize(self, img: Image, size: tuple[int, int]) -> Image:
         return img
 
+    def get_target(self, img: Image, size: tuple[int, int]) -> ResizeTarget:
+        return ResizeTarget(
+            img.size, (0, 0, img.width, img.height), Image.Resampling.NEAREST
+        )
+
+    def get_size(
+        self, img_size: tuple[int, int], size: tuple[int, int]
+    ) -> tuple[int, int]:
+        return tuple(img_size)
+
 
 class ResizeStrategyFactory:
     @staticmethod
-    def get_strategy(mode: ResizeMode) -> ResizeStrategy:
+    def get_strategy(
+        mode: ResizeMode,
+        gravity: Gravity = Gravity.CENTER,
+        focal_point: Optional[Tuple[float, float]] = None,
+        resample: ResampleFilter = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+        no_upscale: bool = False,
+    ) -> ResizeStrategy:
         if mode == ResizeMode.COVER:
-            return ResizeCoverStrategy()
+            return ResizeCoverStrategy(
+                gravity, focal_point, resample, reducing_gap, no_upscale
+            )
         elif mode == ResizeMode.CONTAIN:
-            return ResizeContainStrategy()
+            return ResizeContainStrategy(resample, reducing_gap)
         elif mode == ResizeMode.FILL:
-            return ResizeFillStrategy()
+            return ResizeFillStrategy(resample, reducing_gap, no_upscale)
         else:
             return ResizeNoneStrategy()
 
@@ -66,7 +379,16 @@ class ResizeStrategyFactoryProxy:
     def __init__(self):
         self._strategies = {}
 
-    def get_strategy(self, mode: ResizeMode) -> ResizeStrategy:
-        if mode not in self._strategies:
-            self._strategies[mode] = ResizeStrategyFactory.get_strategy(mode)
-        return self._strategies[mode]
+    def get_strategy(
+        self,
+        mode: ResizeMode,
+        gravity: Gravity = Gravity.CENTER,
+        focal_point: Optional[Tuple[float, float]] = None,
+        resample: ResampleFilter = ResampleFilter.LANCZOS,
+        reducing_gap: Optional[float] = None,
+        no_upscale: bool = False,
+    ) -> ResizeStrategy:
+        key = (mode, gravity, focal_point, resample, reducing_gap, no_upscale)
+        if key not in self._strategies:
+            self._strategies[key] = ResizeStrategyFactory.get_strategy(*key)
+        return self._strategies[key]
@@ -0,0 +1,168 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from ._models import ResizeRule
+
+_META_CHARS = set(".^$*+?{}[]\\|()")
+
+# Flags of a pattern without inline global flags such as "(?i)".
+_DEFAULT_FLAGS = re.compile("").flags
+
+# Memoized filenames are dropped wholesale once the cache reaches this size.
+_CACHE_SIZE = 65536
+
+
+def _parse_literal(pattern: str) -> Optional[str]:
+    """Returns the text a pattern matches literally, or None if it is not a literal."""
+    chars = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                chars.append(pattern[i + 1])
+                i += 2
+                continue
+            return None
+        if char in _META_CHARS:
+            return None
+        chars.append(char)
+        i += 1
+    return "".join(chars)
+
+
+def _classify(pattern: str) -> Tuple[Optional[str], Optional[str]]:
+    """Classifies a pattern as a "prefix", "suffix" or "exact" literal match.
+
+    Returns (None, None) if the pattern needs the regex engine.
+    """
+    # Patterns are applied with re.match, so a leading "^" is redundant.
+    body = pattern[1:] if pattern.startswith("^") else pattern
+    anchored = False
+    if body.endswith("$"):
+        # An odd number of backslashes before "$" escapes it.
+        escapes = len(body) - 1 - len(body[:-1].rstrip("\\"))
+        anchored = escapes % 2 == 0
+        if anchored:
+            body = body[:-1]
+    open_end = body.endswith(".*") and not body.endswith("\\.*")
+    if open_end:
+        body = body[:-2]
+    open_start = body.startswith(".*")
+    if open_start:
+        body = body[2:]
+
+    literal = _parse_literal(body)
+    if literal is None:
+        return None, None
+    if not open_start:
+        return ("prefix" if open_end or not anchored else "exact"), literal
+    if anchored and not open_end:
+        return "suffix", literal
+    return None, None
+
+
+class RuleMatcher:
+    """Resolves the first resize rule whose pattern matches a filename.
+
+    Patterns keep `re.match` semantics. They are compiled once, literal prefix,
+    suffix and exact-name rules are looked up in hash indexes, the remaining
+    patterns are combined into a single alternation, and results are memoized
+    per filename.
+    """
+
+    def __init__(self, rules: List[ResizeRule]):
+        self._rules = rules
+        self._prefixes: Dict[str, int] = {}
+        self._suffixes: Dict[str, int] = {}
+        self._exact: Dict[str, int] = {}
+        self._cache: Dict[str, Optional[int]] = {}
+
+        indexes = {
+            "prefix": self._prefixes,
+            "suffix": self._suffixes,
+            "exact": self._exact,
+        }
+        regex_rules: List[Tuple[int, "re.Pattern[str]"]] = []
+        for index, rule in enumerate(rules):
+            try:
+                compiled = re.compile(rule.pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid resize rule pattern {rule.pattern!r}: {e}")
+            kind, literal = _classify(rule.pattern)
+            if kind is None:
+                regex_rules.append((index, compiled))
+            else:
+                indexes[kind].setdefault(literal, index)
+
+        self._prefix_lengths = sorted({len(p) for p in self._prefixes})
+        self._suffix_lengths = sorted({len(s) for s in self._suffixes})
+        # Inline global flags would apply to the whole alternation (Python 3.9
+        # and 3.10 only warn about them mid-pattern), so such patterns are
+        # always matched on their own.
+        combinable = [rule for rule in regex_rules if rule[1].flags == _DEFAULT_FLAGS]
+        self._combined = self._combine(combinable)
+        if self._combined is None:
+            self._combined_rules = []
+            self._separate_rules = regex_rules
+        else:
+            self._combined_rules = combinable
+            self._separate_rules = [
+                rule for rule in regex_rules if rule[1].flags != _DEFAULT_FLAGS
+            ]
+
+    def match(self, filename: str) -> Optional[ResizeRule]:
+        """Returns the first matching rule, or None if no rule matches."""
+        if filename in self._cache:
+            index = self._cache[filename]
+        else:
+            if len(self._cache) >= _CACHE_SIZE:
+                self._cache.clear()
+            index = self._cache[filename] = self._find(filename)
+        return None if index is None else self._rules[index]
+
+    def _find(self, filename: str) -> Optional[int]:
+        candidates = [
+            self._prefixes.get(filename[:length])
+            for length in self._prefix_lengths
+            if length <= len(filename)
+        ]
+        candidates += [
+            self._suffixes.get(filename[len(filename) - length :])
+            for length in self._suffix_lengths
+            if length <= len(filename)
+        ]
+        candidates.append(self._exact.get(filename))
+        candidates.append(self._match_regex(filename))
+        return min((c for c in candidates if c is not None), default=None)
+
+    def _match_regex(self, filename: str) -> Optional[int]:
+        candidates = []
+        if self._combined is not None:
+            match = self._combined.match(filename)
+            if match is not None:
+                candidates.append(self._combined_rules[match.lastindex - 1][0])
+        for index, compiled in self._separate_rules:
+            if compiled.match(filename):
+                candidates.append(index)
+                break
+        return min(candidates, default=None)
+
+    @staticmethod
+    def _combine(
+        regex_rules: List[Tuple[int, "re.Pattern[str]"]],
+    ) -> Optional["re.Pattern[str]"]:
+        """Joins group-free patterns into one first-match alternation.
+
+        Returns None when patterns cannot be combined safely (user groups or
+        backreferences would be renumbered), in which case patterns are tried
+        one by one. Patterns with inline global flags are never passed in.
+        """
+        if not regex_rules or any(compiled.groups for _, compiled in regex_rules):
+            return None
+        try:
+            return re.compile(
+                "|".join(f"({compiled.pattern})" for _, compiled in regex_rules)
+            )
+        except re.error:
+            return None
@@ -0,0 +1,156 @@
+import fnmatch
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _compile_globs(patterns: Iterable[str]) -> Tuple[Optional[re.Pattern], ...]:
+    """Compiles globs into one regex for names and one for relative paths.
+
+    A glob without a "/" is matched against a file or directory name, any
+    other glob against the path relative to the scanned directory.
+    """
+    names, paths = [], []
+    for pattern in patterns:
+        pattern = pattern.strip("/")
+        (paths if "/" in pattern else names).append(fnmatch.translate(pattern))
+    return tuple(
+        re.compile("|".join(group)) if group else None for group in (names, paths)
+    )
+
+
+class DirectoryScanner:
+    """Walks a directory tree with `os.scandir`, yielding accepted files as they are found.
+
+    Only files with one of ``suffixes`` are yielded, and with ``include``
+    only those matching an include glob. Files and directories matching an
+    ``exclude`` glob are skipped, as are the directories in ``prune`` (e.g. an
+    output directory inside the input directory), hidden entries with
+    ``skip_hidden`` and anything more than ``max_depth`` directories deep.
+    Symbolic links to directories are only followed with ``follow_symlinks``,
+    in which case directories that were already visited are skipped so that
+    link loops end.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        suffixes: Iterable[str],
+        include: Optional[List[str]] = None,
+        exclude: Optional[List[str]] = None,
+        max_depth: Optional[int] = None,
+        follow_symlinks: bool = False,
+        skip_hidden: bool = False,
+        prune: Iterable[Path] = (),
+    ):
+        self._root = root
+        self._suffixes = {suffix.lower() for suffix in suffixes}
+        self._include_names, self._include_paths = _compile_globs(include or [])
+        self._include = bool(include)
+        self._exclude_names, self._exclude_paths = _compile_globs(exclude or [])
+        self._max_depth = max_depth
+        self._follow_symlinks = follow_symlinks
+        self._skip_hidden = skip_hidden
+        self._prune = {Path(path).as_posix() for path in prune}
+
+    def __iter__(self) -> Iterator[Path]:
+        visited: Set[Tuple[int, int]] = set()
+        if self._follow_symlinks:
+            for directory in ["", *self._prune]:
+                identity = self._identity(self._root / directory)
+                if identity is not None:
+                    visited.add(identity)
+
+        # Depth-first, so files are yielded while the rest of the tree is
+        # still being listed.
+        stack = [("", 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                entries = os.scandir(self._root / directory)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            except OSError as e:
+                logger.warning(f"Cannot scan {self._root / directory}: {e}")
+                continue
+
+            with entries:
+                for entry in entries:
+                    name = entry.name
+                    if self._skip_hidden and name.startswith("."):
+                        continue
+                    path = f"{directory}/{name}" if directory else name
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+
+                    if not is_dir:
+                        if self._accepts_file(name, path):
+                            yield Path(entry.path)
+                        continue
+                    if (
+                        (self._max_depth is not None and depth >= self._max_depth)
+                        or not self._accepts_dir(name, path)
+                        or (entry.is_symlink() and not self._follow_symlinks)
+                    ):
+                        continue
+                    if self._follow_symlinks:
+                        identity = self._identity(entry.path)
+                        if identity is None or identity in visited:
+                            logger.debug(f"Skipped already scanned directory: {path}")
+                            continue
+                        visited.add(identity)
+                    stack.append((path, depth + 1))
+
+    def accepts(self, path: Path) -> bool:
+        """Whether a file, given relative to the root, is one a scan would yield."""
+        parts = path.parts
+        if not parts or (
+            self._max_depth is not None and len(parts) - 1 > self._max_depth
+        ):
+            return False
+        for i, name in enumerate(parts[:-1]):
+            if (self._skip_hidden and name.startswith(".")) or not self._accepts_dir(
+                name, "/".join(parts[: i + 1])
+            ):
+                return False
+        name = parts[-1]
+        return not (self._skip_hidden and name.startswith(".")) and self._accepts_file(
+            name, path.as_posix()
+        )
+
+    def _accepts_file(self, name: str, path: str) -> bool:
+        if os.path.splitext(name)[1].lower() not in self._suffixes:
+            return False
+        if self._include and not self._matches(
+            self._include_names, self._include_paths, name, path
+        ):
+            return False
+        return not self._matches(self._exclude_names, self._exclude_paths, name, path)
+
+    def _accepts_dir(self, name: str, path: str) -> bool:
+        return path not in self._prune and not self._matches(
+            self._exclude_names, self._exclude_paths, name, path
+        )
+
+    @staticmethod
+    def _matches(
+        names: Optional[re.Pattern], paths: Optional[re.Pattern], name: str, path: str
+    ) -> bool:
+        return bool(
+            (names is not None and names.match(name))
+            or (paths is not None and paths.match(path))
+        )
+
+    @staticmethod
+    def _identity(path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
@@ -0,0 +1,374 @@
+import asyncio
+import hashlib
+import logging
+import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import PIL
+
+from ._image_processor import ImageProcessor, _render_in_worker
+from ._models import ResizeMode
+from ._pipeline import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# Largest width or height a WebP image can have.
+_MAX_DIMENSION = 16383
+# Closes idle keep-alive connections after this many seconds.
+_IDLE_TIMEOUT = 60.0
+_MAX_HEADERS = 100
+# An entity tag in an If-None-Match list; quoted tags may contain commas.
+_ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: HTTPStatus, message: str = ""):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header lists an ETag, by the weak comparison it uses."""
+    return any(
+        tag == "*" or tag.removeprefix("W/") == etag
+        for tag in _ENTITY_TAG.findall(if_none_match)
+    )
+
+
+class LRUCache:
+    """In-memory cache of encoded outputs, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Stores an output, evicting the least recently used ones to make room."""
+        if len(data) > self._max_bytes:
+            return
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        self._entries[key] = data
+        self.size += len(data)
+        while self.size > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+
+class ImageServer:
+    """Serves sources from the input directory as WebP, converting on demand.
+
+    ``GET /<path>?w=256&h=256&mode=cover&q=75`` converts ``<path>`` with the
+    given size, resize mode and quality; parameters that are left out fall
+    back to the processor's rules. Outputs are cached in memory and, with
+    ``cache_dir``, on disk, keyed by the source's size, modification time and
+    the effective settings, which also form the ETag. Concurrent requests for
+    the same output share a single conversion, which runs on the processor's
+    worker pool.
+    """
+
+    def __init__(
+        self,
+        processor: ImageProcessor,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        cache_size: int = 64 * 1024 * 1024,
+        cache_dir: Optional[str] = None,
+    ):
+        self._processor = processor
+        self._input_dir = processor._input_dir.resolve()
+        self._scanner = processor._create_scanner()
+        self.host = host
+        self.port = port
+        self._cache = LRUCache(cache_size)
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._executor = None
+        self._render = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Conversions started, for logging and tests.
+        self.conversions = 0
+
+    async def start(self):
+        """Binds the listening socket; with port 0 the chosen port is stored in `port`."""
+        self._executor = self._processor._create_executor()
+        self._render = (
+            _render_in_worker
+            if isinstance(self._executor, ProcessPoolExecutor)
+            else self._processor.render
+        )
+        if self._cache_dir is not None:
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Serving {self._input_dir} on http://{self.host}:{self.port}/")
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._inflight.values()):
+            task.cancel()
+        await asyncio.gather(*self._inflight.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def run(self):
+        """Serves until interrupted."""
+
+        async def serve():
+            await self.start()
+            try:
+                await self._server.serve_forever()
+            finally:
+                await self.close()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            logger.info("Server stopped.")
+
+    async def _handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), _IDLE_TIMEOUT)
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = await self._read_headers(reader)
+                if "content-length" in headers:
+                    await reader.readexactly(int(headers["content-length"]))
+                keep_alive = (
+                    headers.get("connection", "").lower() != "close"
+                    if version == "HTTP/1.1"
+                    else headers.get("connection", "").lower() == "keep-alive"
+                )
+                status, response_headers, body = await self._respond(
+                    method, target, headers
+                )
+                self._write_response(
+                    writer, status, response_headers, body, method, keep_alive
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (
+            asyncio.TimeoutError,
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            ValueError,
+        ):
+            # Idle, disconnected or malformed; the connection is dropped.
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_headers(reader: asyncio.StreamReader) -> Dict[str, str]:
+        headers = {}
+        for _ in range(_MAX_HEADERS):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise ValueError("Too many headers")
+
+    @staticmethod
+    def _write_response(
+        writer: asyncio.StreamWriter,
+        status: HTTPStatus,
+        headers: Dict[str, str],
+        body: bytes,
+        method: str,
+        keep_alive: bool,
+    ):
+        headers = {**headers, "Connection": "keep-alive" if keep_alive else "close"}
+        if status != HTTPStatus.NOT_MODIFIED:
+            headers["Content-Length"] = str(len(body))
+        head = f"HTTP/1.1 {status.value} {status.phrase}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()
+        )
+        writer.write(head.encode("latin-1") + b"\r\n")
+        if method != "HEAD" and status != HTTPStatus.NOT_MODIFIED:
+            writer.write(body)
+
+    async def _respond(
+        self, method: str, target: str, headers: Dict[str, str]
+    ) -> Tuple[HTTPStatus, Dict[str, str], bytes]:
+        try:
+            if method not in ("GET", "HEAD"):
+                raise _BadRequest(HTTPStatus.METHOD_NOT_ALLOWED)
+            img_path, size, resize_mode, quality = self._parse_target(target)
+            try:
+                src_stat = img_path.stat()
+            except (FileNotFoundError, NotADirectoryError):
+                raise _BadRequest(HTTPStatus.NOT_FOUND)
+
+            source = img_path.relative_to(self._input_dir).as_posix()
+            settings = self._processor.render_key(
+                img_path.name, size, resize_mode, quality
+            )
+            key = hashlib.sha1(
+                repr(
+                    (source, src_stat.st_size, src_stat.st_mtime_ns, settings)
+                ).encode()
+            ).hexdigest()
+            response_headers = {"ETag": f'"{key}"', "Cache-Control": "no-cache"}
+            if _etag_matches(
+                headers.get("if-none-match", ""), response_headers["ETag"]
+            ):
+                return HTTPStatus.NOT_MODIFIED, response_headers, b""
+
+            data, cache = await self._get_output(
+                key, img_path, size, resize_mode, quality
+            )
+            response_headers.update({"Content-Type": "image/webp", "X-Cache": cache})
+            return HTTPStatus.OK, response_headers, data
+        except _BadRequest as e:
+            return e.status, {"Content-Type": "text/plain"}, f"{e}\n".encode()
+        except Exception:
+            logger.exception(f"Failed to serve {target}")
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            return status, {"Content-Type": "text/plain"}, f"{status.phrase}\n".encode()
+
+    def _parse_target(
+        self, target: str
+    ) -> Tuple[Path, Optional[Tuple[int, int]], Optional[ResizeMode], Optional[int]]:
+        """Maps a request target onto a source path and conversion overrides."""
+        url = urlsplit(target)
+        img_path = (self._input_dir / unquote(url.path).lstrip("/")).resolve()
+        # Only sources a conversion run would pick up are served.
+        if self._input_dir not in img_path.parents or not self._scanner.accepts(
+            img_path.relative_to(self._input_dir)
+        ):
+            raise _BadRequest(HTTPStatus.NOT_FOUND)
+
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            width = int(query["w"]) if "w" in query else None
+            height = int(query["h"]) if "h" in query else None
+            resize_mode = ResizeMode(query["mode"]) if "mode" in query else None
+            quality = int(query["q"]) if "q" in query else None
+        except ValueError as e:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, str(e))
+        if any(
+            value is not None and not 0 < value <= _MAX_DIMENSION
+            for value in (width, height)
+        ):
+            raise _BadRequest(
+                HTTPStatus.BAD_REQUEST, f"w and h must be 1-{_MAX_DIMENSION}"
+            )
+        if quality is not None and not 0 <= quality <= 100:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST, "q must be 0-100")
+
+        size = None
+        if width or height:
+            if not (width and height) and resize_mode not in (None, ResizeMode.CONTAIN):
+                raise _BadRequest(
+                    HTTPStatus.BAD_REQUEST, f"{resize_mode} needs both w and h"
+                )
+            # A single dimension bounds only that side.
+            size = (width or _MAX_DIMENSION, height or _MAX_DIMENSION)
+            resize_mode = resize_mode or ResizeMode.CONTAIN
+        return img_path, size, resize_mode, quality
+
+    async def _get_output(
+        self,
+        key: str,
+        img_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: Optional[ResizeMode],
+        quality: Optional[int],
+    ) -> Tuple[bytes, str]:
+        """Returns the encoded output and where it came from: memory, disk or a conversion.
+
+        The output is produced by a task of its own, which every request for
+        it awaits through `asyncio.shield`, so a client that disconnects does
+        not cancel the conversion for the others.
+        """
+        data = self._cache.get(key)
+        if data is not None:
+            return data, "memory"
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._produce_output(key, img_path, size, resize_mode, quality)
+            )
+
+            def done(task: asyncio.Task):
+                del self._inflight[key]
+                # Marked as retrieved so a failure nobody waited on is not logged.
+                if not task.cancelled():
+                    task.exception()
+
+            task.add_done_callback(done)
+        return await asyncio.shield(task)
+
+    async def _produce_output(
+        self,
+        key: str,
+        img_path: Path,
+        size: Optional[Tuple[int, int]],
+        resize_mode: Optional[ResizeMode],
+        quality: Optional[int],
+    ) -> Tuple[bytes, str]:
+        """Reads an output from the disk cache or converts it, caching it in memory."""
+        loop = asyncio.get_running_loop()
+        data = cache = None
+        if self._cache_dir is not None:
+            data = await loop.run_in_executor(None, self._read_disk, key)
+            cache = "disk"
+        if data is None:
+            self.conversions += 1
+            try:
+                data = await loop.run_in_executor(
+                    self._executor,
+                    self._render,
+                    img_path,
+                    size,
+                    resize_mode,
+                    quality,
+                )
+            except PIL.UnidentifiedImageError as e:
+                raise _BadRequest(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, str(e))
+            cache = "miss"
+            if self._cache_dir is not None:
+                await loop.run_in_executor(None, self._write_disk, key, data)
+        self._cache.put(key, data)
+        return data, cache
+
+    def _disk_path(self, key: str) -> Path:
+        return self._cache_dir / key[:2] / f"{key}.webp"
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        try:
+            return self._disk_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        """Writes a cached output atomically, so readers never see a partial file."""
+        path = self._disk_path(key)
+        path.parent.mkdir(exist_ok=True)
+        write_atomic(path, data)
@@ -0,0 +1,88 @@
+import hashlib
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, List
+
+if TYPE_CHECKING:
+    from ._metrics import RunReport
+
+_SHARD_PATTERN = re.compile(r"(\d+)/(\d+)")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Shard:
+    """One of `count` disjoint parts of a run, numbered from 1."""
+
+    index: int
+    count: int
+
+    def __post_init__(self):
+        if not 1 <= self.index <= self.count:
+            raise ValueError(f"Shard index must be between 1 and {self.count}: {self}")
+
+    @classmethod
+    def parse(cls, text: str) -> "Shard":
+        """Parses ``INDEX/COUNT``, e.g. ``2/4``."""
+        match = _SHARD_PATTERN.fullmatch(text.strip())
+        if match is None:
+            raise ValueError(f"Shard must be INDEX/COUNT, e.g. 2/4: {text!r}")
+        return cls(int(match[1]), int(match[2]))
+
+    def __str__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+    def contains(self, key: str) -> bool:
+        """Whether a key belongs to this shard, by a hash that is stable across machines."""
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") % self.count == self.index - 1
+
+    def path(self, path: Path) -> Path:
+        """Returns this shard's variant of a file path, e.g. ``report.shard-2-of-4.json``."""
+        return path.with_name(
+            f"{path.stem}.shard-{self.index}-of-{self.count}{path.suffix}"
+        )
+
+
+def find_shard_reports(report_path: Path) -> List[Path]:
+    """Returns the shard reports written for a report path, checking that none is missing."""
+    pattern = re.compile(
+        rf"{re.escape(report_path.stem)}\.shard-(\d+)-of-(\d+)"
+        rf"{re.escape(report_path.suffix)}"
+    )
+    shards = {}
+    for path in report_path.parent.iterdir():
+        match = pattern.fullmatch(path.name)
+        if match is not None:
+            shards[Shard(int(match[1]), int(match[2]))] = path
+
+    counts = {shard.count for shard in shards}
+    if not shards:
+        raise FileNotFoundError(f"No shard reports found for {report_path}")
+    if len(counts) > 1:
+        raise ValueError(f"Shard reports for {report_path} mix shard counts: {counts}")
+    count = counts.pop()
+    missing = [
+        str(Shard(index, count))
+        for index in range(1, count + 1)
+        if Shard(index, count) not in shards
+    ]
+    if missing:
+        raise ValueError(f"Missing shard reports for {report_path}: {missing}")
+    return [shards[Shard(index, count)] for index in range(1, count + 1)]
+
+
+def merge_shard_reports(report_path: Path) -> "RunReport":
+    """Combines the reports of every shard into one report written to `report_path`."""
+    # Not needed to parse --shard, which the command line does on every run.
+    from ._metrics import RunReport
+
+    merged = RunReport()
+    for path in find_shard_reports(report_path):
+        merged.merge(RunReport.load(path))
+    merged.write(str(report_path))
+    logger.info(f"Merged {len(merged.images)} images into {report_path}")
+    return merged
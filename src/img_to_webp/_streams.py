@@ -0,0 +1,47 @@
+import io
+from typing import BinaryIO, Union
+
+BufferLike = Union[bytes, bytearray, memoryview]
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over an in-memory buffer.
+
+    Unlike `io.BytesIO`, wrapping a `bytearray` or `memoryview` does not copy it.
+    """
+
+    def __init__(self, data: BufferLike):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        chunk = self._view[self._position : self._position + len(buffer)]
+        buffer[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+def open_buffer(data: BufferLike) -> BinaryIO:
+    """Returns a file object reading from an in-memory buffer without copying it."""
+    if isinstance(data, bytes):
+        # BytesIO shares an immutable bytes object's memory until written to.
+        return io.BytesIO(data)
+    return BufferReader(data)
@@ -0,0 +1,127 @@
+import math
+from typing import Callable
+
+from PIL import Image
+
+from ._resize_strategy import ResizeTarget
+
+# Source rows per strip are chosen so that each strip holds about this many
+# pixels.
+_STRIP_PIXELS = 4_000_000
+
+# Filter radius in source pixels at a scale of one; it grows with the
+# downscaling factor.
+_FILTER_SUPPORT = {
+    Image.Resampling.NEAREST: 0.0,
+    Image.Resampling.BOX: 0.5,
+    Image.Resampling.BILINEAR: 1.0,
+    Image.Resampling.HAMMING: 1.0,
+    Image.Resampling.BICUBIC: 2.0,
+    Image.Resampling.LANCZOS: 3.0,
+}
+
+# Modes that `Image.resize` resamples premultiplied, without a reducing gap.
+_PREMULTIPLIED_MODES = {"LA": "La", "RGBA": "RGBa"}
+
+
+def resize_in_strips(
+    img: Image.Image,
+    target: ResizeTarget,
+    convert: Callable[[Image.Image], Image.Image],
+) -> Image.Image:
+    """Converts and resizes a large image one horizontal strip at a time.
+
+    Only the decoded source is held at full size. Each strip is converted
+    with ``convert``, box-reduced if the target has a reducing gap and
+    resampled horizontally to the output width; the stacked strips are then
+    resampled vertically in one pass.
+
+    This is how `Image.resize` works as well: each axis is reduced by its
+    own factor, in blocks starting at the corner of the region the filter
+    reads, and the horizontal pass is kept at 8 bits per channel before the
+    vertical one. Both passes use the whole image's box, so the result is
+    the same as resizing the whole converted image.
+    """
+    left, top, right, bottom = target.box
+    width, height = target.size
+    resampled = (right - left, bottom - top) != target.size or any(
+        value != int(value) for value in target.box
+    )
+    if not resampled:
+        rows = max(_STRIP_PIXELS // width, 1)
+        result = None
+        for row in range(0, height, rows):
+            end = min(row + rows, height)
+            strip = convert(
+                img.crop((int(left), int(top) + row, int(right), int(top) + end))
+            )
+            if result is None:
+                result = Image.new(strip.mode, target.size)
+            result.paste(strip, (0, row))
+        return result
+
+    mode = convert(img.crop((0, 0, 1, 1))).mode
+    premultiplied = None
+    if target.resample != Image.Resampling.NEAREST:
+        premultiplied = _PREMULTIPLIED_MODES.get(mode)
+    factor_x = factor_y = 1
+    if (
+        target.reducing_gap is not None
+        and target.resample != Image.Resampling.NEAREST
+        and premultiplied is None
+    ):
+        factor_x = int((right - left) / width / target.reducing_gap) or 1
+        factor_y = int((bottom - top) / height / target.reducing_gap) or 1
+
+    # The region `Image.resize` reduces, and the box within it once reduced.
+    support = _FILTER_SUPPORT[target.resample]
+    if factor_x > 1 or factor_y > 1:
+        scale_x = (right - left) / width
+        scale_y = (bottom - top) / height
+        origin_x = max(int(left - (support - 0.5) * scale_x), 0)
+        origin_y = max(int(top - (support - 0.5) * scale_y), 0)
+        end_x = min(math.ceil(right + (support - 0.5) * scale_x), img.width)
+        end_y = min(math.ceil(bottom + (support - 0.5) * scale_y), img.height)
+        left = (left - origin_x) / factor_x
+        top = (top - origin_y) / factor_y
+        right = (right - origin_x) / factor_x
+        bottom = (bottom - origin_y) / factor_y
+    else:
+        origin_x, origin_y, end_x, end_y = 0, 0, img.width, img.height
+    reduced_height = math.ceil((end_y - origin_y) / factor_y)
+
+    # Reduced rows the vertical pass reads, with a row to spare.
+    reach = math.ceil(support * max((bottom - top) / height, 1)) + 1
+    first_row = max(math.floor(top) - reach, 0)
+    last_row = min(math.ceil(bottom) + reach, reduced_height)
+    rows = max(_STRIP_PIXELS // (end_x - origin_x) // factor_y, 1)
+
+    # Rows outside the vertical pass's reach are left blank.
+    columns = None
+    for row in range(first_row, last_row, rows):
+        end = min(row + rows, last_row)
+        strip = convert(
+            img.crop(
+                (
+                    origin_x,
+                    origin_y + row * factor_y,
+                    end_x,
+                    min(origin_y + end * factor_y, end_y),
+                )
+            )
+        )
+        if factor_x > 1 or factor_y > 1:
+            strip = strip.reduce((factor_x, factor_y))
+        if premultiplied is not None:
+            strip = strip.convert(premultiplied)
+        strip = strip.resize(
+            (width, strip.height), target.resample, box=(left, 0, right, strip.height)
+        )
+        if columns is None:
+            columns = Image.new(strip.mode, (width, reduced_height))
+        columns.paste(strip, (0, row))
+
+    result = columns.resize(target.size, target.resample, box=(0, top, width, bottom))
+    if premultiplied is not None:
+        result = result.convert(mode)
+    return result
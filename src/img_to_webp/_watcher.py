@@ -0,0 +1,403 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# inotify(7) event masks.
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+# Modifications are not watched: a file counts as changed once it is closed,
+# and the settle check below catches writers that keep it open.
+_WATCH_MASK = (
+    _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+# Longest wait before checking whether the watcher should stop (seconds).
+_WAKEUP_INTERVAL = 0.5
+
+# Size and modification time (ns) of a file.
+FileKey = Tuple[int, int]
+
+
+class ChangeType(Enum):
+    MODIFIED = "modified"
+    DELETED = "deleted"
+    MOVED = "moved"
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass(frozen=True)
+class FileChange:
+    """A settled change to a file, with paths relative to the watched directory."""
+
+    type: ChangeType
+    path: Path
+    old_path: Optional[Path] = None
+
+
+@dataclass
+class _Pending:
+    key: FileKey
+    changed_at: float
+    old_path: Optional[Path] = None
+
+
+class _Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self, libc: ctypes.CDLL):
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    @staticmethod
+    def load_libc() -> Optional[ctypes.CDLL]:
+        """Returns libc if it provides inotify, otherwise None."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        except OSError:
+            return None
+        return libc if hasattr(libc, "inotify_init1") else None
+
+    def add_watch(self, path: Path) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), str(path))
+        return wd
+
+    def remove_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        """Returns the (wd, mask, cookie, name) events available within `timeout` seconds."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        events = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                events.append((wd, mask, cookie, name))
+
+    def close(self):
+        os.close(self._fd)
+
+
+class DirectoryWatcher:
+    """Watches a directory tree and queues settled changes to accepted files.
+
+    Changes are detected with inotify on Linux and by polling sizes and
+    modification times elsewhere (or with ``polling``, e.g. for network shares
+    whose remote writes inotify does not see). A file is reported once its size
+    and modification time have not changed for ``debounce`` seconds, so files
+    that are still being written are not picked up half-way. Renames are
+    reported as moves when the moved file is unchanged.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        accept: Callable[[Path], bool],
+        debounce: float = 1.0,
+        poll_interval: float = 1.0,
+        polling: bool = False,
+    ):
+        self._root = root
+        self._accept = accept
+        self._debounce = debounce
+        self._poll_interval = poll_interval
+        self._polling = polling
+        self._inotify: Optional[_Inotify] = None
+        self._watches: Dict[int, Path] = {}
+        # Files as last reported, and changed files waiting to settle.
+        self._snapshot: Dict[Path, FileKey] = {}
+        self._pending: Dict[Path, _Pending] = {}
+        self._changes: Optional[queue.Queue] = None
+        self._stop: Optional[threading.Event] = None
+        self.error: Optional[Exception] = None
+
+    @property
+    def backend(self) -> str:
+        return "polling" if self._inotify is None else "inotify"
+
+    def start(self):
+        """Starts watching and records the current files without reporting them."""
+        libc = None if self._polling else _Inotify.load_libc()
+        if libc is not None:
+            try:
+                self._inotify = _Inotify(libc)
+                self._add_watches(Path("."))
+            except OSError as e:
+                logger.warning(f"Cannot use inotify, polling instead: {e}")
+                self._close_inotify()
+        self._snapshot = self._scan(Path("."))
+
+    def run(self, changes: queue.Queue, stop: threading.Event):
+        """Queues changes until `stop` is set, blocking while the queue is full.
+
+        Errors are stored in `error` and stop the watch.
+        """
+        self._changes = changes
+        self._stop = stop
+        next_scan = time.monotonic() + self._poll_interval
+        try:
+            while not stop.is_set():
+                if self._inotify is None:
+                    stop.wait(min(self._poll_interval, _WAKEUP_INTERVAL))
+                    if time.monotonic() >= next_scan:
+                        self._rescan(Path("."))
+                        next_scan = time.monotonic() + self._poll_interval
+                else:
+                    try:
+                        self._read_events(self._next_timeout())
+                    except OSError as e:
+                        # E.g. the inotify watch limit was reached.
+                        logger.warning(f"Cannot use inotify, polling instead: {e}")
+                        self._close_inotify()
+                        self._rescan(Path("."))
+                self._settle(time.monotonic())
+        except Exception as e:
+            logger.exception("Watcher failed")
+            self.error = e
+        finally:
+            stop.set()
+
+    def close(self):
+        self._close_inotify()
+
+    def _next_timeout(self) -> float:
+        """Seconds until the next pending file may have settled."""
+        if not self._pending:
+            return _WAKEUP_INTERVAL
+        earliest = min(entry.changed_at for entry in self._pending.values())
+        remaining = earliest + self._debounce - time.monotonic()
+        return min(max(remaining, 0.0), _WAKEUP_INTERVAL)
+
+    def _read_events(self, timeout: float):
+        moved_from: Dict[int, Path] = {}
+        directories = set()
+        for wd, mask, cookie, name in self._inotify.read(timeout):
+            if mask & _IN_Q_OVERFLOW:
+                logger.warning("Watch event queue overflowed, rescanning.")
+                self._rescan(Path("."))
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            path = directory / name
+
+            if mask & _IN_ISDIR:
+                if mask & _IN_MOVED_FROM:
+                    self._remove_watches(path)
+                else:
+                    self._add_watches(path)
+                directories.add(path)
+            elif mask & _IN_MOVED_FROM:
+                moved_from[cookie] = path
+            elif mask & _IN_MOVED_TO:
+                old_path = moved_from.pop(cookie, None)
+                if self._accept(path):
+                    self._touch(path, old_path)
+                elif old_path is not None:
+                    self._deleted(old_path)
+            elif mask & _IN_DELETE:
+                self._deleted(path)
+            elif self._accept(path):
+                self._touch(path)
+
+        # Files moved out of the watched tree.
+        for path in moved_from.values():
+            self._deleted(path)
+        # A directory moved within the tree is rescanned as a whole so its
+        # files are matched as moves.
+        if len(directories) > 1:
+            self._rescan(Path("."))
+        elif directories:
+            self._rescan(directories.pop())
+
+    def _add_watches(self, directory: Path):
+        """Watches a directory and every directory below it."""
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                wd = self._inotify.add_watch(self._root / current)
+                self._watches[wd] = current
+                with os.scandir(self._root / current) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(current / entry.name)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+
+    def _remove_watches(self, directory: Path):
+        for wd, path in list(self._watches.items()):
+            if path == directory or directory in path.parents:
+                self._inotify.remove_watch(wd)
+                del self._watches[wd]
+
+    def _scan(self, directory: Path) -> Dict[Path, FileKey]:
+        """Returns the size and modification time of every accepted file."""
+        files = {}
+        stack = [directory]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(self._root / current) as entries:
+                    for entry in entries:
+                        path = current / entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(path)
+                            elif self._accept(path) and entry.is_file():
+                                stat = entry.stat()
+                                files[path] = (stat.st_size, stat.st_mtime_ns)
+                        except FileNotFoundError:
+                            continue
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+        return files
+
+    def _rescan(self, directory: Path):
+        """Compares a subtree with the snapshot, matching deleted and new files as moves."""
+        current = self._scan(directory)
+        previous = {
+            path: key
+            for path, key in self._snapshot.items()
+            if path == directory or directory in path.parents
+        }
+        # Unchanged size and mtime identify a moved file, unless ambiguous.
+        removed: Dict[FileKey, Optional[Path]] = {}
+        for path, key in previous.items():
+            if path not in current:
+                removed[key] = None if key in removed else path
+
+        moved = set()
+        for path, key in current.items():
+            if previous.get(path) == key:
+                continue
+            old_path = removed.get(key) if path not in previous else None
+            if old_path is not None:
+                moved.add(old_path)
+            self._touch(path, old_path)
+        for path in previous:
+            if path not in current and path not in moved:
+                self._deleted(path)
+
+    def _touch(self, path: Path, old_path: Optional[Path] = None):
+        """Starts or restarts the settle timer of a changed file."""
+        key = self._stat(path)
+        if key is None:
+            return
+        if old_path is not None and old_path not in self._snapshot:
+            # Renamed before it was ever reported.
+            self._pending.pop(old_path, None)
+            old_path = None
+
+        entry = self._pending.get(path)
+        if entry is None:
+            if old_path is None and self._snapshot.get(path) == key:
+                return
+            self._pending[path] = _Pending(key, time.monotonic(), old_path)
+        elif entry.key != key or (old_path and entry.old_path != old_path):
+            self._pending[path] = _Pending(
+                key, time.monotonic(), old_path or entry.old_path
+            )
+
+    def _deleted(self, path: Path):
+        self._pending.pop(path, None)
+        if self._snapshot.pop(path, None) is not None:
+            self._emit(FileChange(ChangeType.DELETED, path))
+
+    def _settle(self, now: float):
+        """Reports pending files whose size and mtime stayed the same for the debounce time."""
+        for path, entry in list(self._pending.items()):
+            if now - entry.changed_at < self._debounce:
+                continue
+            key = self._stat(path)
+            if key is None:
+                del self._pending[path]
+                if entry.old_path is not None:
+                    self._deleted(entry.old_path)
+                continue
+            if key != entry.key:
+                entry.key, entry.changed_at = key, now
+                continue
+
+            del self._pending[path]
+            self._snapshot[path] = key
+            if (
+                entry.old_path is not None
+                and self._snapshot.pop(entry.old_path, None) is not None
+            ):
+                self._emit(FileChange(ChangeType.MOVED, path, entry.old_path))
+            else:
+                self._emit(FileChange(ChangeType.MODIFIED, path))
+
+    def _emit(self, change: FileChange):
+        """Queues a change, waiting for room so the queue stays bounded."""
+        logger.debug(f"Detected {change.type}: {change.path}")
+        while not self._stop.is_set():
+            try:
+                self._changes.put(change, timeout=_WAKEUP_INTERVAL)
+                return
+            except queue.Full:
+                continue
+
+    def _stat(self, path: Path) -> Optional[FileKey]:
+        try:
+            stat = (self._root / path).stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def _close_inotify(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+            self._watches.clear()
@@ -0,0 +1,186 @@
+import contextlib
+import json
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from parameterized import parameterized
+from PIL import Image, ImageSequence
+
+from src.img_to_webp import ImageProcessor, Variant
+from src.img_to_webp import _animation
+from src.img_to_webp._animation import AnimationWriter, get_loop
+from src.img_to_webp._exceptions import AnimationTooLargeError
+from src.img_to_webp._models import EncodeSettings
+from .base_test import BaseTest
+
+SETTINGS = EncodeSettings(quality=80, method=4, alpha_quality=100)
+
+COLORS = ["red", "green", "blue"]
+DURATIONS = [40, 100, 60]
+
+
+def _frames(size=(300, 200), colors=COLORS):
+    return [Image.new("RGB", size, color) for color in colors]
+
+
+class TestAnimation(BaseTest):
+    def _processor(self, **kwargs) -> ImageProcessor:
+        return ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(150, 150),
+            **kwargs,
+        )
+
+    @staticmethod
+    def _encoder(streamed: bool):
+        """Keeps Pillow's animation encoder, or hides it to test the fallback."""
+        if streamed:
+            return contextlib.nullcontext()
+        return patch("src.img_to_webp._animation._ANIM_ENCODER", None)
+
+    def _save_gif(self, name="anim.gif", **kwargs):
+        img_path = self._input_dir / name
+        first, *rest = _frames()
+        first.save(
+            img_path,
+            save_all=True,
+            append_images=rest,
+            duration=DURATIONS,
+            disposal=1,
+            **kwargs,
+        )
+        return img_path
+
+    @parameterized.expand([("streamed", True), ("save_all", False)])
+    def test_gif_to_animated_webp(self, _, streamed):
+        img_path = self._save_gif(loop=3)
+        with self.assertLogs() as cm, self._encoder(streamed):
+            output_path = self._processor(lossless=True).process_image(img_path)
+        self.assertIn("(animated: 3 of 3 frames kept)", "\n".join(cm.output))
+
+        with Image.open(output_path) as output:
+            self.assertTrue(output.is_animated)
+            self.assertEqual(output.n_frames, 3)
+            self.assertEqual(output.size, (150, 100))
+            self.assertEqual(output.info["loop"], 3)
+            frames = [
+                (frame.convert("RGB").getpixel((0, 0)), frame.info["duration"])
+                for frame in ImageSequence.Iterator(output)
+            ]
+        self.assertEqual(
+            frames, [((255, 0, 0), 40), ((0, 128, 0), 100), ((0, 0, 255), 60)]
+        )
+
+    def test_loop_defaults(self):
+        img_path = self._save_gif()
+        with Image.open(img_path) as img:
+            self.assertEqual(get_loop(img), 1)
+        with Image.open(self._save_gif("forever.gif", loop=0)) as img:
+            self.assertEqual(get_loop(img), 0)
+
+    @parameterized.expand([("streamed", True), ("save_all", False)])
+    def test_repeated_frames_merged(self, _, streamed):
+        writer = AnimationWriter(SETTINGS, loop=0)
+        colors = ["red", "red", "green", "blue", "blue", "blue"]
+        with self._encoder(streamed):
+            for frame, duration in zip(
+                _frames(colors=colors), [40, 60, 100, 30, 30, None]
+            ):
+                writer.add(frame, duration)
+            self.assertEqual((writer.frames, writer.unique_frames), (6, 3))
+            buffer = writer.finish()
+
+        buffer.seek(0)
+        with Image.open(buffer) as output:
+            durations = []
+            for frame in ImageSequence.Iterator(output):
+                # WebP frames report their duration once loaded.
+                frame.load()
+                durations.append(frame.info["duration"])
+        # A missing delay counts as 100 ms.
+        self.assertEqual(durations, [100, 100, 160])
+
+    def test_encoder_probe(self):
+        self.assertIsNotNone(_animation._probe_encoder())
+
+        class ChangedEncoder:
+            def __init__(self, *args):
+                pass
+
+            def add(self, im, timestamp, lossless, quality, alpha_quality):
+                pass
+
+        for webp in [
+            SimpleNamespace(WebPAnimEncoder=ChangedEncoder),
+            SimpleNamespace(),
+        ]:
+            with self.subTest(webp=webp), patch.object(_animation, "_webp", webp):
+                self.assertIsNone(_animation._probe_encoder())
+
+    def test_save_all_frames_bounded(self):
+        self._save_gif()
+        frames = _frames(size=(100, 50))
+        with self._encoder(streamed=False):
+            with patch("src.img_to_webp._animation._MAX_PENDING_PIXELS", 100 * 50 * 2):
+                writer = AnimationWriter(SETTINGS, loop=0)
+                writer.add(frames[0], 40)
+                writer.add(frames[1], 40)
+                with self.assertRaises(AnimationTooLargeError):
+                    writer.add(frames[2], 40)
+
+                with self.assertLogs() as cm:
+                    self._processor().process_all_images()
+        self.assertIn("Skipping anim.gif: Animation exceeds", "\n".join(cm.output))
+        self.assertFalse((self._output_dir / "anim.webp").exists())
+        self.assertTrue((self._output_dir / "test_image_100x200_png.webp").exists())
+
+    def test_animated_variants(self):
+        img_path = self._save_gif()
+        variants = [
+            Variant((100, 100), suffix="_100"),
+            Variant((60, 60), "cover", suffix="_60"),
+        ]
+        index_path = self._processor(variants=variants).process_image(img_path)
+
+        with open(index_path) as file:
+            index = json.load(file)
+        self.assertEqual((index["width"], index["height"]), (300, 200))
+        for entry, size in zip(index["variants"], [(100, 67), (60, 60)]):
+            self.assertEqual((entry["width"], entry["height"]), size)
+            with Image.open(self._output_dir / entry["path"]) as output:
+                self.assertEqual(output.size, size)
+                self.assertEqual(output.n_frames, 3)
+
+    def test_transparent_frames(self):
+        img_path = self._input_dir / "anim.png"
+        first, *rest = [
+            Image.new("RGBA", (100, 100), color) for color in [(255, 0, 0, 0), "blue"]
+        ]
+        first.save(img_path, save_all=True, append_images=rest, duration=50)
+        output_path = self._processor().process_image(img_path)
+        with Image.open(output_path) as output:
+            self.assertEqual(output.n_frames, 2)
+            self.assertEqual(output.convert("RGBA").getpixel((0, 0))[3], 0)
+
+    def test_tiff_pages(self):
+        img_path = self._input_dir / "scan.tiff"
+        first, *rest = _frames(colors=["red", "green", "blue"])
+        first.save(img_path, save_all=True, append_images=rest)
+
+        self._processor().process_all_images()
+        self.assertFalse((self._output_dir / "scan_page2.webp").exists())
+        with Image.open(self._output_dir / "scan.webp") as output:
+            self.assertFalse(getattr(output, "is_animated", False))
+
+        self._processor(
+            all_pages=True, lossless=True, overwrite=True
+        ).process_all_images()
+        for name, color in [
+            ("scan.webp", (255, 0, 0)),
+            ("scan_page2.webp", (0, 128, 0)),
+            ("scan_page3.webp", (0, 0, 255)),
+        ]:
+            with Image.open(self._output_dir / name) as output:
+                self.assertEqual(output.size, (150, 100))
+                self.assertEqual(output.getpixel((75, 50)), color)
@@ -0,0 +1,164 @@
+import io
+import json
+import tarfile
+import zipfile
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import ExecutorType, ImageProcessor, ResizeRule, Variant
+from src.img_to_webp._archive import iter_members
+from .base_test import BaseTest
+
+
+def _png(size, color="red") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+MEMBERS = {
+    "a.png": _png((120, 80)),
+    "photos/b.png": _png((80, 120), "blue"),
+    "notes.txt": b"not an image",
+}
+
+
+class TestArchive(BaseTest):
+    def _make_zip(self, members=MEMBERS):
+        path = self._input_dir / "photos.zip"
+        with zipfile.ZipFile(path, "w") as archive:
+            for name, data in members.items():
+                archive.writestr(name, data)
+        return path
+
+    def _make_tar(self, members=MEMBERS):
+        path = self._input_dir / "photos.tar.gz"
+        with tarfile.open(path, "w:gz") as archive:
+            for name, data in members.items():
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        return path
+
+    def _read_outputs(self, path) -> dict:
+        outputs = {}
+        for member in iter_members(path):
+            with member.open() as file:
+                outputs[member.name] = file.read()
+        return outputs
+
+    def _sizes(self, outputs: dict) -> dict:
+        sizes = {}
+        for name, data in outputs.items():
+            if name.endswith(".webp"):
+                with Image.open(io.BytesIO(data)) as img:
+                    sizes[name] = img.size
+        return sizes
+
+    @parameterized.expand(
+        [
+            ("zip_to_zip", "_make_zip", "out.zip"),
+            ("tar_to_tar", "_make_tar", "out.tar.gz"),
+            ("zip_to_tar", "_make_zip", "out.tar"),
+        ]
+    )
+    def test_archive_to_archive(self, _, make, output_name):
+        source = getattr(self, make)()
+        output = self._output_dir / output_name
+        ImageProcessor(
+            input_dir=str(source),
+            output_dir=str(output),
+            default_size=(60, 60),
+            resize_rules=[ResizeRule(r"b\.png", (30, 30))],
+        ).process_all_images()
+
+        outputs = self._read_outputs(output)
+        self.assertEqual(
+            self._sizes(outputs), {"a.webp": (60, 40), "photos/b.webp": (20, 30)}
+        )
+        self.assertEqual(
+            [path.name for path in self._output_dir.iterdir()], [output_name]
+        )
+
+    def test_archive_to_directory(self):
+        source = self._make_tar()
+        ImageProcessor(
+            input_dir=str(source),
+            output_dir=str(self._output_dir),
+            default_size=(60, 60),
+            variants=[Variant(size=(30, 30))],
+        ).process_all_images()
+
+        with open(self._output_dir / "photos" / "b.variants.json") as file:
+            index = json.load(file)
+        self.assertEqual(index["source"], "photos/b.png")
+        self.assertTrue((self._output_dir / "photos" / "b_30x30.webp").exists())
+
+    def test_directory_to_archive(self):
+        output = self._output_dir / "out.zip"
+        ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(output),
+            default_size=(60, 60),
+            jobs=2,
+            executor=ExecutorType.THREAD,
+        ).process_all_images()
+
+        names = set(self._read_outputs(output))
+        self.assertEqual(
+            names,
+            {path.with_suffix(".webp").name for path in self._input_dir.iterdir()},
+        )
+
+    def test_parallel(self):
+        source = self._make_zip()
+        output = self._output_dir / "out.zip"
+        ImageProcessor(
+            input_dir=str(source),
+            output_dir=str(output),
+            default_size=(60, 60),
+            jobs=2,
+        ).process_all_images()
+        self.assertEqual(set(self._read_outputs(output)), {"a.webp", "photos/b.webp"})
+
+    def test_saved_plan(self):
+        source = self._make_zip()
+        processor = ImageProcessor(
+            input_dir=str(source),
+            output_dir=str(self._output_dir / "out.zip"),
+            default_size=(60, 60),
+        )
+        plan = processor.create_plan()
+        self.assertNotIn("data", plan.jobs[0].to_dict())
+        self.assertEqual(plan.jobs[0].width, 120)
+
+        processor.execute_plan(plan)
+        self.assertEqual(
+            set(self._read_outputs(self._output_dir / "out.zip")),
+            {"a.webp", "photos/b.webp"},
+        )
+
+    def test_unsafe_members_skipped(self):
+        source = self._make_zip({"../escape.png": MEMBERS["a.png"], **MEMBERS})
+        with self.assertLogs(level="WARNING") as logs:
+            ImageProcessor(
+                input_dir=str(source),
+                output_dir=str(self._output_dir),
+                default_size=(60, 60),
+            ).process_all_images()
+        self.assertIn("../escape.png", "\n".join(logs.output))
+        self.assertFalse((self._output_dir.parent / "escape.webp").exists())
+        self.assertTrue((self._output_dir / "a.webp").exists())
+
+    @parameterized.expand(
+        [
+            ("same_output", {}),
+            ("incremental", {"incremental": True, "output_dir": "out"}),
+        ]
+    )
+    def test_invalid_options(self, _, kwargs):
+        source = self._make_zip()
+        kwargs.setdefault("output_dir", str(source))
+        with self.assertRaises(ValueError):
+            ImageProcessor(input_dir=str(source), **kwargs)
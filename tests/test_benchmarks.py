@@ -0,0 +1,57 @@
+import shutil
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.runner import compare, percentile
+from src.img_to_webp import SUPPORTED_FORMATS
+
+
+def _result(images_per_sec, p50, rss):
+    return {
+        "images_per_sec": images_per_sec,
+        "latency_ms": {"total": {"p50": p50}},
+        "peak_rss_mb": rss,
+    }
+
+
+class TestBenchmarks(unittest.TestCase):
+    def setUp(self):
+        self._corpus_dir = Path("tests/bench_corpus")
+
+    def tearDown(self):
+        if self._corpus_dir.exists():
+            shutil.rmtree(self._corpus_dir)
+
+    def test_corpus_covers_formats_and_is_reproducible(self):
+        paths = generate_corpus(self._corpus_dir, [(64, 48)], seed=1)
+        self.assertEqual({p.suffix for p in paths}, SUPPORTED_FORMATS)
+        self.assertTrue(any("alpha" in p.name for p in paths))
+        with Image.open(next(p for p in paths if "animated" in p.name)) as img:
+            self.assertGreater(img.n_frames, 1)
+
+        contents = {p.name: p.read_bytes() for p in paths}
+        shutil.rmtree(self._corpus_dir)
+        paths = generate_corpus(self._corpus_dir, [(64, 48)], seed=1)
+        self.assertEqual({p.name: p.read_bytes() for p in paths}, contents)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5.0], 90), 5.0)
+
+    def test_compare(self):
+        baseline = {"scenarios": {"cover": _result(100, 10, 100)}}
+        within = {"scenarios": {"cover": _result(95, 10.5, 105)}}
+        self.assertEqual(compare(within, baseline, 0.1), [])
+
+        regressed = {"scenarios": {"cover": _result(80, 12, 130)}}
+        self.assertEqual(len(compare(regressed, baseline, 0.1)), 3)
+        self.assertEqual(compare({"scenarios": {}}, baseline, 0.1), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
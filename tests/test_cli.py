@@ -2,8 +2,9 @@ import argparse
 import unittest
 from unittest.mock import patch
 
-from src.img_to_webp import ResizeMode
+from src.img_to_webp import Compression, DedupMode, ResizeMode, ExecutorType
 from src.img_to_webp import parse_args
+from src.img_to_webp._shard import Shard
 
 
 class TestCLI(unittest.TestCase):
@@ -17,11 +18,45 @@ class TestCLI(unittest.TestCase):
             default_resize_mode=ResizeMode.COVER,
             default_size=(100, 100),
             quality=90,
+            method=6,
+            alpha_quality=90,
+            lossless=False,
+            compression=Compression.AUTO,
+            all_pages=True,
+            include=["*.jpg"],
+            exclude=[".git", "thumbs"],
+            max_depth=2,
+            follow_symlinks=True,
+            skip_hidden=False,
+            max_bytes=None,
+            min_ssim=0.95,
+            min_psnr=None,
             verbose=True,
+            jobs=4,
+            executor=ExecutorType.THREAD,
+            incremental=True,
+            hash_sources=True,
+            dedup=DedupMode.REFLINK,
+            no_decode_reduction=True,
+            dry_run=True,
+            plan=None,
+            save_plan="plan.json",
+            report="report.csv",
+            prometheus_file="img_to_webp.prom",
+            watch=True,
+            debounce=2.0,
+            poll_interval=None,
+            polling=False,
+            shard=Shard(2, 4),
+            command="serve",
+            host="0.0.0.0",
+            port=9000,
+            cache_size=128,
+            cache_dir=None,
         ),
     )
     def test_parse_args(self, mock_args):
-        args = parse_args()
+        args = parse_args([])
         self.assertEqual(args.config, "config.yaml")
         self.assertEqual(args.input_dir, "input")
         self.assertEqual(args.output_dir, "output")
@@ -29,7 +64,68 @@ class TestCLI(unittest.TestCase):
         self.assertEqual(args.default_resize_mode, ResizeMode.COVER)
         self.assertEqual(args.default_size, (100, 100))
         self.assertEqual(args.quality, 90)
+        self.assertEqual(args.method, 6)
+        self.assertEqual(args.alpha_quality, 90)
+        self.assertFalse(args.lossless)
+        self.assertEqual(args.compression, Compression.AUTO)
+        self.assertTrue(args.all_pages)
+        self.assertEqual(args.include, ["*.jpg"])
+        self.assertEqual(args.exclude, [".git", "thumbs"])
+        self.assertEqual(args.max_depth, 2)
+        self.assertTrue(args.follow_symlinks)
+        self.assertFalse(args.skip_hidden)
+        self.assertIsNone(args.max_bytes)
+        self.assertEqual(args.min_ssim, 0.95)
+        self.assertIsNone(args.min_psnr)
         self.assertTrue(args.verbose)
+        self.assertEqual(args.jobs, 4)
+        self.assertEqual(args.executor, ExecutorType.THREAD)
+        self.assertTrue(args.incremental)
+        self.assertTrue(args.hash_sources)
+        self.assertEqual(args.dedup, DedupMode.REFLINK)
+        self.assertTrue(args.no_decode_reduction)
+        self.assertTrue(args.dry_run)
+        self.assertIsNone(args.plan)
+        self.assertEqual(args.save_plan, "plan.json")
+        self.assertEqual(args.report, "report.csv")
+        self.assertEqual(args.prometheus_file, "img_to_webp.prom")
+        self.assertTrue(args.watch)
+        self.assertEqual(args.debounce, 2.0)
+        self.assertIsNone(args.poll_interval)
+        self.assertFalse(args.polling)
+        self.assertEqual(args.shard, Shard(2, 4))
+        self.assertEqual(args.command, "serve")
+        self.assertEqual(args.host, "0.0.0.0")
+        self.assertEqual(args.port, 9000)
+        self.assertEqual(args.cache_size, 128)
+        self.assertIsNone(args.cache_dir)
+
+    def test_single_file(self):
+        args = parse_args(["photo.jpg", "-o", "out/photo.webp", "--quality", "70"])
+        self.assertEqual(args.source, "photo.jpg")
+        self.assertEqual(args.output, "out/photo.webp")
+        self.assertEqual(args.quality, 70)
+        self.assertIsNone(args.command)
+
+    def test_subcommand_not_taken_as_source(self):
+        args = parse_args(["--input-dir", "input", "serve", "--port", "9000"])
+        self.assertEqual(args.command, "serve")
+        self.assertEqual(args.port, 9000)
+        self.assertIsNone(args.source)
+
+    def test_options_after_subcommand(self):
+        args = parse_args(["merge", "--report", "report.json"])
+        self.assertEqual(args.command, "merge")
+        self.assertEqual(args.report, "report.json")
+
+        args = parse_args(
+            ["--quality", "70", "serve", "--input-dir", "input", "--port", "9000"]
+        )
+        self.assertEqual(args.command, "serve")
+        self.assertEqual(args.input_dir, "input")
+        self.assertEqual(args.quality, 70)
+        self.assertEqual(args.port, 9000)
+        self.assertFalse(args.lossless)
 
 
 if __name__ == "__main__":
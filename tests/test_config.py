@@ -2,7 +2,7 @@ import argparse
 import unittest
 from unittest.mock import patch, mock_open
 
-from src.img_to_webp import Config, ResizeMode
+from src.img_to_webp import Compression, Config, DedupMode, ResizeMode, ExecutorType
 
 yaml_data = """
 input_dir: input
@@ -11,11 +11,48 @@ resize_rules:
   - pattern: "*.jpg"
     size: [100, 100]
     mode: cover
+  - pattern: "icon_"
+    lossless: true
+    method: 6
+  - pattern: "hero"
+    max_bytes: 150000
+    variants:
+      - size: [1024, 512]
+        suffix: "@2x"
+variants:
+  - size: [128, 128]
+  - size: [512, 512]
+    mode: fill
+    quality: 70
 quality: 90
+method: 5
+alpha_quality: 70
+compression: auto
+all_pages: true
+include: ["*.jpg", "photos/*"]
+exclude: [thumbs]
+max_depth: 3
+skip_hidden: true
+min_ssim: 0.95
 default_size: [100, 100]
 default_resize_mode: cover
 overwrite: true
 verbose: true
+jobs: 4
+executor: thread
+incremental: true
+hash_sources: true
+dedup: copy
+decode_reduction: false
+report: report.json
+prometheus_file: img_to_webp.prom
+watch: true
+debounce: 2.5
+poll_interval: 10
+polling: true
+port: 9000
+cache_size: 128
+cache_dir: cache
 """
 
 args = argparse.Namespace(
@@ -24,8 +61,52 @@ args = argparse.Namespace(
     overwrite=True,
     default_resize_mode=ResizeMode.COVER,
     default_size=(100, 100),
+    gravity=None,
+    resample=None,
+    reducing_gap=None,
+    max_memory=None,
+    tile_pixels=None,
+    prefetch=None,
+    no_upscale=False,
+    max_output_ratio=None,
+    skip_oversized=False,
     quality=90,
+    method=None,
+    alpha_quality=None,
+    lossless=False,
+    compression=None,
+    all_pages=False,
+    include=None,
+    exclude=None,
+    max_depth=None,
+    follow_symlinks=False,
+    skip_hidden=False,
+    max_bytes=None,
+    min_ssim=None,
+    min_psnr=None,
     verbose=True,
+    jobs=4,
+    executor=ExecutorType.THREAD,
+    incremental=True,
+    hash_sources=True,
+    dedup=None,
+    no_decode_reduction=True,
+    dry_run=False,
+    plan=None,
+    save_plan=None,
+    report=None,
+    prometheus_file=None,
+    watch=False,
+    debounce=None,
+    poll_interval=None,
+    polling=False,
+    shard=None,
+    command=None,
+    source=None,
+    host=None,
+    port=None,
+    cache_size=None,
+    cache_dir=None,
 )
 
 
@@ -33,15 +114,52 @@ class TestConfig(unittest.TestCase):
     def assert_config(self, config):
         self.assertEqual(config.input_dir, "input")
         self.assertEqual(config.output_dir, "output")
-        self.assertEqual(len(config.resize_rules), 1)
+        self.assertEqual(len(config.resize_rules), 3)
         self.assertEqual(config.resize_rules[0].pattern, "*.jpg")
         self.assertEqual(config.resize_rules[0].size, (100, 100))
         self.assertEqual(config.resize_rules[0].mode, ResizeMode.COVER)
+        self.assertTrue(config.resize_rules[1].encoding.lossless)
+        self.assertEqual(config.resize_rules[1].encoding.method, 6)
+        self.assertEqual(config.resize_rules[2].encoding.max_bytes, 150000)
+        self.assertEqual(config.resize_rules[2].variants[0].size, (1024, 512))
+        self.assertEqual(config.resize_rules[2].variants[0].suffix, "@2x")
+        self.assertEqual(len(config.variants), 2)
+        self.assertEqual(config.variants[0].suffix, "_128x128")
+        self.assertEqual(config.variants[1].mode, ResizeMode.FILL)
+        self.assertEqual(config.variants[1].quality, 70)
         self.assertEqual(config.quality, 90)
+        self.assertEqual(config.method, 5)
+        self.assertEqual(config.alpha_quality, 70)
+        self.assertFalse(config.lossless)
+        self.assertEqual(config.compression, Compression.AUTO)
+        self.assertTrue(config.all_pages)
+        self.assertEqual(config.include, ["*.jpg", "photos/*"])
+        self.assertEqual(config.exclude, ["thumbs"])
+        self.assertEqual(config.max_depth, 3)
+        self.assertFalse(config.follow_symlinks)
+        self.assertTrue(config.skip_hidden)
+        self.assertIsNone(config.max_bytes)
+        self.assertEqual(config.min_ssim, 0.95)
         self.assertEqual(config.default_size, (100, 100))
         self.assertEqual(config.default_resize_mode, ResizeMode.COVER)
         self.assertTrue(config.overwrite)
         self.assertTrue(config.verbose)
+        self.assertEqual(config.jobs, 4)
+        self.assertEqual(config.executor, ExecutorType.THREAD)
+        self.assertTrue(config.incremental)
+        self.assertTrue(config.hash_sources)
+        self.assertEqual(config.dedup, DedupMode.COPY)
+        self.assertFalse(config.decode_reduction)
+        self.assertEqual(config.report, "report.json")
+        self.assertEqual(config.prometheus_file, "img_to_webp.prom")
+        self.assertTrue(config.watch)
+        self.assertEqual(config.debounce, 2.5)
+        self.assertEqual(config.poll_interval, 10)
+        self.assertTrue(config.polling)
+        self.assertEqual(config.host, "127.0.0.1")
+        self.assertEqual(config.port, 9000)
+        self.assertEqual(config.cache_size, 128)
+        self.assertEqual(config.cache_dir, "cache")
 
     @patch("builtins.open", new_callable=mock_open, read_data=yaml_data)
     @patch("os.path.exists", return_value=True)
@@ -0,0 +1,117 @@
+import json
+import shutil
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import (
+    DedupMode,
+    ExecutorType,
+    ImageProcessor,
+    ResizeRule,
+    Variant,
+)
+from src.img_to_webp._dedup import DEDUP_INDEX_FILENAME, DedupIndex
+from .base_test import BaseTest
+
+
+class TestDedup(BaseTest):
+    def setUp(self):
+        super().setUp()
+        # Some base images are byte-identical, e.g. the .jpg and .jpeg ones.
+        for path in self._input_dir.glob("test_image_*"):
+            path.unlink()
+        (self._input_dir / "sub").mkdir()
+        Image.new("RGB", (120, 80), "red").save(self._input_dir / "photo.png")
+        for copy in ["sub/copy.png", "sub/again.png"]:
+            shutil.copyfile(self._input_dir / "photo.png", self._input_dir / copy)
+        self._report = self._output_dir / "report.json"
+
+    def _process(self, **kwargs) -> dict:
+        ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(60, 60),
+            report=str(self._report),
+            **kwargs,
+        ).process_all_images()
+        with open(self._report) as file:
+            return json.load(file)["summary"]
+
+    @parameterized.expand([("sequential", 1), ("parallel", 2)])
+    def test_duplicates_converted_once(self, _, jobs):
+        summary = self._process(
+            dedup=DedupMode.HARDLINK, jobs=jobs, executor=ExecutorType.THREAD
+        )
+        self.assertEqual(summary["images"], 1)
+        self.assertEqual(summary["dedup"]["images"], 2)
+        output = self._output_dir / "photo.webp"
+        self.assertEqual(summary["dedup"]["bytes_saved"], 2 * output.stat().st_size)
+        self.assertGreater(summary["dedup"]["seconds_saved"], 0)
+        inodes = {
+            (self._output_dir / name).stat().st_ino
+            for name in ["photo.webp", "sub/copy.webp", "sub/again.webp"]
+        }
+        self.assertEqual(len(inodes), 1)
+
+    @parameterized.expand([("copy", DedupMode.COPY), ("reflink", DedupMode.REFLINK)])
+    def test_copies(self, _, mode):
+        self._process(dedup=mode)
+        output = self._output_dir / "photo.webp"
+        copy = self._output_dir / "sub" / "copy.webp"
+        self.assertNotEqual(output.stat().st_ino, copy.stat().st_ino)
+        self.assertEqual(output.read_bytes(), copy.read_bytes())
+
+    def test_index_persists_between_runs(self):
+        self._process(dedup=DedupMode.HARDLINK)
+        self.assertTrue((self._output_dir / DEDUP_INDEX_FILENAME).exists())
+
+        shutil.copyfile(self._input_dir / "photo.png", self._input_dir / "later.png")
+        summary = self._process(dedup=DedupMode.HARDLINK, incremental=True)
+        self.assertEqual(summary["images"], 0)
+        self.assertEqual(summary["dedup"]["images"], 1)
+        self.assertEqual(
+            (self._output_dir / "later.webp").stat().st_ino,
+            (self._output_dir / "photo.webp").stat().st_ino,
+        )
+
+    def test_rewritten_output_keeps_links(self):
+        self._process(dedup=DedupMode.HARDLINK, incremental=True)
+        copy = self._output_dir / "sub" / "copy.webp"
+        original = copy.read_bytes()
+
+        Image.new("RGB", (120, 80), "blue").save(self._input_dir / "photo.png")
+        summary = self._process(dedup=DedupMode.HARDLINK, incremental=True)
+        self.assertEqual(summary["images"], 1)
+        self.assertEqual(copy.read_bytes(), original)
+        self.assertNotEqual((self._output_dir / "photo.webp").read_bytes(), original)
+
+        # The replaced output no longer serves as a dedup source.
+        index = DedupIndex.load(self._output_dir)
+        self.assertEqual(len(index._entries), 1)
+
+    def test_variants(self):
+        self._process(
+            dedup=DedupMode.HARDLINK,
+            variants=[Variant(size=(30, 30)), Variant(size=(50, 50))],
+        )
+        with open(self._output_dir / "sub" / "copy.variants.json") as file:
+            index = json.load(file)
+        self.assertEqual(index["source"], "sub/copy.png")
+        self.assertEqual(
+            [variant["path"] for variant in index["variants"]],
+            ["sub/copy_50x50.webp", "sub/copy_30x30.webp"],
+        )
+        self.assertEqual(
+            (self._output_dir / "sub" / "copy_30x30.webp").stat().st_ino,
+            (self._output_dir / "photo_30x30.webp").stat().st_ino,
+        )
+
+    def test_different_settings_not_deduplicated(self):
+        summary = self._process(
+            dedup=DedupMode.HARDLINK,
+            resize_rules=[ResizeRule("copy", (30, 30))],
+        )
+        self.assertEqual(summary["dedup"]["images"], 1)
+        with Image.open(self._output_dir / "sub" / "copy.webp") as img:
+            self.assertEqual(img.size, (30, 20))
@@ -0,0 +1,210 @@
+import io
+import math
+import random
+import unittest
+
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+from src.img_to_webp import (
+    Compression,
+    EncodeSettings,
+    ImageProcessor,
+    ResizeRule,
+)
+from src.img_to_webp._encoder import (
+    WebPEncoder,
+    analyze_content,
+    choose_compression,
+    measure_psnr,
+    measure_ssim,
+)
+
+
+def _photo(size=(320, 240), seed=0) -> Image.Image:
+    rng = random.Random(seed)
+    noise = Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3))
+    return Image.blend(
+        Image.linear_gradient("L").resize(size).convert("RGB"),
+        noise.filter(ImageFilter.GaussianBlur(1)),
+        0.5,
+    )
+
+
+def _logo() -> Image.Image:
+    img = Image.new("RGB", (320, 240), "white")
+    draw = ImageDraw.Draw(img)
+    draw.ellipse((40, 40, 200, 200), fill=(200, 30, 30))
+    draw.rectangle((160, 80, 300, 160), fill=(20, 60, 200))
+    return img
+
+
+def _screenshot() -> Image.Image:
+    """Rows of thin, text-like strokes on a flat background with a photo inset."""
+    img = Image.new("RGB", (640, 480), (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    rng = random.Random(0)
+    for y in range(10, 470, 14):
+        x = 10
+        while x < 600:
+            shade = rng.randrange(160)
+            box = (x, y, x + rng.randrange(1, 3), y + rng.randrange(6, 10))
+            draw.rectangle(box, fill=(shade, shade, shade + 40))
+            x += rng.randrange(3, 8)
+    img.paste(_photo((160, 120)), (460, 340))
+    return img
+
+
+def _product_shot() -> Image.Image:
+    """A photo on a plain background: mostly flat, but with few hard edges."""
+    img = Image.new("RGB", (640, 480), "white")
+    img.paste(_photo((320, 240)), (160, 120))
+    return img
+
+
+def _encoded_size(img: Image.Image, quality: int) -> int:
+    buffer = io.BytesIO()
+    img.save(buffer, "WEBP", quality=quality, method=4)
+    return buffer.tell()
+
+
+def _decoded(buffer: io.BytesIO) -> Image.Image:
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+class TestEncoder(unittest.TestCase):
+    def setUp(self):
+        self._img = _photo()
+        self._defaults = EncodeSettings(quality=80, method=4, alpha_quality=100)
+
+    def _settings(self, **kwargs) -> EncodeSettings:
+        return EncodeSettings(**kwargs).merged_with(self._defaults)
+
+    def test_metrics(self):
+        self.assertEqual(measure_psnr(self._img, self._img), math.inf)
+        self.assertAlmostEqual(measure_ssim(self._img, self._img), 1.0, places=4)
+        blurred = self._img.filter(ImageFilter.GaussianBlur(3))
+        self.assertLess(measure_ssim(self._img, blurred), 0.9)
+        self.assertLess(measure_psnr(self._img, blurred), 35)
+
+    def test_max_bytes_selects_highest_fitting_quality(self):
+        budget = _encoded_size(self._img, 50) + 1
+        result = WebPEncoder().encode(self._img, self._settings(max_bytes=budget))
+        self.assertLessEqual(result.buffer.tell(), budget)
+        self.assertGreaterEqual(result.quality, 50)
+        self.assertGreater(_encoded_size(self._img, result.quality + 1), budget)
+
+    def test_search_copies_chosen_trial_into_destination(self):
+        budget = _encoded_size(self._img, 50) + 1
+        dst = io.BytesIO()
+        result = WebPEncoder().encode(self._img, self._settings(max_bytes=budget), dst)
+        self.assertIs(result.buffer, dst)
+        self.assertEqual(len(dst.getvalue()), _encoded_size(self._img, result.quality))
+
+    def test_max_bytes_unreachable_uses_lowest_quality(self):
+        result = WebPEncoder().encode(self._img, self._settings(max_bytes=10))
+        self.assertEqual(result.quality, 0)
+
+    def test_min_score_selects_lowest_reaching_quality(self):
+        for target, measure in [("min_ssim", measure_ssim), ("min_psnr", measure_psnr)]:
+            with self.subTest(target=target):
+                goal = 0.9 if target == "min_ssim" else 32.0
+                result = WebPEncoder().encode(
+                    self._img, self._settings(**{target: goal})
+                )
+                self.assertGreaterEqual(
+                    measure(self._img, _decoded(result.buffer)), goal
+                )
+                lower = WebPEncoder().encode(
+                    self._img, self._settings(quality=result.quality - 1)
+                )
+                self.assertLess(measure(self._img, _decoded(lower.buffer)), goal)
+
+    def test_search_seeded_from_similar_image(self):
+        encoder = WebPEncoder()
+        settings = self._settings(max_bytes=_encoded_size(self._img, 40))
+        first = encoder.encode(self._img, settings)
+        similar = _photo(seed=1)
+        second = encoder.encode(similar, settings)
+        self.assertLess(second.trials, first.trials)
+        # Seeded with its own result, the search only confirms the boundary.
+        self.assertEqual(encoder.encode(similar, settings).trials, 2)
+
+    def test_lossless_skips_search(self):
+        result = WebPEncoder().encode(
+            self._img, self._settings(lossless=True, max_bytes=10)
+        )
+        self.assertEqual(result.trials, 1)
+        self.assertEqual(measure_psnr(self._img, _decoded(result.buffer)), math.inf)
+
+    def test_settings_validation(self):
+        with self.assertRaises(ValueError):
+            EncodeSettings(max_bytes=1000, min_ssim=0.9)
+        with self.assertRaises(ValueError):
+            EncodeSettings(method=7)
+        with self.assertRaises(ValueError):
+            ResizeRule("icon_", quality=101)
+
+    def test_rule_target_replaces_default_target(self):
+        defaults = EncodeSettings(quality=80, min_ssim=0.95)
+        merged = EncodeSettings(max_bytes=5000).merged_with(defaults)
+        self.assertEqual(merged.max_bytes, 5000)
+        self.assertIsNone(merged.min_ssim)
+        self.assertEqual(merged.quality, 80)
+
+    def test_processor_applies_rule_settings(self):
+        processor = ImageProcessor(
+            default_size=(200, 150),
+            quality=90,
+            resize_rules=[ResizeRule("icon_", lossless=True)],
+        )
+        buffer = io.BytesIO()
+        self._img.save(buffer, "PNG")
+        lossy = processor.convert_bytes(buffer.getvalue(), filename="photo.png")
+        lossless = processor.convert_bytes(buffer.getvalue(), filename="icon_a.png")
+        # The first chunk is VP8L for lossless and VP8 for lossy bitstreams.
+        self.assertEqual(lossless[12:16], b"VP8L")
+        self.assertEqual(lossy[12:16], b"VP8 ")
+
+    def test_auto_compression_by_content(self):
+        settings = self._settings(compression="auto")
+        for img, expected in [
+            (_logo(), Compression.LOSSLESS),
+            (_screenshot(), Compression.NEAR_LOSSLESS),
+            (_photo(), Compression.LOSSY),
+            (_product_shot(), Compression.LOSSY),
+        ]:
+            with self.subTest(expected=expected):
+                self.assertEqual(choose_compression(analyze_content(img)), expected)
+                result = WebPEncoder().encode(img, settings)
+                self.assertEqual(result.compression, expected)
+                self.assertIsNotNone(result.reason)
+                # A single encode that is no larger than the alternatives.
+                self.assertEqual(result.trials, 1)
+                for other in ["lossy", "lossless"]:
+                    alternative = WebPEncoder().encode(
+                        img, self._settings(compression=other)
+                    )
+                    self.assertLessEqual(
+                        result.buffer.tell(), alternative.buffer.tell()
+                    )
+
+    def test_near_lossless_error_bound(self):
+        img = _screenshot().convert("RGBA")
+        # Lossless WebP may discard colors under fully transparent pixels.
+        alpha = Image.linear_gradient("L").resize(img.size).point(lambda v: v or 1)
+        img.putalpha(alpha)
+        result = WebPEncoder().encode(img, self._settings(compression="near_lossless"))
+        decoded = _decoded(result.buffer).convert("RGBA")
+        difference = ImageChops.difference(img, decoded)
+        extrema = difference.getextrema()
+        self.assertTrue(all(high <= 2 for _, high in extrema[:3]))
+        self.assertEqual(extrema[3], (0, 0))
+
+    def test_lossless_conflicts_with_compression(self):
+        with self.assertRaises(ValueError):
+            EncodeSettings(lossless=True, compression="lossy")
+        merged = EncodeSettings(compression="lossy").merged_with(
+            EncodeSettings(lossless=True)
+        )
+        self.assertEqual(merged.compression, Compression.LOSSY)
@@ -1,7 +1,10 @@
-from PIL import Image
+from unittest.mock import patch
+
+from PIL import Image, ImageChops, ImageStat, JpegImagePlugin
 from parameterized import parameterized
 
 from src.img_to_webp import (
+    ExecutorType,
     ImageProcessor,
     InputDirNotFoundError,
     ResizeRule,
@@ -112,3 +115,182 @@ class TestImageProcessor(BaseTest):
         for webp_file in webp_files:
             img = Image.open(webp_file)
             self.assertEqual(img.size, crop_size)
+
+    @parameterized.expand([ExecutorType.PROCESS, ExecutorType.THREAD])
+    def test_parallel_jobs(self, executor):
+        (self._input_dir / "invalid_file.png").touch()
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(100, 100),
+            default_resize_mode=ResizeMode.FILL,
+            jobs=3,
+            executor=executor,
+        )
+        with self.assertLogs() as cm:
+            processor.process_all_images()
+        output = "\n".join(cm.output)
+        total_images = len(SUPPORTED_FORMATS) * len(self.SIZES)
+        self.assertIn(f"Total images: {total_images + 1}", output)
+        self.assertIn(f"Processed images: {total_images}", output)
+
+        webp_files = list(self._output_dir.rglob("*.webp"))
+        self.assertEqual(len(webp_files), total_images)
+        for webp_file in webp_files:
+            self.assertEqual(Image.open(webp_file).size, (100, 100))
+
+    @parameterized.expand([ResizeMode.COVER, ResizeMode.CONTAIN, ResizeMode.FILL])
+    def test_decode_reduction(self, mode):
+        img_path = self._input_dir / "large_photo.jpg"
+        Image.radial_gradient("L").resize((1600, 1200)).convert("RGB").save(img_path)
+
+        draft = JpegImagePlugin.JpegImageFile.draft
+        outputs = []
+        for decode_reduction in [False, True]:
+            processor = ImageProcessor(
+                input_dir=str(self._input_dir),
+                output_dir=str(self._output_dir / str(decode_reduction)),
+                default_size=(100, 100),
+                default_resize_mode=mode,
+                decode_reduction=decode_reduction,
+            )
+            # Pillow's thumbnail also calls draft, which is a no-op once the
+            # source is loaded, so only drafts that changed the decode count.
+            drafts = []
+            with patch.object(
+                JpegImagePlugin.JpegImageFile,
+                "draft",
+                autospec=True,
+                side_effect=lambda img, *args, drafts=drafts: drafts.append(
+                    draft(img, *args)
+                ),
+            ):
+                output_path = processor.process_image(img_path)
+            self.assertEqual(any(drafts), decode_reduction)
+            outputs.append(Image.open(output_path).convert("L"))
+
+        full, reduced = outputs
+        self.assertEqual(full.size, reduced.size)
+        self.assertLess(ImageStat.Stat(ImageChops.difference(full, reduced)).mean[0], 2)
+
+    @parameterized.expand(
+        [
+            ("opaque_jpeg.jpg", Image.new("RGB", (300, 200), "red"), "RGB", "RGB"),
+            ("gray.png", Image.new("L", (300, 200), 128), "L", "RGB"),
+            ("cmyk.jpg", Image.new("CMYK", (300, 200), (0, 255, 255, 0)), "RGB", "RGB"),
+            (
+                "alpha.png",
+                Image.new("RGBA", (300, 200), (0, 0, 255, 128)),
+                "RGBA",
+                "RGBA",
+            ),
+            ("gray_alpha.png", Image.new("LA", (300, 200), (50, 100)), "LA", "RGBA"),
+            ("palette.gif", Image.new("P", (300, 200), 3), "RGB", "RGB"),
+            ("deep.png", Image.new("I;16", (300, 200), 40000), "L", "RGB"),
+        ]
+    )
+    def test_native_modes(self, name, source, resample_mode, output_mode):
+        img_path = self._input_dir / name
+        source.save(img_path)
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(100, 100),
+            default_resize_mode=ResizeMode.FILL,
+        )
+        with Image.open(img_path) as img:
+            self.assertEqual(processor._to_resample_mode(img).mode, resample_mode)
+
+        with Image.open(processor.process_image(img_path)) as output:
+            self.assertEqual(output.size, (100, 100))
+            self.assertEqual(output.mode, output_mode)
+            expected = source.convert("RGBA" if output_mode == "RGBA" else "RGB")
+            if source.mode == "I;16":
+                expected = Image.new("RGB", source.size, (156, 156, 156))
+            difference = ImageChops.difference(
+                output.convert(expected.mode), expected.resize(output.size)
+            )
+            self.assertLess(max(ImageStat.Stat(difference).mean), 3)
+
+    def test_transparent_palette_keeps_alpha(self):
+        img_path = self._input_dir / "transparent.gif"
+        Image.new("P", (300, 200), 0).save(img_path, transparency=0)
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(100, 100),
+        )
+        with Image.open(processor.process_image(img_path)) as output:
+            self.assertEqual(output.mode, "RGBA")
+            self.assertEqual(output.getchannel("A").getextrema(), (0, 0))
+
+    def test_process_image_to_output_path(self):
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+        )
+        img_path = self._input_dir / "test_image_200x100_png.png"
+        output_path = self._output_dir / "nested" / "renamed.webp"
+        self.assertEqual(processor.process_image(img_path, output_path), output_path)
+        with Image.open(output_path) as output:
+            self.assertEqual(output.size, (50, 25))
+
+    def test_source_at_target_size_is_not_resampled(self):
+        img_path = self._input_dir / "exact.png"
+        Image.new("RGB", (100, 100), "red").save(img_path)
+        for mode in [ResizeMode.COVER, ResizeMode.CONTAIN, ResizeMode.FILL]:
+            processor = ImageProcessor(
+                input_dir=str(self._input_dir),
+                output_dir=str(self._output_dir),
+                overwrite=True,
+                default_size=(100, 100),
+                default_resize_mode=mode,
+            )
+            with patch.object(Image.Image, "resize") as resize:
+                output_path = processor.process_image(img_path)
+            resize.assert_not_called()
+            with Image.open(output_path) as output:
+                self.assertEqual(output.size, (100, 100))
+
+    @parameterized.expand([False, True])
+    def test_max_output_ratio(self, skip_oversized):
+        img_path = self._input_dir / "test_image_200x100_png.png"
+        output_path = self._output_dir / "test_image_200x100_png.webp"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        output_path.write_bytes(b"earlier output")
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            overwrite=True,
+            max_output_ratio=0.001,
+            skip_oversized=skip_oversized,
+        )
+        with self.assertLogs(level="INFO") as logs:
+            result = processor.process_image(img_path)
+        self.assertTrue(any("times the source's" in line for line in logs.output))
+        if skip_oversized:
+            self.assertIsNone(result)
+            self.assertFalse(output_path.exists())
+        else:
+            self.assertEqual(result, output_path)
+            with Image.open(output_path) as output:
+                self.assertEqual(output.format, "WEBP")
+
+    def test_skip_oversized_with_dedup(self):
+        for path in self._input_dir.iterdir():
+            path.unlink()
+        for name in ["a.png", "b.png"]:
+            Image.new("RGB", (50, 50), "red").save(self._input_dir / name)
+        ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            max_output_ratio=0.001,
+            skip_oversized=True,
+            dedup="copy",
+        ).process_all_images()
+        self.assertEqual(list(self._output_dir.rglob("*.webp")), [])
+
+    def test_invalid_max_output_ratio(self):
+        with self.assertRaises(ValueError):
+            ImageProcessor(max_output_ratio=0)
@@ -0,0 +1,25 @@
+import unittest
+
+import src.img_to_webp as img_to_webp
+from benchmarks.import_time import import_times
+
+# Only imported once a conversion, config file or server needs them. Import
+# time itself is measured by `python -m benchmarks.import_time`.
+_DEFERRED_MODULES = ["PIL", "yaml", "asyncio", "concurrent.futures", "multiprocessing"]
+
+_ENTRY_POINT = "from src.img_to_webp import main, parse_args"
+
+
+class TestImportTime(unittest.TestCase):
+    def test_heavy_modules_deferred(self):
+        modules = {name.strip() for name in import_times(_ENTRY_POINT)}
+        for module in _DEFERRED_MODULES:
+            with self.subTest(module=module):
+                self.assertNotIn(module, modules)
+
+    def test_all_lists_every_export(self):
+        self.assertEqual(sorted(img_to_webp.__all__), sorted(img_to_webp._EXPORTS))
+
+
+if __name__ == "__main__":
+    unittest.main()
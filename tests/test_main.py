@@ -1,11 +1,12 @@
 import unittest
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
 from src.img_to_webp import main
 
 
 class TestMain(unittest.TestCase):
-    @patch("src.img_to_webp._main.ImageProcessor")
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
     @patch("src.img_to_webp._main.Config")
     @patch("src.img_to_webp._main.parse_args")
     def test_main(self, mock_parse_args, mock_config, mock_image_processor):
@@ -14,6 +15,7 @@ class TestMain(unittest.TestCase):
         mock_parse_args.return_value = mock_args
 
         mock_config_instance = MagicMock()
+        mock_parse_args.return_value.source = None
         mock_config.from_args.return_value = mock_config_instance
         mock_config_instance.input_dir = "input"
         mock_config_instance.output_dir = "output"
@@ -23,6 +25,42 @@ class TestMain(unittest.TestCase):
         mock_config_instance.resize_rules = []
         mock_config_instance.default_size = (100, 100)
         mock_config_instance.quality = 90
+        mock_config_instance.method = 6
+        mock_config_instance.alpha_quality = 90
+        mock_config_instance.lossless = False
+        mock_config_instance.compression = "auto"
+        mock_config_instance.all_pages = True
+        mock_config_instance.include = ["*.jpg"]
+        mock_config_instance.exclude = []
+        mock_config_instance.max_depth = None
+        mock_config_instance.follow_symlinks = False
+        mock_config_instance.skip_hidden = True
+        mock_config_instance.max_bytes = 50000
+        mock_config_instance.min_ssim = None
+        mock_config_instance.min_psnr = None
+        mock_config_instance.jobs = 4
+        mock_config_instance.executor = "thread"
+        mock_config_instance.incremental = True
+        mock_config_instance.hash_sources = False
+        mock_config_instance.dedup = "hardlink"
+        mock_config_instance.decode_reduction = True
+        mock_config_instance.variants = []
+        mock_config_instance.report = "report.json"
+        mock_config_instance.prometheus_file = None
+        mock_config_instance.shard = None
+        mock_config_instance.gravity = "center"
+        mock_config_instance.resample = "lanczos"
+        mock_config_instance.reducing_gap = None
+        mock_config_instance.max_memory = None
+        mock_config_instance.tile_pixels = None
+        mock_config_instance.prefetch = 0
+        mock_config_instance.no_upscale = False
+        mock_config_instance.max_output_ratio = None
+        mock_config_instance.skip_oversized = False
+        mock_config_instance.dry_run = False
+        mock_config_instance.plan = None
+        mock_config_instance.save_plan = None
+        mock_config_instance.watch = False
 
         mock_image_processor_instance = MagicMock()
         mock_image_processor.return_value = mock_image_processor_instance
@@ -40,9 +78,175 @@ class TestMain(unittest.TestCase):
             resize_rules=[],
             default_size=(100, 100),
             quality=90,
+            method=6,
+            alpha_quality=90,
+            lossless=False,
+            compression="auto",
+            all_pages=True,
+            include=["*.jpg"],
+            exclude=[],
+            max_depth=None,
+            follow_symlinks=False,
+            skip_hidden=True,
+            max_bytes=50000,
+            min_ssim=None,
+            min_psnr=None,
+            jobs=4,
+            executor="thread",
+            incremental=True,
+            hash_sources=False,
+            dedup="hardlink",
+            decode_reduction=True,
+            variants=[],
+            report="report.json",
+            prometheus_file=None,
+            shard=None,
+            gravity="center",
+            resample="lanczos",
+            reducing_gap=None,
+            max_memory=None,
+            tile_pixels=None,
+            prefetch=0,
+            no_upscale=False,
+            max_output_ratio=None,
+            skip_oversized=False,
         )
         mock_image_processor_instance.process_all_images.assert_called_once()
 
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_dry_run(self, mock_parse_args, mock_config, mock_image_processor):
+        mock_config_instance = MagicMock()
+        mock_parse_args.return_value.source = None
+        mock_config.from_args.return_value = mock_config_instance
+        mock_config_instance.dry_run = True
+        mock_config_instance.plan = None
+        mock_config_instance.save_plan = "plan.json"
+
+        mock_image_processor_instance = MagicMock()
+        mock_image_processor.return_value = mock_image_processor_instance
+
+        main()
+
+        mock_image_processor_instance.create_plan.assert_called_once()
+        plan = mock_image_processor_instance.create_plan.return_value
+        mock_image_processor_instance.log_plan.assert_called_once_with(plan)
+        plan.save.assert_called_once_with("plan.json")
+        mock_image_processor_instance.execute_plan.assert_not_called()
+        mock_image_processor_instance.process_all_images.assert_not_called()
+
+    @patch("src.img_to_webp._main.JobPlan")
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_saved_plan(
+        self, mock_parse_args, mock_config, mock_image_processor, mock_job_plan
+    ):
+        mock_config_instance = MagicMock()
+        mock_parse_args.return_value.source = None
+        mock_config.from_args.return_value = mock_config_instance
+        mock_config_instance.plan = "plan.json"
+
+        mock_image_processor_instance = MagicMock()
+        mock_image_processor.return_value = mock_image_processor_instance
+
+        main()
+
+        mock_job_plan.load.assert_called_once_with("plan.json")
+        mock_image_processor_instance.execute_plan.assert_called_once_with(
+            mock_job_plan.load.return_value
+        )
+        mock_image_processor_instance.process_all_images.assert_not_called()
+
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_watch(self, mock_parse_args, mock_config, mock_image_processor):
+        mock_config_instance = MagicMock()
+        mock_parse_args.return_value.source = None
+        mock_config.from_args.return_value = mock_config_instance
+        mock_config_instance.plan = None
+        mock_config_instance.dry_run = False
+        mock_config_instance.save_plan = None
+        mock_config_instance.watch = True
+        mock_config_instance.debounce = 2.0
+        mock_config_instance.poll_interval = 5.0
+        mock_config_instance.polling = True
+
+        mock_image_processor_instance = MagicMock()
+        mock_image_processor.return_value = mock_image_processor_instance
+
+        main()
+
+        mock_image_processor_instance.watch.assert_called_once_with(
+            debounce=2.0, poll_interval=5.0, polling=True
+        )
+        mock_image_processor_instance.process_all_images.assert_not_called()
+
+    @patch("src.img_to_webp._server.ImageServer")
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_serve(
+        self, mock_parse_args, mock_config, mock_image_processor, mock_image_server
+    ):
+        mock_parse_args.return_value.command = "serve"
+        mock_config_instance = MagicMock()
+        mock_parse_args.return_value.source = None
+        mock_config.from_args.return_value = mock_config_instance
+        mock_config_instance.host = "0.0.0.0"
+        mock_config_instance.port = 9000
+        mock_config_instance.cache_size = 16
+        mock_config_instance.cache_dir = "cache"
+
+        main()
+
+        mock_image_server.assert_called_once_with(
+            mock_image_processor.return_value,
+            host="0.0.0.0",
+            port=9000,
+            cache_size=16 * 1024 * 1024,
+            cache_dir="cache",
+        )
+        mock_image_server.return_value.run.assert_called_once()
+        mock_image_processor.return_value.process_all_images.assert_not_called()
+
+    @patch("src.img_to_webp._main.merge_shard_reports")
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_merge(
+        self, mock_parse_args, mock_config, mock_image_processor, mock_merge
+    ):
+        mock_parse_args.return_value.command = "merge"
+        mock_config.from_args.return_value.report = "report.json"
+
+        main()
+
+        mock_merge.assert_called_once_with(Path("report.json"))
+        mock_image_processor.assert_not_called()
+
+    @patch("src.img_to_webp._image_processor.ImageProcessor")
+    @patch("src.img_to_webp._main.Config")
+    @patch("src.img_to_webp._main.parse_args")
+    def test_main_single_file(self, mock_parse_args, mock_config, mock_image_processor):
+        mock_parse_args.return_value.source = "photos/cat.jpg"
+        mock_parse_args.return_value.output = "webp/cat.webp"
+
+        main()
+
+        kwargs = mock_image_processor.call_args.kwargs
+        self.assertEqual(kwargs["input_dir"], "photos")
+        self.assertEqual(kwargs["output_dir"], "webp")
+        mock_image_processor.return_value.process_image.assert_called_once_with(
+            Path("photos/cat.jpg"), Path("webp/cat.webp")
+        )
+
+        mock_image_processor.return_value.process_image.side_effect = OSError
+        with self.assertRaises(SystemExit):
+            main()
+
 
 if __name__ == "__main__":
     unittest.main()
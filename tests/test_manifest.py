@@ -0,0 +1,81 @@
+import os
+
+from src.img_to_webp import ImageProcessor, ResizeMode, SUPPORTED_FORMATS
+from src.img_to_webp._manifest import MANIFEST_FILENAME, BuildManifest
+from .base_test import BaseTest
+
+
+class TestManifest(BaseTest):
+    def _process(self, **kwargs):
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            incremental=True,
+            default_size=(100, 100),
+            **kwargs,
+        )
+        with self.assertLogs() as cm:
+            processor.process_all_images()
+        return "\n".join(cm.output)
+
+    def test_manifest_written(self):
+        self._process()
+        manifest = BuildManifest.load(self._output_dir)
+        self.assertTrue((self._output_dir / MANIFEST_FILENAME).exists())
+        self.assertEqual(len(manifest), len(SUPPORTED_FORMATS) * len(self.SIZES))
+
+    def test_unchanged_sources_skipped(self):
+        self._process()
+        output = self._process()
+        total_images = len(SUPPORTED_FORMATS) * len(self.SIZES)
+        self.assertIn("Processed images: 0", output)
+        self.assertIn(f"Unchanged images: {total_images}", output)
+        self.assertNotIn("Skipping", output)
+
+    def test_modified_source_reprocessed(self):
+        self._process()
+        source = next(self._input_dir.glob("*.png"))
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        output = self._process()
+        self.assertIn("Processed images: 1", output)
+
+    def test_touched_source_with_same_content_skipped(self):
+        self._process(hash_sources=True)
+        source = next(self._input_dir.glob("*.png"))
+        stat = source.stat()
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        output = self._process(hash_sources=True)
+        self.assertIn("Processed images: 0", output)
+
+    def test_settings_change_reencodes_without_overwrite(self):
+        self._process()
+        output = self._process(quality=50)
+        total_images = len(SUPPORTED_FORMATS) * len(self.SIZES)
+        self.assertIn(f"Processed images: {total_images}", output)
+
+        output = self._process(quality=50, default_resize_mode=ResizeMode.FILL)
+        self.assertIn(f"Processed images: {total_images}", output)
+
+    def test_stale_outputs_pruned(self):
+        self._process()
+        source = next(self._input_dir.glob("*.png"))
+        output_path = self._output_dir / source.with_suffix(".webp").name
+        self.assertTrue(output_path.exists())
+
+        source.unlink()
+        output = self._process()
+        self.assertIn(f"Pruned stale output: {output_path}", output)
+        self.assertFalse(output_path.exists())
+        self.assertEqual(
+            len(BuildManifest.load(self._output_dir)),
+            len(SUPPORTED_FORMATS) * len(self.SIZES) - 1,
+        )
+
+    def test_deleted_output_regenerated(self):
+        self._process()
+        output_path = next(self._output_dir.glob("*.webp"))
+        output_path.unlink()
+        output = self._process()
+        self.assertIn("Processed images: 1", output)
+        self.assertTrue(output_path.exists())
@@ -0,0 +1,153 @@
+import threading
+import time
+from unittest.mock import patch
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import ExecutorType, ImageProcessor
+from src.img_to_webp._memory import (
+    MemoryBudget,
+    estimate_memory,
+    largest_first,
+    parse_memory_size,
+)
+from .base_test import BaseTest
+
+
+class TestMemory(BaseTest):
+    @parameterized.expand(
+        [
+            ("bytes", "1000", 1000),
+            ("kilobytes", "4K", 4096),
+            ("megabytes", "512M", 512 * 2**20),
+            ("gigabytes", "1.5G", 3 * 2**29),
+            ("suffix", "2GiB", 2 * 2**30),
+            ("lowercase", "2gb", 2 * 2**30),
+        ]
+    )
+    def test_parse_memory_size(self, _, text, expected):
+        self.assertEqual(parse_memory_size(text), expected)
+
+    def test_parse_invalid_memory_size(self):
+        with self.assertRaises(ValueError):
+            parse_memory_size("lots")
+
+    def test_estimate_memory(self):
+        self.assertEqual(estimate_memory(100, 10, tiled=False), 4 * 220)
+        self.assertEqual(estimate_memory(100, 10, tiled=True), 4 * 151)
+
+    def test_budget_waits_for_release(self):
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.acquire(60), 60)
+        acquired = threading.Event()
+
+        def acquire():
+            budget.acquire(60)
+            acquired.set()
+
+        thread = threading.Thread(target=acquire)
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        budget.release(60)
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_budget_admits_oversized_work_alone(self):
+        budget = MemoryBudget(100)
+        self.assertEqual(budget.acquire(500), 100)
+        budget.release(100)
+        self.assertEqual(budget.acquire(500), 100)
+
+    def test_largest_first_reads_only_a_window_ahead(self):
+        read = []
+
+        def items():
+            for size in [3, 1, 4, 1, 5, 9, 2, 6]:
+                read.append(size)
+                yield size
+
+        ordered = largest_first(items(), key=lambda size: size, window=3)
+        self.assertEqual(next(ordered), 4)
+        self.assertEqual(len(read), 3)
+        self.assertEqual(list(ordered), [3, 5, 9, 2, 6, 1, 1])
+
+    def test_conversion_starts_during_scan(self):
+        for path in self._input_dir.iterdir():
+            path.unlink()
+        for index in range(6):
+            Image.new("RGB", (50 + index, 50), "red").save(
+                self._input_dir / f"{index}.png"
+            )
+
+        planned = []
+        planned_when_started = []
+        iter_plan = ImageProcessor._iter_plan
+        convert = ImageProcessor._try_convert
+
+        def counting_iter_plan(processor, *args, **kwargs):
+            for job in iter_plan(processor, *args, **kwargs):
+                planned.append(job.source)
+                yield job
+
+        def try_convert(processor, job):
+            planned_when_started.append(len(planned))
+            return convert(processor, job)
+
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(20, 20),
+            jobs=2,
+            executor=ExecutorType.THREAD,
+            max_memory=2**30,
+        )
+        with patch("src.img_to_webp._image_processor._REORDER_WINDOW", 2):
+            with patch.object(ImageProcessor, "_iter_plan", counting_iter_plan):
+                with patch.object(ImageProcessor, "_try_convert", try_convert):
+                    processor.process_all_images()
+
+        self.assertLess(planned_when_started[0], 6)
+        self.assertEqual(len(list(self._output_dir.glob("*.webp"))), 6)
+
+    def test_largest_first_within_budget(self):
+        for path in self._input_dir.iterdir():
+            path.unlink()
+        sizes = {
+            "small.png": (100, 100),
+            "large.png": (600, 400),
+            "mid.png": (300, 300),
+        }
+        for name, size in sizes.items():
+            Image.new("RGB", size, "red").save(self._input_dir / name)
+
+        started = []
+        running = []
+        peak = []
+        convert = ImageProcessor._try_convert
+
+        def try_convert(processor, job):
+            started.append(job.source)
+            running.append(job.source)
+            peak.append(len(running))
+            time.sleep(0.05)
+            try:
+                return convert(processor, job)
+            finally:
+                running.remove(job.source)
+
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+            jobs=2,
+            executor=ExecutorType.THREAD,
+            # Too little for any two images at once; the largest is admitted alone.
+            max_memory=estimate_memory(300 * 300, 50 * 50, tiled=False),
+        )
+        with patch.object(ImageProcessor, "_try_convert", try_convert):
+            processor.process_all_images()
+
+        self.assertEqual(started, ["large.png", "mid.png", "small.png"])
+        self.assertEqual(max(peak), 1)
+        self.assertEqual(len(list(self._output_dir.glob("*.webp"))), 3)
@@ -0,0 +1,181 @@
+import csv
+import json
+
+from PIL import Image
+
+from src.img_to_webp import (
+    SUPPORTED_FORMATS,
+    ExecutorType,
+    ImageMetrics,
+    ImageProcessor,
+    PipelineStage,
+    RunReport,
+    Variant,
+)
+from src.img_to_webp._metrics import DedupStats
+from .base_test import BaseTest
+
+
+class TestMetrics(BaseTest):
+    def _processor(self, **kwargs) -> ImageProcessor:
+        return ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+            **kwargs,
+        )
+
+    def test_hooks_receive_every_image(self):
+        for jobs in [1, 2]:
+            with self.subTest(jobs=jobs):
+                received = []
+                self._processor(
+                    hooks=[received.append],
+                    jobs=jobs,
+                    executor=ExecutorType.THREAD,
+                    overwrite=True,
+                ).process_all_images()
+
+                self.assertEqual(
+                    len(received), len(SUPPORTED_FORMATS) * len(self.SIZES)
+                )
+                for metrics in received:
+                    self.assertGreater(metrics.input_bytes, 0)
+                    self.assertGreater(metrics.output_bytes, 0)
+                    self.assertIsNotNone(metrics.compression_ratio)
+                    self.assertEqual(
+                        metrics.output_bytes,
+                        (self._output_dir / metrics.source)
+                        .with_suffix(".webp")
+                        .stat()
+                        .st_size,
+                    )
+                    self.assertEqual(
+                        set(metrics.stage_seconds),
+                        {"decode", "convert", "resize", "encode", "write"},
+                    )
+                    self.assertGreaterEqual(min(metrics.stage_seconds.values()), 0)
+
+    def test_variant_metrics(self):
+        img_path = self._input_dir / "photo.png"
+        Image.new("RGB", (400, 300), color="red").save(img_path)
+        received = []
+        self._processor(
+            hooks=[received.append],
+            variants=[Variant((100, 100)), Variant((40, 40))],
+        ).process_image(img_path)
+
+        (metrics,) = received
+        self.assertEqual(metrics.source, "photo.png")
+        self.assertEqual(metrics.input_pixels, 400 * 300)
+        self.assertEqual(metrics.output_pixels, 100 * 75 + 40 * 30)
+        self.assertEqual(
+            metrics.output_bytes,
+            sum(p.stat().st_size for p in self._output_dir.glob("photo_*.webp")),
+        )
+
+    def test_disabled_by_default(self):
+        processor = self._processor()
+        self.assertFalse(processor._instrumented)
+        processor.process_all_images()
+
+    def test_reports_written_with_process_pool(self):
+        report_path = self._output_dir / "report.json"
+        csv_path = self._output_dir / "report.csv"
+        prom_path = self._output_dir / "img_to_webp.prom"
+        self._output_dir.mkdir()
+        self._processor(
+            report=str(report_path),
+            prometheus_file=str(prom_path),
+            jobs=2,
+        ).process_all_images()
+
+        with open(report_path) as file:
+            report = json.load(file)
+        images = len(SUPPORTED_FORMATS) * len(self.SIZES)
+        self.assertEqual(report["summary"]["images"], images)
+        self.assertEqual(len(report["images"]), images)
+        self.assertEqual(
+            report["summary"]["output_bytes"],
+            sum(p.stat().st_size for p in self._output_dir.rglob("*.webp")),
+        )
+
+        prometheus = prom_path.read_text()
+        self.assertIn(f"img_to_webp_images_total {images}", prometheus)
+        self.assertIn('img_to_webp_stage_seconds{stage="encode"}', prometheus)
+
+        self._processor(report=str(csv_path), overwrite=True).process_all_images()
+        with open(csv_path, newline="") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), images)
+        self.assertIn("compression_ratio", rows[0])
+
+    def test_run_report_summary(self):
+        report = RunReport()
+        for source, output_bytes in [("a.png", 50), ("b.png", 150)]:
+            metrics = ImageMetrics(source, input_bytes=400, output_bytes=output_bytes)
+            metrics.stage_seconds[str(PipelineStage.ENCODE)] = 0.5
+            report(metrics)
+
+        summary = report.summarize()
+        self.assertEqual(summary["images"], 2)
+        self.assertEqual(summary["stage_seconds"]["encode"], 1.0)
+        self.assertEqual(summary["stage_mean_seconds"]["encode"], 0.5)
+        self.assertEqual(summary["compression_ratio"], 4.0)
+        self.assertIsNone(RunReport().summarize()["compression_ratio"])
+
+    def test_run_report_load_and_merge(self):
+        self._output_dir.mkdir()
+        report = RunReport()
+        report(ImageMetrics("a.png", input_bytes=400, output_bytes=50))
+        report.images[0].compressions = ["lossy", "lossy"]
+        report.dedup = DedupStats(1, 50, 0.5)
+
+        for name in ["report.json", "report.csv"]:
+            with self.subTest(name=name):
+                path = str(self._output_dir / name)
+                report.write(path)
+                loaded = RunReport.load(path)
+                self.assertEqual(
+                    [m.to_dict() for m in loaded.images],
+                    [m.to_dict() for m in report.images],
+                )
+
+        merged = RunReport.load(str(self._output_dir / "report.json"))
+        merged.merge(RunReport.load(str(self._output_dir / "report.json")))
+        summary = merged.summarize()
+        self.assertEqual(summary["images"], 2)
+        self.assertEqual(summary["output_bytes"], 100)
+        self.assertEqual(summary["dedup"]["bytes_saved"], 100)
+
+    def test_run_report_keep_recent(self):
+        self._output_dir.mkdir()
+        report = RunReport()
+        report(ImageMetrics("a.png", input_bytes=400, output_bytes=50))
+        report.keep_recent(2)
+        for source in ["b.png", "c.png", "d.png"]:
+            report(ImageMetrics(source, input_bytes=400, output_bytes=50))
+        self.assertEqual([m.source for m in report.images], ["c.png", "d.png"])
+        self.assertEqual(report.summarize()["images"], 4)
+        self.assertEqual(report.summarize()["output_bytes"], 200)
+
+        path = str(self._output_dir / "report.json")
+        report.write(path)
+        loaded = RunReport.load(path)
+        self.assertEqual(len(loaded.images), 2)
+        self.assertEqual(loaded.summarize(), report.summarize())
+
+    def test_auto_compression_recorded(self):
+        report_path = self._output_dir / "report.json"
+        self._output_dir.mkdir()
+        with self.assertLogs() as cm:
+            self._processor(
+                report=str(report_path), compression="auto"
+            ).process_all_images()
+        self.assertIn("(lossless: colors 1, flat 1.00", "\n".join(cm.output))
+
+        with open(report_path) as file:
+            report = json.load(file)
+        images = len(SUPPORTED_FORMATS) * len(self.SIZES)
+        self.assertEqual(report["summary"]["compression"], {"lossless": images})
+        self.assertEqual(report["images"][0]["compression"], "lossless")
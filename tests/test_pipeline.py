@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+from unittest.mock import patch
+
+from parameterized import parameterized
+
+from src.img_to_webp import DedupMode, ExecutorType, ImageProcessor, Variant
+from src.img_to_webp._pipeline import prefetch, write_atomic
+from .base_test import BaseTest
+
+
+class TestPipeline(BaseTest):
+    def test_write_atomic(self):
+        self._output_dir.mkdir(parents=True)
+        path = self._output_dir / "image.webp"
+        path.write_bytes(b"old")
+        link = self._output_dir / "link.webp"
+        os.link(path, link)
+
+        write_atomic(path, b"new")
+        self.assertEqual(path.read_bytes(), b"new")
+        # Other hardlinks keep the previous contents.
+        self.assertEqual(link.read_bytes(), b"old")
+        self.assertEqual(
+            sorted(p.name for p in self._output_dir.iterdir()),
+            ["image.webp", "link.webp"],
+        )
+
+    def test_write_atomic_failure_keeps_previous_file(self):
+        self._output_dir.mkdir(parents=True)
+        path = self._output_dir / "image.webp"
+        path.write_bytes(b"old")
+        with patch("os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                write_atomic(path, b"new")
+        self.assertEqual(path.read_bytes(), b"old")
+        self.assertEqual([p.name for p in self._output_dir.iterdir()], ["image.webp"])
+
+    def test_prefetch_order_and_bound(self):
+        read = []
+        consumed = []
+        lock = threading.Lock()
+
+        def read_item(item):
+            with lock:
+                read.append(item)
+                # Never more than `count` items beyond the one being consumed.
+                self.assertLessEqual(item - len(consumed), 3)
+
+        for item in prefetch(range(20), read_item, 3):
+            self.assertIn(item, read)
+            consumed.append(item)
+        self.assertEqual(consumed, list(range(20)))
+
+    def test_prefetch_propagates_errors(self):
+        def read_item(item):
+            if item == 2:
+                raise ValueError(item)
+
+        with self.assertRaises(ValueError):
+            list(prefetch(range(5), read_item, 2))
+
+    def _outputs(self, output_dir) -> dict:
+        return {
+            path.relative_to(output_dir).as_posix(): path.read_bytes()
+            for path in output_dir.rglob("*")
+            if path.is_file() and not path.name.startswith(".img-to-webp")
+        }
+
+    @parameterized.expand(
+        [
+            ("sequential", 1, ExecutorType.THREAD),
+            ("threads", 2, ExecutorType.THREAD),
+            ("processes", 2, ExecutorType.PROCESS),
+        ]
+    )
+    def test_prefetch_matches_direct_conversion(self, _, jobs, executor):
+        for prefetch_count in [0, 3]:
+            ImageProcessor(
+                input_dir=str(self._input_dir),
+                output_dir=str(self._output_dir / str(prefetch_count)),
+                default_size=(60, 60),
+                jobs=jobs,
+                executor=executor,
+                incremental=True,
+                prefetch=prefetch_count,
+            ).process_all_images()
+
+        direct = self._outputs(self._output_dir / "0")
+        pipelined = self._outputs(self._output_dir / "3")
+        self.assertEqual(pipelined, direct)
+        self.assertEqual(len(direct), len(list(self._input_dir.iterdir())))
+        self.assertFalse(any(name.endswith(".tmp") for name in pipelined))
+        with open(self._output_dir / "3" / ".img-to-webp-manifest.jsonl") as file:
+            self.assertEqual(len(file.readlines()), len(direct))
+
+    def test_prefetch_with_dedup_and_variants(self):
+        (self._input_dir / "copy.png").write_bytes(
+            (self._input_dir / "test_image_100x200_png.png").read_bytes()
+        )
+        ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            variants=[Variant(size=(30, 30))],
+            dedup=DedupMode.HARDLINK,
+            prefetch=2,
+        ).process_all_images()
+
+        with open(self._output_dir / "copy.variants.json") as file:
+            index = json.load(file)
+        self.assertEqual(index["variants"][0]["path"], "copy_30x30.webp")
+        self.assertEqual(
+            (self._output_dir / "copy_30x30.webp").stat().st_ino,
+            (self._output_dir / "test_image_100x200_png_30x30.webp").stat().st_ino,
+        )
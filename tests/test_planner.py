@@ -0,0 +1,83 @@
+from PIL import Image
+
+from src.img_to_webp import (
+    SUPPORTED_FORMATS,
+    ImageProcessor,
+    JobPlan,
+    PlanAction,
+    ResizeMode,
+    ResizeRule,
+)
+from .base_test import BaseTest
+
+
+class TestPlanner(BaseTest):
+    def _processor(self, **kwargs) -> ImageProcessor:
+        return ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(100, 100),
+            **kwargs,
+        )
+
+    def test_dry_run_writes_nothing(self):
+        plan = self._processor().create_plan()
+        summary = plan.summarize()
+
+        self.assertFalse(self._output_dir.exists())
+        self.assertEqual(summary.convert, len(SUPPORTED_FORMATS) * len(self.SIZES))
+        self.assertEqual(
+            summary.input_pixels,
+            len(SUPPORTED_FORMATS) * sum(w * h for w, h in self.SIZES),
+        )
+        self.assertEqual(
+            summary.input_bytes,
+            sum(p.stat().st_size for p in self._input_dir.iterdir()),
+        )
+
+    def test_rules_resolved(self):
+        processor = self._processor(
+            resize_rules=[ResizeRule("test_image_100", (50, 50), "cover")],
+        )
+        for job in processor.create_plan(read_headers=False).jobs:
+            if job.source.startswith("test_image_100"):
+                self.assertEqual((job.size, job.mode), ((50, 50), ResizeMode.COVER))
+            else:
+                self.assertEqual((job.size, job.mode), ((100, 100), ResizeMode.CONTAIN))
+            self.assertIsNone(job.width)
+
+    def test_existing_outputs_skipped(self):
+        self._processor().process_all_images()
+        summary = self._processor().create_plan().summarize()
+        self.assertEqual(summary.convert, 0)
+        self.assertEqual(summary.skip, len(SUPPORTED_FORMATS) * len(self.SIZES))
+
+        summary = self._processor(overwrite=True).create_plan().summarize()
+        self.assertEqual(summary.convert, len(SUPPORTED_FORMATS) * len(self.SIZES))
+
+    def test_collisions_and_invalid_images(self):
+        Image.new("RGB", (10, 10)).save(self._input_dir / "logo.png")
+        Image.new("RGB", (10, 10)).save(self._input_dir / "logo.jpg")
+        (self._input_dir / "broken.png").touch()
+
+        plan = self._processor().create_plan()
+        summary = plan.summarize()
+        self.assertEqual(summary.collision, 1)
+        self.assertEqual(summary.invalid, 1)
+        collision = next(j for j in plan.jobs if j.action == PlanAction.COLLISION)
+        self.assertEqual(collision.output, "logo.webp")
+
+    def test_saved_plan_executed(self):
+        plan_path = self._input_dir / "plan.json"
+        self._processor(
+            resize_rules=[ResizeRule("test_image_100", (50, 50), "fill")],
+        ).create_plan().save(str(plan_path))
+
+        plan = JobPlan.load(str(plan_path))
+        ImageProcessor().execute_plan(plan)
+
+        webp_files = list(self._output_dir.rglob("*.webp"))
+        self.assertEqual(len(webp_files), len(SUPPORTED_FORMATS) * len(self.SIZES))
+        for webp_file in webp_files:
+            if webp_file.name.startswith("test_image_100"):
+                self.assertEqual(Image.open(webp_file).size, (50, 50))
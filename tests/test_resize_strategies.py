@@ -1,9 +1,41 @@
-from PIL import Image
+import io
 
-from src.img_to_webp import ResizeMode, ResizeStrategyFactory, ResizeStrategy
+from parameterized import parameterized
+from PIL import Image, ImageChops, ImageDraw, ImageStat
+
+from src.img_to_webp import (
+    Gravity,
+    ImageProcessor,
+    ResampleFilter,
+    ResizeMode,
+    ResizeRule,
+    ResizeStrategyFactory,
+    ResizeStrategy,
+)
+from src.img_to_webp._resize_strategy import get_resampling
 from .base_test import BaseTest
 
 
+def _detailed_on_one_side(size, side) -> Image.Image:
+    """A flat image with a checkerboard in the left, right, top or bottom third."""
+    img = Image.new("RGB", size, "gray")
+    draw = ImageDraw.Draw(img)
+    width, height = size
+    box = {
+        "left": (0, 0, width // 3, height),
+        "right": (width - width // 3, 0, width, height),
+        "top": (0, 0, width, height // 3),
+        "bottom": (0, height - height // 3, width, height),
+    }[side]
+    for x in range(box[0], box[2], 8):
+        for y in range(box[1], box[3], 8):
+            if (x // 8 + y // 8) % 2:
+                draw.rectangle((x, y, x + 7, y + 7), fill="white")
+            else:
+                draw.rectangle((x, y, x + 7, y + 7), fill="black")
+    return img
+
+
 class TestResizeStrategies(BaseTest):
     def test_image_resize_cover(self):
         strategy = ResizeStrategyFactory.get_strategy(ResizeMode.COVER)
@@ -15,6 +47,220 @@ class TestResizeStrategies(BaseTest):
                 new_img = strategy.resize(img, crop_size)
                 self.assertEqual(new_img.size, new_size)
 
+    def test_cover_matches_resize_then_crop(self):
+        img = Image.radial_gradient("L").resize((600, 300)).convert("RGB")
+        expected = img.resize((200, 100), Image.Resampling.LANCZOS).crop(
+            (50, 0, 150, 100)
+        )
+        cover = ResizeStrategyFactory.get_strategy(ResizeMode.COVER)
+        self.assertEqual(cover.get_box(img, (100, 100)), (150, 0, 450, 300))
+        resized = cover.resize(img, (100, 100))
+        self.assertLess(
+            ImageStat.Stat(ImageChops.difference(resized, expected)).mean[0], 1
+        )
+
+    @parameterized.expand(
+        [
+            ("left", (0.0, 0.5), (0, 0, 300, 300)),
+            ("right", (1.0, 0.5), (300, 0, 600, 300)),
+            ("inside", (0.4, 0.5), (90, 0, 390, 300)),
+        ]
+    )
+    def test_cover_focal_point(self, _, focal_point, expected_box):
+        img = Image.new("RGB", (600, 300))
+        cover = ResizeStrategyFactory.get_strategy(
+            ResizeMode.COVER, focal_point=focal_point
+        )
+        self.assertEqual(cover.get_box(img, (100, 100)), expected_box)
+
+    @parameterized.expand(
+        [
+            (f"{gravity}_{side}", gravity, side)
+            for gravity in [Gravity.ENTROPY, Gravity.ATTENTION]
+            for side in ["left", "right", "top", "bottom"]
+        ]
+    )
+    def test_cover_gravity_finds_detail(self, _, gravity, side):
+        size = (900, 300) if side in ("left", "right") else (300, 900)
+        img = _detailed_on_one_side(size, side)
+        cover = ResizeStrategyFactory.get_strategy(ResizeMode.COVER, gravity)
+        left, top, right, bottom = cover.get_box(img, (100, 100))
+        self.assertEqual((right - left, bottom - top), (300, 300))
+        distance = {"left": left, "right": size[0] - right, "top": top}.get(
+            side, size[1] - bottom
+        )
+        # Entropy also rewards a little of the flat area, so the box may overlap it.
+        self.assertLess(distance, 75)
+        self.assertEqual(cover.resize(img, (100, 100)).size, (100, 100))
+
+    def test_cover_gravity_flat_image_centred(self):
+        img = Image.new("RGB", (900, 300), "gray")
+        for gravity in Gravity:
+            cover = ResizeStrategyFactory.get_strategy(ResizeMode.COVER, gravity)
+            self.assertEqual(cover.get_box(img, (100, 100)), (300, 0, 600, 300))
+
+    def test_rule_gravity(self):
+        for path in self._input_dir.iterdir():
+            path.unlink()
+        _detailed_on_one_side((900, 300), "right").save(self._input_dir / "a.png")
+        _detailed_on_one_side((900, 300), "right").save(self._input_dir / "b.png")
+        ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(100, 100),
+            default_resize_mode=ResizeMode.COVER,
+            resize_rules=[ResizeRule(r"b\.png", gravity="entropy")],
+        ).process_all_images()
+
+        with Image.open(self._output_dir / "a.webp") as centred:
+            self.assertLess(ImageStat.Stat(centred.convert("L")).stddev[0], 5)
+        with Image.open(self._output_dir / "b.webp") as detailed:
+            self.assertGreater(ImageStat.Stat(detailed.convert("L")).stddev[0], 50)
+
+    @parameterized.expand(
+        [
+            (
+                "lanczos",
+                ResampleFilter.LANCZOS,
+                None,
+                0.5,
+                (Image.Resampling.LANCZOS, None),
+            ),
+            ("box", ResampleFilter.BOX, None, 0.5, (Image.Resampling.BOX, None)),
+            ("fast", ResampleFilter.FAST, None, 0.5, (Image.Resampling.BILINEAR, 2.0)),
+            (
+                "quality",
+                ResampleFilter.QUALITY,
+                None,
+                0.1,
+                (Image.Resampling.LANCZOS, None),
+            ),
+            (
+                "auto_upscale",
+                ResampleFilter.AUTO,
+                None,
+                2.0,
+                (Image.Resampling.BICUBIC, None),
+            ),
+            (
+                "auto_mild",
+                ResampleFilter.AUTO,
+                None,
+                0.5,
+                (Image.Resampling.BICUBIC, None),
+            ),
+            (
+                "auto_thumbnail",
+                ResampleFilter.AUTO,
+                None,
+                0.1,
+                (Image.Resampling.LANCZOS, 2.0),
+            ),
+            (
+                "gap_override",
+                ResampleFilter.FAST,
+                3.0,
+                0.5,
+                (Image.Resampling.BILINEAR, 3.0),
+            ),
+        ]
+    )
+    def test_get_resampling(self, _, resample, reducing_gap, scale, expected):
+        self.assertEqual(get_resampling(resample, reducing_gap, scale), expected)
+
+    def test_default_resampling_unchanged(self):
+        img = Image.radial_gradient("L").resize((600, 400)).convert("RGB")
+        fill = ResizeStrategyFactory.get_strategy(ResizeMode.FILL)
+        self.assertEqual(
+            fill.resize(img, (90, 30)).tobytes(),
+            img.resize((90, 30), Image.Resampling.LANCZOS).tobytes(),
+        )
+        expected = img.copy()
+        expected.thumbnail((90, 90), Image.Resampling.LANCZOS)
+        contain = ResizeStrategyFactory.get_strategy(ResizeMode.CONTAIN)
+        self.assertEqual(
+            contain.resize(img.copy(), (90, 90)).tobytes(), expected.tobytes()
+        )
+
+    @parameterized.expand([(str(resample), resample) for resample in ResampleFilter])
+    def test_resample_sizes(self, _, resample):
+        img = Image.radial_gradient("L").resize((600, 400)).convert("RGB")
+        for mode, expected in [
+            (ResizeMode.COVER, (50, 50)),
+            (ResizeMode.CONTAIN, (50, 33)),
+            (ResizeMode.FILL, (50, 50)),
+        ]:
+            strategy = ResizeStrategyFactory.get_strategy(mode, resample=resample)
+            self.assertEqual(strategy.resize(img.copy(), (50, 50)).size, expected)
+
+    def test_rule_resample(self):
+        processor = ImageProcessor(
+            default_size=(100, 100),
+            resize_rules=[ResizeRule("icon_", resample="fast", reducing_gap=3.0)],
+        )
+        self.assertEqual(
+            processor._get_resampling("icon_a.png"), (ResampleFilter.FAST, 3.0)
+        )
+        self.assertEqual(
+            processor._get_resampling("photo.png"), (ResampleFilter.LANCZOS, None)
+        )
+        self.assertNotEqual(
+            processor.render_key("icon_a.png"), processor.render_key("photo.png")
+        )
+        with self.assertRaises(ValueError):
+            ResizeRule("icon_", reducing_gap=0.5)
+
+    @parameterized.expand(
+        [
+            ("cover_icon", ResizeMode.COVER, (64, 64), (256, 256), (64, 64)),
+            ("cover_wide", ResizeMode.COVER, (100, 50), (300, 300), (50, 50)),
+            ("cover_one_side", ResizeMode.COVER, (100, 50), (60, 90), (33, 50)),
+            ("cover_smaller", ResizeMode.COVER, (400, 200), (100, 100), (100, 100)),
+            ("fill_icon", ResizeMode.FILL, (64, 64), (256, 32), (64, 32)),
+            ("contain_icon", ResizeMode.CONTAIN, (64, 64), (256, 256), (64, 64)),
+        ]
+    )
+    def test_no_upscale(self, _, mode, img_size, size, expected):
+        img = Image.new("RGB", img_size, "red")
+        strategy = ResizeStrategyFactory.get_strategy(mode, no_upscale=True)
+        self.assertEqual(strategy.get_size(img_size, size), expected)
+        self.assertEqual(strategy.resize(img, size).size, expected)
+        self.assertLessEqual(strategy.get_scale(img_size, size), 1.0)
+
+    def test_no_upscale_cover_only_crops(self):
+        img = Image.effect_noise((100, 50), 64).convert("RGB")
+        cover = ResizeStrategyFactory.get_strategy(ResizeMode.COVER, no_upscale=True)
+        self.assertEqual(cover.get_target(img, (300, 300)).box, (25, 0, 75, 50))
+        resized = cover.resize(img, (300, 300))
+        self.assertIsNone(
+            ImageChops.difference(resized, img.crop((25, 0, 75, 50))).getbbox()
+        )
+
+    def test_resize_at_target_size_keeps_image(self):
+        img = Image.new("RGB", (120, 80), "red")
+        for mode in ResizeMode:
+            strategy = ResizeStrategyFactory.get_strategy(mode)
+            self.assertEqual(strategy.get_size(img.size, (120, 80)), (120, 80))
+            self.assertIs(strategy.resize(img, (120, 80)), img)
+
+    def test_rule_no_upscale(self):
+        processor = ImageProcessor(
+            default_size=(256, 256),
+            default_resize_mode=ResizeMode.COVER,
+            resize_rules=[ResizeRule("icon_", no_upscale=True)],
+        )
+        self.assertTrue(processor._get_no_upscale("icon_a.png"))
+        self.assertFalse(processor._get_no_upscale("photo.png"))
+        self.assertNotEqual(
+            processor.render_key("icon_a.png"), processor.render_key("photo.png")
+        )
+        icon = io.BytesIO()
+        Image.new("RGB", (64, 64), "red").save(icon, "PNG")
+        for filename, expected in [("icon_a.png", (64, 64)), ("photo.png", (256, 256))]:
+            output = processor.convert_bytes(icon.getvalue(), filename)
+            with Image.open(io.BytesIO(output)) as img:
+                self.assertEqual(img.size, expected)
+
     def test_image_resize_contain(self):
         strategy = ResizeStrategyFactory.get_strategy(ResizeMode.CONTAIN)
         for crop_size in self.CROP_SIZES:
@@ -46,6 +292,20 @@ class TestResizeStrategies(BaseTest):
             new_img = strategy.resize(img, (100, 100))
             self.assertEqual(new_img.size, img.size)
 
+    def test_get_scale(self):
+        img_size, size = (400, 200), (100, 100)
+        expected_scales = {
+            ResizeMode.COVER: 0.5,
+            ResizeMode.CONTAIN: 0.25,
+            ResizeMode.FILL: 0.5,
+            ResizeMode.NONE: 1.0,
+        }
+        for mode, expected_scale in expected_scales.items():
+            strategy = ResizeStrategyFactory.get_strategy(mode)
+            self.assertEqual(strategy.get_scale(img_size, size), expected_scale)
+        contain = ResizeStrategyFactory.get_strategy(ResizeMode.CONTAIN)
+        self.assertEqual(contain.get_scale((50, 50), size), 1.0)
+
     def test_invalid_strategy(self):
         img = Image.new("RGB", (100, 100), color="white")
         with self.assertRaises(TypeError):
@@ -0,0 +1,108 @@
+import re
+import unittest
+
+from src.img_to_webp import ImageProcessor, ResizeRule
+from src.img_to_webp._rule_matcher import RuleMatcher
+
+PATTERNS = [
+    "sku_1001_",
+    "^sku_1002",
+    "banner.*",
+    "hero_large.jpg$",
+    r"hero\.png$",
+    r".*_small\.png$",
+    r".*_thumb\.jpg",
+    ".*_large.*",
+    r"img_\d+",
+    "(?i)logo",
+    r"(a)\1",
+    r"\.*x",
+    "icon|avatar",
+]
+
+FILENAMES = [
+    "sku_1001_front.jpg",
+    "sku_1002_back.png",
+    "sku_10_front.jpg",
+    "banner_home.png",
+    "hero_large.jpg",
+    "hero_large.jpgx",
+    "hero.png",
+    "heroxpng",
+    "photo_small.png",
+    "photo_small.png.bak",
+    "photo_thumb.jpg",
+    "photo_thumb.jpg.png",
+    "photo_large_v2.gif",
+    "img_42.bmp",
+    "img_x.bmp",
+    "LOGO.png",
+    "aa.png",
+    "...x",
+    "avatar.png",
+    "nothing.tiff",
+    "",
+]
+
+
+class TestRuleMatcher(unittest.TestCase):
+    @staticmethod
+    def _expected(rules, filename):
+        return next((r for r in rules if re.match(r.pattern, filename)), None)
+
+    def test_matches_like_re_match(self):
+        for patterns in [PATTERNS, PATTERNS[::-1], PATTERNS[:9], PATTERNS[9:]]:
+            rules = [ResizeRule(p, (10, 10)) for p in patterns]
+            matcher = RuleMatcher(rules)
+            for filename in FILENAMES:
+                with self.subTest(patterns=patterns, filename=filename):
+                    self.assertIs(
+                        matcher.match(filename), self._expected(rules, filename)
+                    )
+                    self.assertIs(
+                        matcher.match(filename), self._expected(rules, filename)
+                    )
+
+    def test_first_rule_wins_across_indexes(self):
+        rules = [
+            ResizeRule(".*_small.*", (10, 10)),
+            ResizeRule("sku_", (20, 20)),
+            ResizeRule(r".*\.png$", (30, 30)),
+        ]
+        matcher = RuleMatcher(rules)
+        self.assertIs(matcher.match("sku_1_small.png"), rules[0])
+        self.assertIs(matcher.match("sku_1.png"), rules[1])
+        self.assertIs(matcher.match("other.png"), rules[2])
+
+    def test_inline_flags_stay_with_their_rule(self):
+        # Python 3.9 and 3.10 apply a mid-pattern "(?i)" to the whole pattern,
+        # so it must not end up in the alternation with other rules.
+        rules = [
+            ResizeRule(r"photo_\d+", (10, 10)),
+            ResizeRule("(?i)logo", (20, 20)),
+            ResizeRule(r"img_\d+", (30, 30)),
+        ]
+        matcher = RuleMatcher(rules)
+        self.assertIsNotNone(matcher._combined)
+        self.assertNotIn("(?i)", matcher._combined.pattern)
+        self.assertEqual(matcher._combined.flags, re.compile("").flags)
+        self.assertIsNone(matcher.match("PHOTO_1.png"))
+        self.assertIsNone(matcher.match("IMG_1.png"))
+        self.assertIs(matcher.match("LOGO.png"), rules[1])
+        self.assertIs(matcher.match("img_1.png"), rules[2])
+
+    def test_many_literal_rules(self):
+        rules = [ResizeRule(f"sku_{i:05d}_", (i + 1, i + 1)) for i in range(1000)]
+        matcher = RuleMatcher(rules)
+        self.assertIs(matcher.match("sku_00500_front.jpg"), rules[500])
+        self.assertIsNone(matcher.match("sku_x.jpg"))
+
+    def test_invalid_pattern_rejected(self):
+        with self.assertRaises(ValueError):
+            RuleMatcher([ResizeRule("*.jpg", (10, 10))])
+        with self.assertRaises(ValueError):
+            ImageProcessor(resize_rules=[ResizeRule("[abc", (10, 10))])
+
+
+if __name__ == "__main__":
+    unittest.main()
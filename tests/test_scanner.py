@@ -0,0 +1,102 @@
+import os
+from pathlib import Path
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import SUPPORTED_FORMATS, ImageProcessor
+from src.img_to_webp._scanner import DirectoryScanner
+from .base_test import BaseTest
+
+FILES = [
+    "a.png",
+    "notes.txt",
+    "photos/b.JPG",
+    "photos/thumbs/b_thumb.jpg",
+    "photos/2024/c.gif",
+    ".cache/d.png",
+    "photos/.e.png",
+    "output/f.png",
+]
+
+
+class TestScanner(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self._root = self._input_dir / "tree"
+        for name in FILES:
+            path = self._root / name
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+
+    def _scan(self, **kwargs) -> set:
+        scanner = DirectoryScanner(self._root, SUPPORTED_FORMATS, **kwargs)
+        paths = {path.relative_to(self._root).as_posix() for path in scanner}
+        # Watch mode and the server filter single paths with the same rules.
+        accepted = {name for name in FILES if scanner.accepts(Path(name))}
+        self.assertEqual(accepted, paths)
+        return paths
+
+    @parameterized.expand(
+        [
+            (
+                "defaults",
+                {},
+                {
+                    "a.png",
+                    "photos/b.JPG",
+                    "photos/thumbs/b_thumb.jpg",
+                    "photos/2024/c.gif",
+                    ".cache/d.png",
+                    "photos/.e.png",
+                    "output/f.png",
+                },
+            ),
+            (
+                "include",
+                # Globs are case-sensitive, unlike the supported suffixes.
+                {"include": ["*.jpg", "photos/2024/*"]},
+                {"photos/thumbs/b_thumb.jpg", "photos/2024/c.gif"},
+            ),
+            (
+                "exclude",
+                {"exclude": ["thumbs", "photos/2024", "a.*"]},
+                {"photos/b.JPG", ".cache/d.png", "photos/.e.png", "output/f.png"},
+            ),
+            ("max_depth", {"max_depth": 0}, {"a.png"}),
+            (
+                "skip_hidden_and_prune",
+                {"skip_hidden": True, "prune": [Path("output")], "max_depth": 1},
+                {"a.png", "photos/b.JPG"},
+            ),
+        ]
+    )
+    def test_filters(self, _, kwargs, expected):
+        self.assertEqual(self._scan(**kwargs), expected)
+
+    def test_symlinks(self):
+        os.symlink("..", self._root / "photos" / "loop")
+        os.symlink(self._root.resolve() / "photos", self._root / "linked")
+
+        # Not followed by default.
+        self.assertNotIn("linked/b.JPG", self._scan())
+
+        scanner = DirectoryScanner(self._root, SUPPORTED_FORMATS, follow_symlinks=True)
+        paths = [path.relative_to(self._root).as_posix() for path in scanner]
+        # Each directory is scanned once, through whichever link came first.
+        self.assertEqual(len(paths), 7)
+        self.assertEqual(len({Path(path).name for path in paths}), 7)
+
+    def test_output_dir_pruned(self):
+        output_dir = self._input_dir / "webp"
+        output_dir.mkdir()
+        Image.new("RGB", (10, 10)).save(output_dir / "stray.png")
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(output_dir),
+            default_size=(10, 10),
+        )
+        plan = processor.create_plan(read_headers=False)
+        sources = {job.source for job in plan.jobs}
+        self.assertIn("tree/a.png", sources)
+        self.assertNotIn("webp/stray.png", sources)
@@ -0,0 +1,200 @@
+import asyncio
+import io
+import time
+import urllib.error
+import urllib.request
+
+from PIL import Image
+
+from src.img_to_webp import ExecutorType, ImageProcessor, ImageServer
+from src.img_to_webp._server import LRUCache, _etag_matches
+from .base_test import BaseTest
+
+
+class TestServer(BaseTest):
+    def setUp(self):
+        super().setUp()
+        Image.new("RGB", (400, 200), "red").save(self._input_dir / "photo.png")
+
+    def _server(self, **kwargs) -> ImageServer:
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            default_size=(100, 100),
+            jobs=2,
+            executor=ExecutorType.THREAD,
+        )
+        return ImageServer(processor, port=0, **kwargs)
+
+    def _serve(self, server: ImageServer, *requests):
+        """Starts the server, then performs each request concurrently in a thread."""
+
+        def get(target, headers):
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{server.port}{target}", headers=headers
+            )
+            try:
+                with urllib.request.urlopen(request) as response:
+                    return response.status, dict(response.headers), response.read()
+            except urllib.error.HTTPError as e:
+                return e.code, dict(e.headers), e.read()
+
+        async def run():
+            await server.start()
+            try:
+                loop = asyncio.get_running_loop()
+                return await asyncio.gather(
+                    *(
+                        loop.run_in_executor(None, get, target, headers)
+                        for target, headers in requests
+                    )
+                )
+            finally:
+                await server.close()
+
+        return asyncio.run(run())
+
+    def test_query_parameters(self):
+        server = self._server()
+        responses = self._serve(
+            server,
+            ("/photo.png", {}),
+            ("/photo.png?w=50&h=50&mode=cover&q=60", {}),
+            ("/photo.png?w=300", {}),
+        )
+        sizes = []
+        for status, headers, body in responses:
+            self.assertEqual(status, 200)
+            self.assertEqual(headers["Content-Type"], "image/webp")
+            with Image.open(io.BytesIO(body)) as img:
+                sizes.append(img.size)
+        self.assertEqual(sizes, [(100, 50), (50, 50), (300, 150)])
+
+    def test_errors(self):
+        (self._input_dir / "broken.png").write_bytes(b"not an image")
+        responses = self._serve(
+            self._server(),
+            ("/missing.png", {}),
+            ("/../tests/input/photo.png", {}),
+            ("/photo.png?w=abc", {}),
+            ("/photo.png?w=50&mode=cover", {}),
+            ("/photo.png?q=101", {}),
+            ("/broken.png", {}),
+        )
+        self.assertEqual(
+            [status for status, _, _ in responses], [404, 404, 400, 400, 400, 415]
+        )
+
+    def test_concurrent_requests_coalesced(self):
+        server = self._server()
+        render = server._processor.render
+
+        def slow_render(*args):
+            time.sleep(0.3)
+            return render(*args)
+
+        server._processor.render = slow_render
+        responses = self._serve(server, *[("/photo.png?w=64", {})] * 4)
+        self.assertEqual(len({body for _, _, body in responses}), 1)
+        # Every request waited for the same conversion.
+        self.assertEqual({headers["X-Cache"] for _, headers, _ in responses}, {"miss"})
+        self.assertEqual(server.conversions, 1)
+
+    def test_etag_and_memory_cache(self):
+        server = self._server()
+        ((_, headers, _),) = self._serve(server, ("/photo.png?w=64", {}))
+        self.assertEqual(headers["X-Cache"], "miss")
+        etag = headers["ETag"]
+
+        (cached, not_modified, other) = self._serve(
+            server,
+            ("/photo.png?w=64", {}),
+            ("/photo.png?w=64", {"If-None-Match": etag}),
+            ("/photo.png?w=65", {"If-None-Match": etag}),
+        )
+        self.assertEqual(cached[1]["X-Cache"], "memory")
+        self.assertEqual(cached[1]["ETag"], etag)
+        self.assertEqual(not_modified[0], 304)
+        self.assertEqual(not_modified[2], b"")
+        self.assertEqual(other[0], 200)
+        self.assertEqual(server.conversions, 2)
+
+        # A modified source gets a new ETag.
+        Image.new("RGB", (400, 200), "blue").save(self._input_dir / "photo.png")
+        ((status, headers, _),) = self._serve(
+            server, ("/photo.png?w=64", {"If-None-Match": etag})
+        )
+        self.assertEqual(status, 200)
+        self.assertNotEqual(headers["ETag"], etag)
+
+    def test_etag_matching(self):
+        etag = '"abc"'
+        for header, expected in [
+            ('"abc"', True),
+            ('"x", W/"abc"', True),
+            ("*", True),
+            ('"abcd"', False),
+            ('"a,b", "ab"', False),
+            ('"abc', False),
+            ("", False),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(_etag_matches(header, etag), expected)
+
+    def test_cancelled_request_does_not_cancel_others(self):
+        server = self._server()
+        render = server._processor.render
+
+        def slow_render(*args):
+            time.sleep(0.3)
+            return render(*args)
+
+        server._processor.render = slow_render
+        img_path = self._input_dir / "photo.png"
+
+        async def run():
+            await server.start()
+            try:
+                first, second = [
+                    asyncio.ensure_future(
+                        server._get_output("key", img_path, (64, 64), None, None)
+                    )
+                    for _ in range(2)
+                ]
+                await asyncio.sleep(0.1)
+                first.cancel()
+                return await second, first.cancelled()
+            finally:
+                await server.close()
+
+        (data, cache), cancelled = asyncio.run(run())
+        self.assertTrue(cancelled)
+        self.assertEqual(cache, "miss")
+        with Image.open(io.BytesIO(data)) as img:
+            self.assertEqual(img.format, "WEBP")
+        self.assertEqual(server.conversions, 1)
+
+    def test_disk_cache(self):
+        cache_dir = self._output_dir / "cache"
+        ((_, first, body),) = self._serve(
+            self._server(cache_dir=str(cache_dir)), ("/photo.png?w=64", {})
+        )
+        self.assertEqual(len(list(cache_dir.rglob("*.webp"))), 1)
+
+        server = self._server(cache_dir=str(cache_dir))
+        ((_, second, cached_body),) = self._serve(server, ("/photo.png?w=64", {}))
+        self.assertEqual(second["X-Cache"], "disk")
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(cached_body, body)
+        self.assertEqual(server.conversions, 0)
+
+    def test_lru_cache(self):
+        cache = LRUCache(max_bytes=10)
+        cache.put("a", b"aaaa")
+        cache.put("b", b"bbbb")
+        cache.get("a")
+        cache.put("c", b"cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), b"aaaa")
+        self.assertEqual(cache.size, 8)
+        cache.put("d", b"d" * 11)
+        self.assertIsNone(cache.get("d"))
@@ -0,0 +1,105 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import ImageProcessor
+from src.img_to_webp._manifest import MANIFEST_FILENAME
+from src.img_to_webp._shard import Shard, merge_shard_reports
+from .base_test import BaseTest
+
+COUNT = 3
+
+
+def _run_shard(input_dir: str, output_dir: str, report: str, shard: str):
+    ImageProcessor(
+        input_dir=input_dir,
+        output_dir=output_dir,
+        default_size=(50, 50),
+        incremental=True,
+        report=report,
+        shard=shard,
+    ).process_all_images()
+
+
+class TestShard(BaseTest):
+    def setUp(self):
+        super().setUp()
+        (self._input_dir / "sub").mkdir()
+        for i in range(10):
+            Image.new("RGB", (60, 40)).save(self._input_dir / "sub" / f"{i}.png")
+        for name in ["pair.png", "pair.jpg"]:
+            Image.new("RGB", (60, 40)).save(self._input_dir / "sub" / name)
+        self._report = self._output_dir / "report.json"
+
+    def _sources(self, shard) -> set:
+        plan = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+            shard=shard,
+        ).create_plan(read_headers=False)
+        return {job.source for job in plan.jobs}
+
+    @parameterized.expand(
+        [("2/4", Shard(2, 4)), (" 1/1 ", Shard(1, 1))],
+    )
+    def test_parse(self, text, expected):
+        self.assertEqual(Shard.parse(text), expected)
+
+    @parameterized.expand([("0/4",), ("5/4",), ("1",), ("a/b",)])
+    def test_parse_invalid(self, text):
+        with self.assertRaises(ValueError):
+            Shard.parse(text)
+
+    def test_path(self):
+        self.assertEqual(
+            Shard(2, 4).path(Path("out/report.json")),
+            Path("out/report.shard-2-of-4.json"),
+        )
+
+    def test_sources_partitioned(self):
+        shards = [self._sources(f"{index}/{COUNT}") for index in range(1, COUNT + 1)]
+        self.assertEqual(set().union(*shards), self._sources(None))
+        self.assertEqual(sum(len(sources) for sources in shards), 48)
+        for sources in shards:
+            # Sources with the same output name stay together.
+            self.assertEqual("sub/pair.png" in sources, "sub/pair.jpg" in sources)
+
+    def test_parallel_shards_merged(self):
+        # One process per shard, as on separate machines sharing the tree.
+        with ProcessPoolExecutor(COUNT) as executor:
+            futures = [
+                executor.submit(
+                    _run_shard,
+                    str(self._input_dir),
+                    str(self._output_dir),
+                    str(self._report),
+                    f"{index}/{COUNT}",
+                )
+                for index in range(1, COUNT + 1)
+            ]
+            for future in futures:
+                future.result()
+
+        # The two "pair" sources collide, so one of them is skipped.
+        self.assertEqual(len(list(self._output_dir.rglob("*.webp"))), 47)
+        for index in range(1, COUNT + 1):
+            shard = Shard(index, COUNT)
+            self.assertTrue(shard.path(self._output_dir / MANIFEST_FILENAME).exists())
+            with open(shard.path(self._report)) as file:
+                self.assertEqual(json.load(file)["summary"]["shard"], str(shard))
+
+        merged = merge_shard_reports(self._report)
+        self.assertEqual(len(merged.images), 47)
+        with open(self._report) as file:
+            self.assertEqual(json.load(file)["summary"]["images"], 47)
+
+    def test_missing_shard_report(self):
+        _run_shard(
+            str(self._input_dir), str(self._output_dir), str(self._report), "1/2"
+        )
+        with self.assertRaisesRegex(ValueError, "2/2"):
+            merge_shard_reports(self._report)
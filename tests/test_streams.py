@@ -0,0 +1,80 @@
+import io
+import unittest
+from unittest.mock import patch
+
+from PIL import Image, UnidentifiedImageError
+
+from src.img_to_webp import ImageProcessor, ResizeMode, ResizeRule
+from src.img_to_webp._streams import BufferReader, open_buffer
+
+
+class TestStreams(unittest.TestCase):
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 200), color="blue").save(buffer, "PNG")
+        self._png = buffer.getvalue()
+        self._processor = ImageProcessor(
+            default_size=(100, 100),
+            default_resize_mode=ResizeMode.FILL,
+            resize_rules=[ResizeRule("thumb_", (20, 20), "cover")],
+        )
+
+    def test_buffer_reader(self):
+        reader = BufferReader(bytearray(b"0123456789"))
+        self.assertEqual(reader.read(3), b"012")
+        reader.seek(-2, io.SEEK_END)
+        self.assertEqual(reader.read(), b"89")
+        reader.seek(4)
+        self.assertEqual(reader.tell(), 4)
+        self.assertEqual(reader.read(100), b"456789")
+        self.assertEqual(reader.read(1), b"")
+
+    def test_open_buffer_does_not_copy(self):
+        data = bytearray(self._png)
+        reader = open_buffer(memoryview(data))
+        data[0] = 0
+        self.assertEqual(reader.read(1), b"\x00")
+
+    def test_convert_bytes(self):
+        for data in [self._png, bytearray(self._png), memoryview(self._png)]:
+            output = self._processor.convert_bytes(data, filename="photo.png")
+            with Image.open(io.BytesIO(output)) as img:
+                self.assertEqual(img.format, "WEBP")
+                self.assertEqual(img.size, (100, 100))
+
+    def test_convert_bytes_uses_rules(self):
+        output = self._processor.convert_bytes(self._png, filename="a/thumb_1.png")
+        with Image.open(io.BytesIO(output)) as img:
+            self.assertEqual(img.size, (20, 20))
+
+    def test_convert_stream_into_caller_buffer(self):
+        dst = io.BytesIO()
+        dst.write(b"header")
+        size = self._processor.convert_stream(io.BytesIO(self._png), dst)
+        self.assertEqual(size, (100, 100))
+        self.assertEqual(dst.getvalue()[:6], b"header")
+        with Image.open(io.BytesIO(dst.getvalue()[6:])) as img:
+            self.assertEqual(img.size, (100, 100))
+
+    def test_convert_stream_encodes_into_destination(self):
+        dst = io.BytesIO()
+        save = Image.Image.save
+        targets = []
+
+        def spy(img, fp, *args, **kwargs):
+            targets.append(fp)
+            return save(img, fp, *args, **kwargs)
+
+        with patch.object(Image.Image, "save", autospec=True, side_effect=spy):
+            self._processor.convert_stream(io.BytesIO(self._png), dst)
+        self.assertEqual(targets, [dst])
+        with Image.open(io.BytesIO(dst.getvalue())) as img:
+            self.assertEqual(img.format, "WEBP")
+
+    def test_invalid_bytes(self):
+        with self.assertRaises(UnidentifiedImageError):
+            self._processor.convert_bytes(b"not an image")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import math
+from unittest.mock import patch
+
+from parameterized import parameterized
+from PIL import Image, ImageChops, ImageStat
+
+from src.img_to_webp import (
+    ImageProcessor,
+    ResampleFilter,
+    ResizeMode,
+    ResizeStrategyFactory,
+)
+from src.img_to_webp._tiling import resize_in_strips
+from .base_test import BaseTest
+
+
+def _psnr(a: Image.Image, b: Image.Image) -> float:
+    rms = ImageStat.Stat(ImageChops.difference(a, b)).rms
+    mse = sum(value * value for value in rms) / len(rms)
+    return math.inf if mse == 0 else 20 * math.log10(255 / math.sqrt(mse))
+
+
+def _source(size=(600, 400)) -> Image.Image:
+    gradient = Image.radial_gradient("L").resize(size)
+    return Image.merge("RGB", [gradient, gradient.rotate(90), gradient.transpose(0)])
+
+
+def _noise(size=(503, 371), mode="RGB") -> Image.Image:
+    """High-frequency content, where any difference in filtering shows."""
+    return Image.merge(
+        mode, [Image.effect_noise(size, 100).rotate(90 * i) for i in range(len(mode))]
+    )
+
+
+@patch("src.img_to_webp._tiling._STRIP_PIXELS", 20_000)
+class TestTiling(BaseTest):
+    @parameterized.expand(
+        [
+            (f"{mode}_{resample}_{gap}_{size[0]}x{size[1]}", mode, resample, gap, size)
+            for mode in ResizeMode
+            for resample, gap in [
+                (ResampleFilter.LANCZOS, None),
+                (ResampleFilter.LANCZOS, 2.0),
+                (ResampleFilter.BOX, None),
+                (ResampleFilter.FAST, None),
+            ]
+            for size in [(150, 150), (90, 40), (900, 900)]
+        ]
+    )
+    def test_matches_whole_image(self, _, mode, resample, gap, size):
+        strategy = ResizeStrategyFactory.get_strategy(
+            mode, resample=resample, reducing_gap=gap
+        )
+        for img in [_source(), _noise(), _noise(mode="RGBA")]:
+            with self.subTest(mode=img.mode, size=img.size):
+                expected = strategy.resize(img.copy(), size)
+                tiled = resize_in_strips(
+                    img,
+                    strategy.get_target(img, size),
+                    ImageProcessor._to_resample_mode,
+                )
+                self.assertEqual(tiled.mode, expected.mode)
+                self.assertEqual(tiled.size, expected.size)
+                self.assertIsNone(
+                    ImageChops.difference(tiled, expected).getbbox(alpha_only=False)
+                )
+
+    def test_converts_each_strip(self):
+        img = _source().convert("P")
+        img.info["transparency"] = 0
+        strategy = ResizeStrategyFactory.get_strategy(ResizeMode.FILL)
+        tiled = resize_in_strips(
+            img, strategy.get_target(img, (60, 40)), ImageProcessor._to_resample_mode
+        )
+        self.assertEqual(tiled.mode, "RGBA")
+        self.assertEqual(tiled.size, (60, 40))
+
+    def test_processor_tiles_large_sources(self):
+        for path in self._input_dir.iterdir():
+            path.unlink()
+        _source().save(self._input_dir / "large.png")
+        _source().convert("P").save(self._input_dir / "palette.png")
+        for tile_pixels in [None, 10_000]:
+            ImageProcessor(
+                input_dir=str(self._input_dir),
+                output_dir=str(self._output_dir / str(tile_pixels)),
+                default_size=(120, 120),
+                default_resize_mode=ResizeMode.COVER,
+                tile_pixels=tile_pixels,
+            ).process_all_images()
+
+        for name in ["large.webp", "palette.webp"]:
+            with Image.open(self._output_dir / "None" / name) as whole:
+                with Image.open(self._output_dir / "10000" / name) as tiled:
+                    self.assertEqual(tiled.size, (120, 120))
+                    self.assertGreater(_psnr(tiled, whole), 40)
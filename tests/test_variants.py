@@ -0,0 +1,124 @@
+import json
+from unittest.mock import patch
+
+from PIL import Image
+
+from src.img_to_webp import (
+    SUPPORTED_FORMATS,
+    ImageProcessor,
+    ResizeMode,
+    ResizeRule,
+    Variant,
+)
+from src.img_to_webp._manifest import BuildManifest
+from .base_test import BaseTest
+
+VARIANTS = [
+    Variant((64, 64), "contain", suffix="_64"),
+    Variant((256, 256), "contain", suffix="_256"),
+    Variant((128, 128), "cover", quality=60, suffix="_128c"),
+    Variant((100, 50), "fill", suffix="_fill"),
+    Variant(mode="none", suffix="_orig"),
+]
+
+
+class TestVariants(BaseTest):
+    def _processor(self, **kwargs) -> ImageProcessor:
+        return ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            **kwargs,
+        )
+
+    def test_variants_named_after_output_path(self):
+        img_path = self._input_dir / "photo.png"
+        Image.new("RGB", (400, 200), color="red").save(img_path)
+        output_path = self._output_dir / "out" / "out.webp"
+        index_path = self._processor(variants=VARIANTS[:2]).process_image(
+            img_path, output_path
+        )
+
+        self.assertEqual(index_path, self._output_dir / "out" / "out.variants.json")
+        self.assertFalse(output_path.exists())
+        with open(index_path) as file:
+            index = json.load(file)
+        self.assertEqual(
+            [entry["path"] for entry in index["variants"]],
+            ["out/out_256.webp", "out/out_64.webp"],
+        )
+        self.assertEqual(
+            sorted(path.name for path in output_path.parent.iterdir()),
+            ["out.variants.json", "out_256.webp", "out_64.webp"],
+        )
+
+    def test_variants_written(self):
+        img_path = self._input_dir / "photo.png"
+        Image.new("RGB", (1200, 800), color="red").save(img_path)
+
+        with patch(
+            "src.img_to_webp._image_processor.Image.open", wraps=Image.open
+        ) as mock_open:
+            index_path = self._processor(variants=VARIANTS).process_image(img_path)
+        mock_open.assert_called_once()
+
+        expected_sizes = {
+            "_64": (64, 43),
+            "_256": (256, 171),
+            "_128c": (128, 128),
+            "_fill": (100, 50),
+            "_orig": (1200, 800),
+        }
+        self.assertEqual(index_path, self._output_dir / "photo.variants.json")
+        with open(index_path) as file:
+            index = json.load(file)
+        self.assertEqual(index["source"], "photo.png")
+        self.assertEqual((index["width"], index["height"]), (1200, 800))
+        self.assertEqual(len(index["variants"]), len(VARIANTS))
+        for entry in index["variants"]:
+            expected_size = expected_sizes[entry["suffix"]]
+            self.assertEqual((entry["width"], entry["height"]), expected_size)
+            self.assertEqual(entry["path"], f"photo{entry['suffix']}.webp")
+            with Image.open(self._output_dir / entry["path"]) as variant_img:
+                self.assertEqual(variant_img.size, expected_size)
+            self.assertEqual(entry["quality"], 60 if entry["suffix"] == "_128c" else 80)
+
+    def test_rule_variants_override_global_variants(self):
+        processor = self._processor(
+            default_size=(100, 100),
+            default_resize_mode=ResizeMode.COVER,
+            resize_rules=[
+                ResizeRule("test_image_100", variants=[{"size": [20, 20]}, {}]),
+            ],
+            variants=[Variant(suffix="_default")],
+        )
+        processor.process_all_images()
+
+        for fmt in SUPPORTED_FORMATS:
+            name = f"test_image_100x200_{fmt.removeprefix('.')}"
+            with Image.open(self._output_dir / f"{name}_20x20.webp") as img:
+                self.assertEqual(img.size, (20, 20))
+            # A variant without a size falls back to the rule/default size and mode.
+            with Image.open(self._output_dir / f"{name}.webp") as img:
+                self.assertEqual(img.size, (100, 100))
+
+            name = f"test_image_200x100_{fmt.removeprefix('.')}"
+            with Image.open(self._output_dir / f"{name}_default.webp") as img:
+                self.assertEqual(img.size, (100, 100))
+
+    def test_duplicate_suffixes_rejected(self):
+        with self.assertRaises(ValueError):
+            ImageProcessor(variants=[Variant((10, 10)), Variant((10, 10))])
+
+    def test_incremental_prunes_every_variant(self):
+        img_path = self._input_dir / "photo.png"
+        Image.new("RGB", (400, 300), color="red").save(img_path)
+        self._processor(variants=VARIANTS, incremental=True).process_all_images()
+        variant_paths = list(self._output_dir.glob("photo*"))
+        self.assertEqual(len(variant_paths), len(VARIANTS) + 1)
+
+        manifest = BuildManifest.load(self._output_dir)
+        self.assertEqual(len(manifest), len(SUPPORTED_FORMATS) * len(self.SIZES) + 1)
+
+        img_path.unlink()
+        self._processor(variants=VARIANTS, incremental=True).process_all_images()
+        self.assertEqual(list(self._output_dir.glob("photo*")), [])
@@ -0,0 +1,176 @@
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+
+from parameterized import parameterized
+from PIL import Image
+
+from src.img_to_webp import ImageProcessor
+from src.img_to_webp._watcher import ChangeType, DirectoryWatcher, FileChange
+from .base_test import BaseTest
+
+TIMEOUT = 5.0
+
+
+def _wait_for(condition, timeout=TIMEOUT) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestWatcher(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self._stop = threading.Event()
+        self._changes = queue.Queue(maxsize=2)
+
+    def tearDown(self):
+        self._stop.set()
+        super().tearDown()
+
+    def _start_watcher(self, polling: bool) -> DirectoryWatcher:
+        watcher = DirectoryWatcher(
+            self._input_dir,
+            lambda path: path.suffix == ".png",
+            debounce=0.2,
+            poll_interval=0.05,
+            polling=polling,
+        )
+        watcher.start()
+        thread = threading.Thread(target=watcher.run, args=(self._changes, self._stop))
+        thread.start()
+        self.addCleanup(watcher.close)
+        self.addCleanup(thread.join)
+        self.addCleanup(self._stop.set)
+        return watcher
+
+    def _next_change(self) -> FileChange:
+        return self._changes.get(timeout=TIMEOUT)
+
+    @parameterized.expand([("inotify", False), ("polling", True)])
+    def test_changes(self, _, polling):
+        watcher = self._start_watcher(polling)
+        inotify = not polling and sys.platform.startswith("linux")
+        self.assertEqual(watcher.backend, "inotify" if inotify else "polling")
+
+        (self._input_dir / "sub").mkdir()
+        Image.new("RGB", (10, 10)).save(self._input_dir / "sub" / "new.png")
+        self.assertEqual(
+            self._next_change(),
+            FileChange(ChangeType.MODIFIED, Path("sub/new.png")),
+        )
+
+        os.rename(self._input_dir / "sub" / "new.png", self._input_dir / "moved.png")
+        change = self._next_change()
+        self.assertEqual(change.type, ChangeType.MOVED)
+        self.assertEqual(change.path.as_posix(), "moved.png")
+        self.assertEqual(change.old_path.as_posix(), "sub/new.png")
+
+        (self._input_dir / "moved.png").unlink()
+        (self._input_dir / "notes.txt").write_text("ignored")
+        change = self._next_change()
+        self.assertEqual(change.type, ChangeType.DELETED)
+        self.assertEqual(change.path.as_posix(), "moved.png")
+        self.assertTrue(self._changes.empty())
+
+    @parameterized.expand([("inotify", False), ("polling", True)])
+    def test_partial_writes_debounced(self, _, polling):
+        self._start_watcher(polling)
+        with open(self._input_dir / "upload.png", "wb") as file:
+            for _ in range(4):
+                file.write(b"\0" * 1024)
+                file.flush()
+                time.sleep(0.1)
+        change = self._next_change()
+        self.assertEqual(change.path.as_posix(), "upload.png")
+        # Reported once, after the last write.
+        time.sleep(0.4)
+        self.assertTrue(self._changes.empty())
+
+    def test_bounded_queue(self):
+        self._start_watcher(polling=True)
+        for i in range(6):
+            Image.new("RGB", (10, 10)).save(self._input_dir / f"burst_{i}.png")
+        self.assertTrue(_wait_for(self._changes.full))
+        paths = {self._next_change().path.name for _ in range(6)}
+        self.assertEqual(paths, {f"burst_{i}.png" for i in range(6)})
+
+    def test_processor_watch(self):
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+        )
+        thread = threading.Thread(
+            target=processor.watch,
+            kwargs={"debounce": 0.1, "poll_interval": 0.05, "stop": self._stop},
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+
+        # Existing images are converted first.
+        existing = self._output_dir / "test_image_100x200_png.webp"
+        self.assertTrue(_wait_for(existing.exists))
+
+        Image.new("RGB", (100, 100), "red").save(self._input_dir / "photo.png")
+        output = self._output_dir / "photo.webp"
+        self.assertTrue(_wait_for(output.exists))
+        inode = output.stat().st_ino
+
+        # A renamed source's output is renamed, not converted again.
+        os.rename(self._input_dir / "photo.png", self._input_dir / "renamed.png")
+        renamed = self._output_dir / "renamed.webp"
+        self.assertTrue(_wait_for(renamed.exists))
+        self.assertFalse(output.exists())
+        self.assertEqual(renamed.stat().st_ino, inode)
+
+        (self._input_dir / "renamed.png").unlink()
+        self.assertTrue(_wait_for(lambda: not renamed.exists()))
+
+        self._stop.set()
+        thread.join()
+        manifest = (self._output_dir / ".img-to-webp-manifest.jsonl").read_text()
+        self.assertNotIn("renamed.png", manifest)
+        self.assertIn("test_image_100x200_png.png", manifest)
+
+    def test_processor_watch_survives_bad_images(self):
+        processor = ImageProcessor(
+            input_dir=str(self._input_dir),
+            output_dir=str(self._output_dir),
+            default_size=(50, 50),
+        )
+        thread = threading.Thread(
+            target=processor.watch,
+            kwargs={
+                "debounce": 0.1,
+                "poll_interval": 0.05,
+                "polling": True,
+                "stop": self._stop,
+            },
+        )
+        thread.start()
+        self.addCleanup(thread.join)
+        existing = self._output_dir / "test_image_100x200_png.webp"
+        self.assertTrue(_wait_for(existing.exists))
+
+        # A truncated upload fails to decode after its header was read.
+        buffer = io.BytesIO()
+        Image.effect_noise((200, 200), 64).save(buffer, "JPEG")
+        data = buffer.getvalue()
+        (self._input_dir / "truncated.jpg").write_bytes(data[: len(data) // 2])
+        with self.assertLogs("src.img_to_webp._image_processor", "ERROR") as logs:
+            self.assertTrue(
+                _wait_for(lambda: any("truncated.jpg" in line for line in logs.output))
+            )
+
+        Image.new("RGB", (100, 100), "blue").save(self._input_dir / "photo.png")
+        self.assertTrue(_wait_for((self._output_dir / "photo.webp").exists))
+        self.assertTrue(thread.is_alive())
+        self.assertFalse((self._output_dir / "truncated.webp").exists())